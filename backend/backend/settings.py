@@ -161,4 +161,33 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+# Caché de resultados de buscar-rutas/ y buscar-rutas-combinadas/ (en memoria, por proceso)
+RUTAS_CACHE_BUSQUEDAS = {
+    'CAPACIDAD': 2000,  # entradas como máximo (0 la desactiva)
+    'TTL_SEGUNDOS': 600,
+    'DECIMALES': 3,  # ~100 m: origen y destino se redondean a esta precisión para la clave y el cálculo
+}
+
+# Caché de las respuestas ya serializadas de ruta/<id>/json/ y recorrido/<id>/json/ (por proceso)
+RUTAS_CACHE_RESPUESTAS = {
+    'CAPACIDAD': 500,  # respuestas como máximo (0 la desactiva)
+}
+
+# Caché de las teselas GeoJSON de teselas/<z>/<x>/<y>.geojson (por proceso)
+RUTAS_CACHE_TESELAS = {
+    'CAPACIDAD': 2000,  # teselas como máximo (0 la desactiva)
+    'BYTES_MAXIMOS': 64 * 1024 * 1024,  # total de los cuerpos GeoJSON guardados (None: sin límite por bytes)
+}
+
+# Logs de la app rutas (antes eran print() en las vistas); DEBUG muestra el detalle de cada búsqueda
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'rutas': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
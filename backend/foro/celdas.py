@@ -0,0 +1,74 @@
+# foro/celdas.py
+# Rejilla fija de celdas (~220 m de lado) para buscar incidencias cercanas por igualdad o rangos sobre una
+# columna indexada (Incidencia.celda) en lugar de rangos sobre latitud/longitud; las candidatas se
+# refinan luego con la distancia haversine exacta.
+import math
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+from rutas.utils import METROS_POR_GRADO, RADIO_TIERRA, calcular_distancia
+
+TAMANO_CELDA_GRADOS = 0.002
+COLUMNAS = round(360 / TAMANO_CELDA_GRADOS)  # celdas por fila de latitud
+
+
+def _fila_columna(lat, lng):
+    return math.floor((float(lat) + 90) / TAMANO_CELDA_GRADOS), math.floor((float(lng) + 180) / TAMANO_CELDA_GRADOS)
+
+
+def celda(lat, lng):
+    """Número de la celda que contiene el punto; None si falta alguna coordenada"""
+    if lat is None or lng is None:
+        return None
+    fila, columna = _fila_columna(lat, lng)
+    return fila * COLUMNAS + columna
+
+
+def rangos_celdas(lat, lng, radio_metros):
+    """
+    Celdas que cubren el cuadrado de lado 2 * radio_metros centrado en el punto, como una lista de
+    rangos (primera, última) consecutivos: uno por fila de la rejilla.
+    """
+    lat = float(lat)
+    delta_lat = radio_metros / METROS_POR_GRADO
+    delta_lng = radio_metros / (METROS_POR_GRADO * max(math.cos(math.radians(lat)), 1e-6))
+    fila_min, columna_min = _fila_columna(lat - delta_lat, float(lng) - delta_lng)
+    fila_max, columna_max = _fila_columna(lat + delta_lat, float(lng) + delta_lng)
+    return [(fila * COLUMNAS + columna_min, fila * COLUMNAS + columna_max) for fila in range(fila_min, fila_max + 1)]
+
+
+def celdas_cercanas(lat, lng, radio_metros):
+    """Las mismas celdas de rangos_celdas, una por una (para radios chicos)"""
+    return [c for primera, ultima in rangos_celdas(lat, lng, radio_metros) for c in range(primera, ultima + 1)]
+
+
+def filtro_celdas(lat, lng, radio_metros, campo='celda'):
+    """Q con un rango sobre la columna de celdas por cada fila: búsquedas en el índice, no un recorrido de la tabla"""
+    filtro = Q()
+    for primera, ultima in rangos_celdas(lat, lng, radio_metros):
+        filtro |= Q(**{f'{campo}__range': (primera, ultima)})
+    return filtro
+
+
+def distancia_metros(lat1, lng1, lat2, lng2):
+    """Distancia haversine en metros (la de rutas.utils)"""
+    return calcular_distancia({'lat': float(lat1), 'lng': float(lng1)}, {'lat': float(lat2), 'lng': float(lng2)})
+
+
+def expresion_distancia(lat, lng, campo_lat='latitud', campo_lng='longitud'):
+    """La misma distancia haversine (metros) como expresión de la base de datos, desde el punto hasta cada fila"""
+    lat_fila = Radians(Cast(F(campo_lat), FloatField()))
+    lng_fila = Radians(Cast(F(campo_lng), FloatField()))
+    lat_punto = math.radians(float(lat))
+    lng_punto = math.radians(float(lng))
+    a = (
+        Power(Sin((lat_fila - Value(lat_punto)) / Value(2.0)), 2)
+        + Value(math.cos(lat_punto)) * Cos(lat_fila) * Power(Sin((lng_fila - Value(lng_punto)) / Value(2.0)), 2)
+    )
+    return Value(2.0 * RADIO_TIERRA) * ASin(Sqrt(a))
+
+
+def cercanas(queryset, lat, lng, radio_metros):
+    """Filas del queryset (con columna 'celda') a lo más a radio_metros del punto, anotadas con 'distancia' en metros"""
+    return queryset.filter(filtro_celdas(lat, lng, radio_metros)).annotate(
+        distancia=expresion_distancia(lat, lng)
+    ).filter(distancia__lte=radio_metros)
@@ -0,0 +1,54 @@
+# foro/contadores.py
+# Contadores desnormalizados: cuántos comentarios, reacciones y reportes tiene cada incidencia
+# y cuántas reacciones (likes) cada comentario. Se mantienen con UPDATE ... SET n = n ± 1
+# (expresiones F, atómicas en la base de datos) desde signals.py y se reparan con recalcular_contadores.
+from django.apps import apps
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# (modelo contado, modelo con el contador, campo FK hacia él, columna del contador)
+CONTADORES = (
+    ('Comentario', 'Incidencia', 'incidencia', 'num_comentarios'),
+    ('ReaccionIncidencia', 'Incidencia', 'incidencia', 'num_reacciones'),
+    ('Reporte', 'Incidencia', 'incidencia', 'num_reportes'),
+    ('ReaccionComentario', 'Comentario', 'comentario', 'num_reacciones'),
+)
+
+
+def _modelo_foro(nombre):
+    return apps.get_model('foro', nombre)
+
+
+def ajustar_contadores(instance, delta):
+    """Suma delta (+1 al crear, -1 al borrar) a los contadores que cuentan a instance"""
+    for contado, modelo, campo, columna in CONTADORES:
+        if type(instance).__name__ != contado:
+            continue
+        # Greatest: un borrado nunca deja el contador negativo aunque estuviera desfasado
+        _modelo_foro(modelo).objects.filter(pk=getattr(instance, f'{campo}_id')).update(
+            **{columna: Greatest(F(columna) + delta, Value(0))}
+        )
+
+
+def recalcular_contadores(obtener_modelo=_modelo_foro):
+    """
+    Recalcula todos los contadores desde las tablas: un UPDATE por contador que solo toca las filas desfasadas.
+    obtener_modelo permite usarla desde una migración (apps.get_model del estado histórico).
+    Devuelve {'Modelo.columna': filas corregidas}.
+    """
+    corregidas = {}
+    for contado, modelo, campo, columna in CONTADORES:
+        Contado = obtener_modelo(contado)
+        Modelo = obtener_modelo(modelo)
+        conteo = Coalesce(
+            Subquery(
+                Contado.objects.filter(**{campo: OuterRef('pk')}).order_by()
+                .values(campo).annotate(n=Count('pk')).values('n')
+            ),
+            Value(0),
+        )
+        desfasadas = Modelo.objects.annotate(conteo_real=conteo).exclude(**{columna: F('conteo_real')})
+        corregidas[f'{modelo}.{columna}'] = Modelo.objects.filter(pk__in=desfasadas.values('pk')).update(
+            **{columna: conteo}
+        )
+    return corregidas
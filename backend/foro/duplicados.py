@@ -0,0 +1,124 @@
+# foro/duplicados.py
+# Detección de incidencias duplicadas al crear una nueva (IncidenciaViewSet.create).
+# Cada incidencia guarda en BandaIncidencia las bandas LSH de la firma MinHash de los trigramas
+# de su título y de su descripción, junto con su celda (foro/celdas.py). Para buscar candidatas basta
+# con buscar por igualdad esas claves (índice (clave, celda)); solo las candidatas se comparan con la
+# similitud de trigramas, así el costo no depende de cuántas incidencias haya ni del largo de los textos.
+import hashlib
+import random
+import re
+import unicodedata
+from django.db.models import Count
+from .celdas import celdas_cercanas, distancia_metros
+
+MAX_CARACTERES = 1000  # solo se compara el comienzo de textos largos
+PERMUTACIONES = 32  # largo de la firma MinHash
+FILAS_POR_BANDA = 2  # 16 bandas: dos textos con Jaccard >= 0.5 comparten alguna banda con probabilidad > 0.98
+MAX_CANDIDATAS = 20
+PRIMO = (1 << 61) - 1
+
+_azar = random.Random(20240601)
+_COEFICIENTES = [(_azar.randrange(1, PRIMO), _azar.randrange(0, PRIMO)) for _ in range(PERMUTACIONES)]
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y solo letras/dígitos separados por un espacio"""
+    texto = unicodedata.normalize('NFKD', (texto or '')[:MAX_CARACTERES].lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def trigramas(texto):
+    texto = normalizar(texto)
+    if not texto:
+        return set()
+    texto = f' {texto} '
+    return {texto[k:k + 3] for k in range(len(texto) - 2)}
+
+
+def similitud(a, b):
+    """Coeficiente de Dice entre los trigramas de a y b (0 a 1, comparable con SequenceMatcher.ratio)"""
+    ta, tb = trigramas(a), trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def _hash64(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=8).digest(), 'big')
+
+
+def firma_minhash(tris):
+    """Para cada permutación (a*x + b mod PRIMO), el mínimo sobre los trigramas"""
+    valores = [_hash64(t) for t in tris]
+    return [min((a * x + b) % PRIMO for x in valores) for a, b in _COEFICIENTES]
+
+
+def claves_bandas(texto, campo):
+    """Claves (enteros de 63 bits con signo) de las bandas LSH del texto; campo separa título y descripción"""
+    tris = trigramas(texto)
+    if not tris:
+        return []
+    firma = firma_minhash(tris)
+    claves = []
+    for banda in range(0, PERMUTACIONES, FILAS_POR_BANDA):
+        valores = ','.join(map(str, firma[banda:banda + FILAS_POR_BANDA]))
+        digest = hashlib.blake2b(f'{campo}:{banda}:{valores}'.encode(), digest_size=8).digest()
+        claves.append(int.from_bytes(digest, 'big', signed=True))
+    return claves
+
+
+def claves_incidencia(titulo, descripcion):
+    return claves_bandas(titulo, 'titulo') + claves_bandas(descripcion, 'descripcion')
+
+
+def indexar_incidencia(incidencia):
+    """Reemplaza las bandas guardadas de la incidencia por las de su título, descripción y ubicación actuales"""
+    from .models import BandaIncidencia
+
+    BandaIncidencia.objects.filter(incidencia=incidencia).delete()
+    BandaIncidencia.objects.bulk_create(
+        BandaIncidencia(incidencia=incidencia, clave=clave, celda=incidencia.celda)
+        for clave in set(claves_incidencia(incidencia.titulo, incidencia.descripcion))
+    )
+
+
+def puntaje(titulo, descripcion, incidencia):
+    """Mismo criterio que antes: el título pesa completo y la descripción un 70%"""
+    puntaje_titulo = similitud(titulo, incidencia.titulo) if titulo and incidencia.titulo else 0.0
+    puntaje_descripcion = similitud(descripcion, incidencia.descripcion) if descripcion and incidencia.descripcion else 0.0
+    return max(puntaje_titulo, 0.7 * puntaje_descripcion)
+
+
+def buscar_duplicado(titulo, descripcion, lat=None, lng=None, radio_metros=200, desde=None):
+    """
+    Incidencia más parecida (creada desde 'desde') y su puntaje: (incidencia, puntaje) o (None, 0.0).
+    Con ubicación solo se consideran las incidencias a menos de radio_metros (distancia haversine).
+    """
+    from .models import BandaIncidencia, Incidencia
+
+    claves = claves_incidencia(titulo, descripcion)
+    if not claves:
+        return None, 0.0
+
+    bandas = BandaIncidencia.objects.filter(clave__in=claves)
+    if lat is not None and lng is not None:
+        bandas = bandas.filter(celda__in=celdas_cercanas(lat, lng, radio_metros))
+    if desde is not None:
+        bandas = bandas.filter(incidencia__fecha_creacion__gte=desde)
+    # las que comparten más bandas primero; a lo más MAX_CANDIDATAS se comparan
+    ids = list(
+        bandas.values('incidencia').annotate(comunes=Count('id'))
+        .order_by('-comunes', '-incidencia').values_list('incidencia', flat=True)[:MAX_CANDIDATAS]
+    )
+
+    mejor, mejor_puntaje = None, 0.0
+    for candidata in Incidencia.objects.filter(id__in=ids).order_by('-fecha_creacion', '-id'):
+        if lat is not None and lng is not None:
+            if distancia_metros(lat, lng, candidata.latitud, candidata.longitud) > radio_metros:
+                continue
+        valor = puntaje(titulo, descripcion, candidata)
+        if valor > mejor_puntaje:
+            mejor, mejor_puntaje = candidata, valor
+    return mejor, mejor_puntaje
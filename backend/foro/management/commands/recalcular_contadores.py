@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from foro.contadores import recalcular_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de comentarios, reacciones y reportes de incidencias y comentarios'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            corregidas = recalcular_contadores()
+
+        for contador, filas in corregidas.items():
+            self.stdout.write(f'  {contador}: {filas} filas corregidas')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {sum(corregidas.values())} contadores corregidos ({time.perf_counter() - inicio:.1f}s)'
+        ))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foro", "0005_reaccioncomentario_reaccionincidencia_and_more"),
+        ("usuario", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comentario",
+            index=models.Index(
+                fields=["fecha_creacion", "id"], name="foro_coment_fecha_c_e8fc01_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="incidencia",
+            index=models.Index(
+                fields=["fecha_creacion", "id"], name="foro_incide_fecha_c_11cdbe_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="incidencia",
+            index=models.Index(
+                fields=["usuario", "fecha_creacion", "id"],
+                name="foro_incide_usuario_a9f1a3_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificacion",
+            index=models.Index(
+                fields=["usuario", "fecha_creacion", "id"],
+                name="foro_notifi_usuario_56f4a8_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reporte",
+            index=models.Index(
+                fields=["fecha_reporte", "id"], name="foro_report_fecha_r_b2a3a8_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reporte",
+            index=models.Index(
+                fields=["usuario", "fecha_reporte", "id"],
+                name="foro_report_usuario_19a7f5_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+def calcular_contadores(apps, schema_editor):
+    """Contadores de las incidencias y comentarios ya existentes"""
+    from foro.contadores import recalcular_contadores
+
+    recalcular_contadores(lambda nombre: apps.get_model("foro", nombre))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foro", "0006_indices_paginacion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comentario",
+            name="num_reacciones",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="incidencia",
+            name="num_comentarios",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="incidencia",
+            name="num_reacciones",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="incidencia",
+            name="num_reportes",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def indexar_incidencias(apps, schema_editor):
+    """Bandas del índice de duplicados para las incidencias ya existentes"""
+    from foro.celdas import celda
+    from foro.duplicados import claves_incidencia
+
+    Incidencia = apps.get_model("foro", "Incidencia")
+    BandaIncidencia = apps.get_model("foro", "BandaIncidencia")
+    bandas = []
+    for incidencia in Incidencia.objects.only(
+        "id", "titulo", "descripcion", "latitud", "longitud"
+    ).iterator():
+        celda_incidencia = celda(incidencia.latitud, incidencia.longitud)
+        bandas.extend(
+            BandaIncidencia(
+                incidencia_id=incidencia.id, clave=clave, celda=celda_incidencia
+            )
+            for clave in set(
+                claves_incidencia(incidencia.titulo, incidencia.descripcion)
+            )
+        )
+    BandaIncidencia.objects.bulk_create(bandas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foro", "0007_contadores"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BandaIncidencia",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("clave", models.BigIntegerField()),
+                ("celda", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "incidencia",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bandas",
+                        to="foro.incidencia",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["clave", "celda"], name="foro_bandai_clave_c35224_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(indexar_incidencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+def calcular_celdas(apps, schema_editor):
+    """Celda de las incidencias ya existentes"""
+    from foro.celdas import celda
+
+    Incidencia = apps.get_model("foro", "Incidencia")
+    incidencias = list(
+        Incidencia.objects.filter(latitud__isnull=False, longitud__isnull=False).only(
+            "id", "latitud", "longitud"
+        )
+    )
+    for incidencia in incidencias:
+        incidencia.celda = celda(incidencia.latitud, incidencia.longitud)
+    Incidencia.objects.bulk_update(incidencias, ["celda"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foro", "0008_bandaincidencia"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="incidencia",
+            name="celda",
+            field=models.BigIntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(calcular_celdas, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from usuario.models import Perfil  # tu modelo de perfil con usuario
+from .celdas import celda
 
 
 class Distrito(models.Model):
@@ -26,16 +27,48 @@ class Incidencia(models.Model):
     distrito = models.ForeignKey(Distrito, on_delete=models.SET_NULL, null=True, blank=True)
     latitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # celda de la rejilla (foro/celdas.py) que contiene latitud/longitud, para búsquedas por cercanía
+    celda = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
     estado = models.ForeignKey(Estado, on_delete=models.SET_NULL, null=True, blank=True, related_name='incidencias')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     # reportes de otros usuarios
     reportado_por = models.ManyToManyField(Perfil, through='Reporte', related_name='incidencias_reportadas', blank=True)
+    # contadores desnormalizados, mantenidos por foro/signals.py (reparar con manage.py recalcular_contadores)
+    num_comentarios = models.PositiveIntegerField(default=0, editable=False)
+    num_reacciones = models.PositiveIntegerField(default=0, editable=False)
+    num_reportes = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # paginación por cursor (fecha_creacion, id): el feed general y el de cada usuario (mine)
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id']),
+            models.Index(fields=['usuario', 'fecha_creacion', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.celda = celda(self.latitud, self.longitud)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitud', 'longitud'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'celda'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.titulo} ({self.usuario.user.email})"  # email como username
 
 
+class BandaIncidencia(models.Model):
+    """Clave de una banda LSH (MinHash de trigramas) de la incidencia, con su celda: índice de duplicados (foro/duplicados.py)"""
+    incidencia = models.ForeignKey(Incidencia, on_delete=models.CASCADE, related_name='bandas')
+    clave = models.BigIntegerField()
+    celda = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['clave', 'celda']),
+        ]
+
+
 class IncidenciaImagen(models.Model):
     incidencia = models.ForeignKey(Incidencia, on_delete=models.CASCADE, related_name='imagenes')
     imagen = models.ImageField(upload_to='incidencias/')
@@ -54,6 +87,10 @@ class Reporte(models.Model):
 
     class Meta:
         unique_together = ('usuario', 'incidencia')
+        indexes = [
+            models.Index(fields=['fecha_reporte', 'id']),
+            models.Index(fields=['usuario', 'fecha_reporte', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.usuario.user.email} reportó {self.incidencia.titulo}"
@@ -74,6 +111,13 @@ class Comentario(models.Model):
     contenido = models.TextField()
     respuesta_a = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='respuestas')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # reacciones (likes) del comentario, mantenido por foro/signals.py
+    num_reacciones = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id']),
+        ]
 
     def __str__(self):
         return f"Comentario de {self.usuario.user.email} en {self.incidencia.titulo}"
@@ -119,5 +163,10 @@ class Notificacion(models.Model):
     leida = models.BooleanField(default=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_creacion', 'id']),
+        ]
+
     def __str__(self):
         return f"Notif para {self.usuario.user.email}: {self.mensaje}"
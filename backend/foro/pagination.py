@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FechaCursorPagination(CursorPagination):
+    """Keyset (cursor) pagination over (fecha_creacion, id), newest first.
+
+    The cursor stores the last fecha seen, so every page is a `WHERE fecha < cursor ORDER BY fecha, id
+    LIMIT n` over the composite index: deep pages cost the same as the first one. `id` breaks ties
+    between rows created in the same instant.
+    """
+    ordering = ('-fecha_creacion', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ComentarioCursorPagination(FechaCursorPagination):
+    # comments read top-down (oldest first)
+    ordering = ('fecha_creacion', 'id')
+
+
+class ReporteCursorPagination(FechaCursorPagination):
+    ordering = ('-fecha_reporte', '-id')
@@ -50,10 +50,31 @@ class ComentarioSerializer(serializers.ModelSerializer):
         fields = ['id', 'usuario', 'incidencia', 'contenido', 'respuesta_a', 'respuestas', 'fecha_creacion']
 
     def get_respuestas(self, obj):
-        qs = obj.respuestas.all().order_by('fecha_creacion')
+        # respuestas ya enlazadas por enlazar_respuestas (sin una consulta por comentario)
+        qs = getattr(obj, 'respuestas_precargadas', None)
+        if qs is None:
+            qs = obj.respuestas.all().order_by('fecha_creacion')
         return ComentarioSerializer(qs, many=True).data
 
 
+def enlazar_respuestas(comentarios):
+    """Asigna a cada comentario de la lista sus respuestas (también de la lista), ordenadas por fecha.
+
+    Así ComentarioSerializer arma el árbol completo sin consultar la base de datos por cada nivel.
+    """
+    comentarios = list(comentarios)
+    for c in comentarios:
+        c.respuestas_precargadas = []
+    por_id = {c.id: c for c in comentarios}
+    for c in comentarios:
+        padre = por_id.get(c.respuesta_a_id)
+        if padre is not None:
+            padre.respuestas_precargadas.append(c)
+    for c in comentarios:
+        c.respuestas_precargadas.sort(key=lambda r: r.fecha_creacion)
+    return comentarios
+
+
 class TipoReaccionSerializer(serializers.ModelSerializer):
     class Meta:
         model = TipoReaccion
@@ -129,7 +150,7 @@ class IncidenciaSerializer(serializers.ModelSerializer):
     usuario = PerfilMinSerializer(read_only=True)
     distrito = DistritoSerializer(read_only=True)
     estado = EstadoSerializer(read_only=True)
-    comentarios = ComentarioSerializer(many=True, read_only=True)
+    comentarios = serializers.SerializerMethodField()
     reacciones = ReaccionSerializer(many=True, read_only=True)
     imagenes = serializers.SerializerMethodField()
     reports_count = serializers.SerializerMethodField()
@@ -144,6 +165,11 @@ class IncidenciaSerializer(serializers.ModelSerializer):
             'imagenes', 'reports_count', 'primer_reportero', 'comentarios', 'reacciones'
         ]
 
+    def get_comentarios(self, obj):
+        # las respuestas de cada comentario se toman de la misma lista (precargada en el viewset)
+        comentarios = enlazar_respuestas(obj.comentarios.all())
+        return ComentarioSerializer(comentarios, many=True, context=self.context).data
+
     def get_imagenes(self, obj):
         request = self.context.get('request') if hasattr(self, 'context') else None
         imgs = []
@@ -164,10 +190,13 @@ class IncidenciaSerializer(serializers.ModelSerializer):
         return imgs
 
     def get_reports_count(self, obj):
-        return obj.reporte_set.count()
+        return obj.num_reportes
 
     def get_primer_reportero(self, obj):
-        first = obj.reporte_set.order_by('fecha_reporte').select_related('usuario').first()
+        if hasattr(obj, 'primeros_reportes'):
+            first = obj.primeros_reportes[0] if obj.primeros_reportes else None
+        else:
+            first = obj.reporte_set.order_by('fecha_reporte').select_related('usuario').first()
         if not first:
             return None
         return PerfilMinSerializer(first.usuario, context=self.context).data
@@ -182,9 +211,10 @@ class IncidenciaMinSerializer(serializers.ModelSerializer):
     distrito = serializers.CharField(source='distrito.nombre', read_only=True)
     estado = serializers.CharField(source='estado.nombre', read_only=True)
     imagen = serializers.SerializerMethodField()
-    reports_count = serializers.SerializerMethodField()
-    comentarios_count = serializers.SerializerMethodField()
-    reacciones_count = serializers.SerializerMethodField()
+    # contadores desnormalizados (sin COUNT por fila)
+    reports_count = serializers.IntegerField(source='num_reportes', read_only=True)
+    comentarios_count = serializers.IntegerField(source='num_comentarios', read_only=True)
+    reacciones_count = serializers.IntegerField(source='num_reacciones', read_only=True)
 
     class Meta:
         model = Incidencia
@@ -194,12 +224,6 @@ class IncidenciaMinSerializer(serializers.ModelSerializer):
             'reacciones_count', 'reports_count'
         ]
 
-    def get_comentarios_count(self, obj):
-        return obj.comentarios.count()
-
-    def get_reacciones_count(self, obj):
-        return obj.reacciones.count()
-
     def get_imagen(self, obj):
         # return absolute URL for image, or a default static placeholder
         request = self.context.get('request') if hasattr(self, 'context') else None
@@ -224,8 +248,12 @@ class IncidenciaMinSerializer(serializers.ModelSerializer):
         txt = (obj.descripcion or '')
         return txt if len(txt) <= 300 else txt[:297] + '...'
 
-    def get_reports_count(self, obj):
-        return obj.reporte_set.count()
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        # distance in meters when the queryset was filtered with celdas.cercanas (preview with lat/lng)
+        if getattr(obj, 'distancia', None) is not None:
+            data['distancia'] = round(obj.distancia, 1)
+        return data
 
 
 class IncidenciaImagenSerializer(serializers.ModelSerializer):
@@ -323,6 +351,18 @@ class IncidenciaModalSerializer(serializers.ModelSerializer):
 
     def get_comentarios(self, obj):
         out = []
+        # comments liked by the requesting user, in a single query for the whole list
+        try:
+            request = self.context.get('request') if hasattr(self, 'context') else None
+            perfil = getattr(request.user, 'perfil', None) if request and hasattr(request, 'user') else None
+        except Exception:
+            perfil = None
+        liked_ids = set()
+        if perfil:
+            from .models import ReaccionComentario
+            liked_ids = set(ReaccionComentario.objects.filter(
+                comentario__incidencia=obj, usuario=perfil
+            ).values_list('comentario_id', flat=True))
         for c in obj.comentarios.all().order_by('fecha_creacion'):
             usuario = getattr(c, 'usuario', None)
             author = None
@@ -336,22 +376,9 @@ class IncidenciaModalSerializer(serializers.ModelSerializer):
                 except Exception:
                     default_rel = settings.MEDIA_URL + 'usuarios/circulo-azul-usuario-blanco_78370-4707.avif'
                     avatar = usuario.foto.url if getattr(usuario, 'foto', None) else default_rel
-            # compute likes count and whether the requesting user liked this comment
-            try:
-                request = self.context.get('request') if hasattr(self, 'context') else None
-                perfil = getattr(request.user, 'perfil', None) if request and hasattr(request, 'user') else None
-            except Exception:
-                perfil = None
-            likes_count = 0
-            liked_by_me = False
-            try:
-                from .models import ReaccionComentario
-                likes_count = ReaccionComentario.objects.filter(comentario_id=c.id).count()
-                if perfil:
-                    liked_by_me = ReaccionComentario.objects.filter(comentario_id=c.id, usuario=perfil).exists()
-            except Exception:
-                # defensive: if model not present or DB error, leave defaults
-                pass
+            # likes come from the denormalized counter
+            likes_count = c.num_reacciones
+            liked_by_me = c.id in liked_ids
 
             default_rel = settings.MEDIA_URL + 'usuarios/circulo-azul-usuario-blanco_78370-4707.avif'
             out.append({
@@ -366,10 +393,10 @@ class IncidenciaModalSerializer(serializers.ModelSerializer):
         return out
 
     def get_reacciones(self, obj):
-        return obj.reacciones.count() if hasattr(obj, 'reacciones') else 0
+        return obj.num_reacciones
 
     def get_reports_count(self, obj):
-        return obj.reporte_set.count()
+        return obj.num_reportes
 
     def get_primer_reportero(self, obj):
         first = obj.reporte_set.order_by('fecha_reporte').select_related('usuario').first()
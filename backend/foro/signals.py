@@ -1,6 +1,35 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Comentario, ReaccionIncidencia, ReaccionComentario, Notificacion, Incidencia
+from .contadores import ajustar_contadores
+from .duplicados import indexar_incidencia
+from .models import Comentario, ReaccionIncidencia, ReaccionComentario, Notificacion, Incidencia, Reporte
+
+
+@receiver(post_save, sender=Incidencia)
+def incidencia_post_save(sender, instance: Incidencia, created, update_fields=None, **kwargs):
+    """Actualizar el índice de duplicados si cambió el texto o la ubicación de la incidencia."""
+    if update_fields is not None and not {'titulo', 'descripcion', 'latitud', 'longitud'} & set(update_fields):
+        return
+    indexar_incidencia(instance)
+
+
+@receiver(post_save, sender=Comentario)
+@receiver(post_save, sender=ReaccionIncidencia)
+@receiver(post_save, sender=ReaccionComentario)
+@receiver(post_save, sender=Reporte)
+def contador_post_save(sender, instance, created, **kwargs):
+    """Sumar 1 al contador de la incidencia / comentario al que pertenece lo creado."""
+    if created:
+        ajustar_contadores(instance, 1)
+
+
+@receiver(post_delete, sender=Comentario)
+@receiver(post_delete, sender=ReaccionIncidencia)
+@receiver(post_delete, sender=ReaccionComentario)
+@receiver(post_delete, sender=Reporte)
+def contador_post_delete(sender, instance, **kwargs):
+    """Restar 1 al borrar (también en los borrados en cascada)."""
+    ajustar_contadores(instance, -1)
 
 
 @receiver(post_save, sender=Comentario)
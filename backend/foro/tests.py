@@ -1,3 +1,265 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from usuario.models import Perfil
+from .celdas import celda
+from .models import (
+    Distrito, Estado, Incidencia, Comentario, TipoReaccion,
+    ReaccionIncidencia, ReaccionComentario, Reporte,
+)
+
+# select_related de usuario/distrito/estado + prefetch de imagenes, comentarios, reacciones y primer reporte
+CONSULTAS_INCIDENCIAS = 5
+
+
+class IncidenciaConsultasTests(TestCase):
+    """El listado y el detalle de incidencias hacen un número fijo de consultas, sin importar cuántos datos haya."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfiles = [
+            Perfil.objects.create(user=User.objects.create(username=f'usuario{k}', email=f'usuario{k}@test.com'))
+            for k in range(4)
+        ]
+        cls.distrito = Distrito.objects.create(nombre='Cayma')
+        cls.estado = Estado.objects.create(nombre='active')
+        cls.tipo = TipoReaccion.objects.create(nombre='like')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.creadas = 0
+
+    def crear_incidencias(self, cantidad):
+        for _ in range(cantidad):
+            i = self.creadas
+            self.creadas += 1
+            incidencia = Incidencia.objects.create(
+                usuario=self.perfiles[i % 4], titulo=f'Incidencia {i}', descripcion='Bache en la pista',
+                distrito=self.distrito, estado=self.estado, latitud=-16.4, longitud=-71.5,
+            )
+            comentario = Comentario.objects.create(usuario=self.perfiles[0], incidencia=incidencia, contenido='hola')
+            respuesta = Comentario.objects.create(
+                usuario=self.perfiles[1], incidencia=incidencia, contenido='respuesta', respuesta_a=comentario
+            )
+            Comentario.objects.create(
+                usuario=self.perfiles[2], incidencia=incidencia, contenido='otra', respuesta_a=respuesta
+            )
+            for perfil in self.perfiles[:i % 4 + 1]:
+                ReaccionIncidencia.objects.create(usuario=perfil, incidencia=incidencia, tipo=self.tipo)
+                Reporte.objects.create(usuario=perfil, incidencia=incidencia)
+                ReaccionComentario.objects.create(usuario=perfil, comentario=comentario, tipo=self.tipo)
+        return incidencia
+
+    def test_listado_consultas_constantes(self):
+        self.crear_incidencias(2)
+        with self.assertNumQueries(CONSULTAS_INCIDENCIAS):
+            respuesta = self.client.get('/api/foro/incidencias/')
+        self.assertEqual(len(respuesta.json()['results']), 2)
+
+        self.crear_incidencias(8)
+        with self.assertNumQueries(CONSULTAS_INCIDENCIAS):
+            respuesta = self.client.get('/api/foro/incidencias/')
+        self.assertEqual(len(respuesta.json()['results']), 10)
+
+    def test_detalle_consultas_constantes(self):
+        incidencia = self.crear_incidencias(4)
+        with self.assertNumQueries(CONSULTAS_INCIDENCIAS):
+            respuesta = self.client.get(f'/api/foro/incidencias/{incidencia.id}/')
+        datos = respuesta.json()
+
+        self.assertEqual(datos['reports_count'], 4)
+        self.assertEqual(datos['primer_reportero']['id'], self.perfiles[0].id)
+        self.assertEqual(len(datos['reacciones']), 4)
+        # El árbol de comentarios se arma con los comentarios precargados
+        raiz = [c for c in datos['comentarios'] if c['respuesta_a'] is None][0]
+        self.assertEqual(raiz['respuestas'][0]['contenido'], 'respuesta')
+        self.assertEqual(raiz['respuestas'][0]['respuestas'][0]['contenido'], 'otra')
+
+
+class PaginacionCursorTests(TestCase):
+    """Los feeds del foro se paginan por cursor (fecha_creacion, id) y cada página cuesta lo mismo."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfiles = [
+            Perfil.objects.create(user=User.objects.create(username=f'usuario{k}', email=f'usuario{k}@test.com'))
+            for k in range(2)
+        ]
+        cls.incidencias = [
+            Incidencia.objects.create(usuario=cls.perfiles[k % 2], titulo=f'Incidencia {k}', descripcion='Sin luz')
+            for k in range(25)
+        ]
+        for incidencia in cls.incidencias:
+            Reporte.objects.create(usuario=cls.perfiles[0], incidencia=incidencia)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def recorrer(self, url):
+        """Sigue los enlaces 'next' y devuelve los ids en orden y las consultas de cada página"""
+        ids = []
+        consultas = []
+        while url:
+            with CaptureQueriesContext(connection) as contexto:
+                datos = self.client.get(url).json()
+            consultas.append(len(contexto))
+            ids += [item['id'] for item in datos['results']]
+            url = datos['next']
+        return ids, consultas
+
+    def test_incidencias_por_paginas(self):
+        ids, consultas = self.recorrer('/api/foro/incidencias/?page_size=10')
+        esperados = [i.id for i in sorted(self.incidencias, key=lambda i: (i.fecha_creacion, i.id), reverse=True)]
+        self.assertEqual(ids, esperados)
+        self.assertEqual(len(consultas), 3)
+        self.assertEqual(len(set(consultas)), 1)
+
+    def test_mine_y_reportes_me(self):
+        self.client.force_authenticate(self.perfiles[1].user)
+        ids, consultas = self.recorrer('/api/foro/incidencias/mine/?page_size=5')
+        self.assertEqual(sorted(ids), sorted(i.id for i in self.incidencias if i.usuario_id == self.perfiles[1].id))
+        self.assertEqual(len(consultas), 3)
+
+        self.client.force_authenticate(self.perfiles[0].user)
+        ids, consultas = self.recorrer('/api/foro/reportes/me/?page_size=10')
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+        # todas las páginas cuestan lo mismo (los contadores son columnas)
+        self.assertEqual(len(set(consultas)), 1)
+
+    def test_reportes_me_por_incidencia(self):
+        # La incidencia más antigua queda fuera de la primera página de 20: el filtro la encuentra igual
+        self.client.force_authenticate(self.perfiles[0].user)
+        antigua = self.incidencias[0]
+        datos = self.client.get('/api/foro/reportes/me/', {'incidencia': antigua.id}).json()
+        self.assertEqual([r['incidencia']['id'] for r in datos['results']], [antigua.id])
+
+        self.client.force_authenticate(self.perfiles[1].user)
+        self.assertEqual(self.client.get('/api/foro/reportes/me/', {'incidencia': antigua.id}).json()['results'], [])
+        self.assertEqual(self.client.get('/api/foro/reportes/me/', {'incidencia': 'x'}).status_code, 400)
+
+
+class ContadoresTests(TestCase):
+    """Los contadores de Incidencia y Comentario se mantienen al crear y borrar, y se pueden reparar."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfiles = [
+            Perfil.objects.create(user=User.objects.create(username=f'usuario{k}', email=f'usuario{k}@test.com'))
+            for k in range(3)
+        ]
+        cls.tipo = TipoReaccion.objects.create(nombre='like')
+
+    def test_crear_y_borrar(self):
+        incidencia = Incidencia.objects.create(usuario=self.perfiles[0], titulo='Poste caído', descripcion='x')
+        comentario = Comentario.objects.create(usuario=self.perfiles[1], incidencia=incidencia, contenido='a')
+        Comentario.objects.create(usuario=self.perfiles[2], incidencia=incidencia, contenido='b', respuesta_a=comentario)
+        for perfil in self.perfiles:
+            ReaccionIncidencia.objects.create(usuario=perfil, incidencia=incidencia, tipo=self.tipo)
+            ReaccionComentario.objects.create(usuario=perfil, comentario=comentario, tipo=self.tipo)
+            Reporte.objects.create(usuario=perfil, incidencia=incidencia)
+
+        incidencia.refresh_from_db()
+        comentario.refresh_from_db()
+        self.assertEqual((incidencia.num_comentarios, incidencia.num_reacciones, incidencia.num_reportes), (2, 3, 3))
+        self.assertEqual(comentario.num_reacciones, 3)
+
+        ReaccionComentario.objects.filter(usuario=self.perfiles[0]).delete()
+        Reporte.objects.filter(usuario=self.perfiles[1]).first().delete()
+        comentario.refresh_from_db()
+        self.assertEqual(comentario.num_reacciones, 2)
+        # borrar el comentario también borra (y descuenta) su respuesta
+        comentario.delete()
+        incidencia.refresh_from_db()
+        self.assertEqual((incidencia.num_comentarios, incidencia.num_reacciones, incidencia.num_reportes), (0, 3, 2))
+
+    def test_recalcular_contadores(self):
+        incidencia = Incidencia.objects.create(usuario=self.perfiles[0], titulo='Semáforo', descripcion='x')
+        Comentario.objects.create(usuario=self.perfiles[1], incidencia=incidencia, contenido='a')
+        Incidencia.objects.update(num_comentarios=7, num_reportes=4)
+
+        call_command('recalcular_contadores', stdout=StringIO())
+        incidencia.refresh_from_db()
+        self.assertEqual((incidencia.num_comentarios, incidencia.num_reportes), (1, 0))
+
+
+class DuplicadosTests(TestCase):
+    """create devuelve la incidencia existente (matched/score) si hay una parecida cerca."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfiles = [
+            Perfil.objects.create(user=User.objects.create(username=f'usuario{k}', email=f'usuario{k}@test.com'))
+            for k in range(2)
+        ]
+        cls.existente = Incidencia.objects.create(
+            usuario=cls.perfiles[0], titulo='Bache enorme en la Av. Ejército',
+            descripcion='Un bache profundo frente al grifo', latitud='-16.400000', longitud='-71.530000',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.perfiles[1].user)
+
+    def crear(self, titulo, latitud, longitud):
+        return self.client.post('/api/foro/incidencias/', {
+            'titulo': titulo, 'descripcion': 'Reportado desde la app', 'latitud': latitud, 'longitud': longitud,
+        })
+
+    def test_duplicado_cercano(self):
+        respuesta = self.crear('bache enorme av ejercito', '-16.400500', '-71.530500')
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertTrue(datos['matched'])
+        self.assertGreaterEqual(datos['score'], 0.7)
+        self.assertEqual(datos['incidencia']['id'], self.existente.id)
+        self.assertEqual(datos['incidencia']['reports_count'], 1)
+        self.assertTrue(datos['report_created'])
+
+    def test_lejos_o_distinto_crea_nueva(self):
+        self.assertEqual(self.crear('bache enorme av ejercito', '-16.420000', '-71.530000').status_code, 201)
+        self.assertEqual(self.crear('Semáforo malogrado', '-16.400100', '-71.530000').status_code, 201)
+        # la nueva quedó indexada: un segundo reporte igual la encuentra
+        respuesta = self.crear('Semaforo malogrado', '-16.400200', '-71.530100')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['incidencia']['titulo'], 'Semáforo malogrado')
+
+
+class CercaniaTests(TestCase):
+    """Preview filtra por celdas y distancia haversine real, y puede ordenar por distancia."""
+
+    @classmethod
+    def setUpTestData(cls):
+        perfil = Perfil.objects.create(user=User.objects.create(username='usuario', email='usuario@test.com'))
+        # a 0, ~300 m al norte, ~420 m en diagonal (dentro del cuadrado de radio 350 m, fuera del círculo) y ~2 km
+        puntos = [('-16.400000', '-71.530000'), ('-16.397300', '-71.530000'),
+                  ('-16.397300', '-71.527200'), ('-16.382000', '-71.530000')]
+        cls.incidencias = [
+            Incidencia.objects.create(usuario=perfil, titulo=f'Incidencia {k}', descripcion='x', latitud=lat, longitud=lng)
+            for k, (lat, lng) in enumerate(puntos)
+        ]
+
+    def test_celda_se_mantiene_al_guardar(self):
+        incidencia = self.incidencias[0]
+        self.assertEqual(incidencia.celda, celda(-16.4, -71.53))
+        incidencia.latitud = '-16.382000'
+        incidencia.save(update_fields=['latitud'])
+        incidencia.refresh_from_db()
+        self.assertEqual(incidencia.celda, celda(-16.382, -71.53))
+
+    def test_preview_radio_y_orden(self):
+        client = APIClient()
+        datos = client.get('/api/foro/incidencias_preview/', {'lat': -16.4, 'lng': -71.53, 'radius': 0.35}).json()
+        self.assertEqual({d['id'] for d in datos}, {self.incidencias[0].id, self.incidencias[1].id})
 
-# Create your tests here.
+        datos = client.get('/api/foro/incidencias_preview/',
+                           {'lat': -16.4, 'lng': -71.53, 'radius': 3, 'sort': 'distance'}).json()
+        self.assertEqual([d['id'] for d in datos], [i.id for i in self.incidencias])
+        self.assertEqual(datos[0]['distancia'], 0)
+        self.assertAlmostEqual(datos[1]['distancia'], 300, delta=5)
@@ -11,8 +11,11 @@ from .serializers import (
     ReporteSerializer, TipoReaccionSerializer, ComentarioSerializer,
     ReaccionSerializer, NotificacionSerializer, IncidenciaMinSerializer
 )
+from .pagination import FechaCursorPagination, ComentarioCursorPagination, ReporteCursorPagination
+from .duplicados import buscar_duplicado
+from .celdas import cercanas
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
-from difflib import SequenceMatcher
 from django.utils import timezone
 from datetime import timedelta
 
@@ -30,18 +33,39 @@ class EstadoViewSet(viewsets.ModelViewSet):
 
 
 class IncidenciaViewSet(viewsets.ModelViewSet):
-    queryset = Incidencia.objects.all().order_by('-fecha_creacion')
+    queryset = Incidencia.objects.all().order_by('-fecha_creacion', '-id')
     serializer_class = IncidenciaSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = FechaCursorPagination
+
+    def get_queryset(self):
+        """Load everything IncidenciaSerializer reads in a fixed number of queries (no N+1).
+
+        - usuario/distrito/estado via JOIN
+        - imagenes, comentarios (with their author) and reacciones (author + tipo) via Prefetch
+        - primer_reportero as a sliced Prefetch (first report only); reports_count is a column
+        """
+        return super().get_queryset().select_related(
+            'usuario__user', 'distrito', 'estado'
+        ).prefetch_related(
+            'imagenes',
+            Prefetch('comentarios', queryset=Comentario.objects.select_related('usuario__user')),
+            Prefetch('reacciones', queryset=ReaccionIncidencia.objects.select_related('usuario__user', 'tipo')),
+            Prefetch(
+                'reporte_set',
+                queryset=Reporte.objects.select_related('usuario__user').order_by('fecha_reporte', 'id')[:1],
+                to_attr='primeros_reportes'
+            ),
+        )
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def mine(self, request):
-        """Return incidencias created by the authenticated user."""
+        """Return incidencias created by the authenticated user (cursor-paginated like the list)."""
         perfil = getattr(request.user, 'perfil', None)
         if not perfil:
             from usuario.models import Perfil as PerfilModel
             perfil = PerfilModel.objects.filter(user=request.user).first()
-        qs = Incidencia.objects.filter(usuario=perfil).order_by('-fecha_creacion')
+        qs = self.get_queryset().filter(usuario=perfil)
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = self.get_serializer(page, many=True, context={'request': request})
@@ -52,9 +76,10 @@ class IncidenciaViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         """Create an incidencia, but try to match against existing incidencias first.
 
-        Matching strategy (simple):
-        - If lat/lon provided, search recent incidencias within a small radius (e.g., 200m)
-        - Compute fuzzy similarity between titles (and descriptions) using SequenceMatcher
+        Matching strategy (see foro/duplicados.py):
+        - Candidates are recent incidencias sharing MinHash (trigram) bands with the title or description,
+          looked up in the BandaIncidencia index; if lat/lon provided, only those within ~200m (nearby cells)
+        - Candidates are scored by trigram similarity of titles (and descriptions)
         - If a candidate exceeds the threshold, create a Reporte linking the user to that incidencia
           and return the existing incidencia instead of creating a duplicate.
         - Otherwise, create a normal incidencia and save any uploaded images from 'imagenes'.
@@ -76,45 +101,17 @@ class IncidenciaViewSet(viewsets.ModelViewSet):
         except Exception:
             lat = lon = None
 
-        # search window
-        candidates = Incidencia.objects.none()
+        # indexed search: incidencias sharing MinHash bands with this text (nearby cells if lat/lon given)
         recent_cutoff = timezone.now() - timedelta(days=30)
-
-        if lat is not None and lon is not None:
-            # rough degree delta (approx): 1 deg lat ~ 111 km
-            radius_km = 0.2  # 200 meters
-            delta = radius_km / 111.0
-            candidates = Incidencia.objects.filter(
-                latitud__isnull=False, longitud__isnull=False,
-                latitud__gte=lat - delta, latitud__lte=lat + delta,
-                longitud__gte=lon - delta, longitud__lte=lon + delta,
-                fecha_creacion__gte=recent_cutoff
-            ).order_by('-fecha_creacion')[:50]
-        else:
-            # fallback: recent incidencias with similar words in title
-            words = [w for w in title.split()[:4] if len(w) > 2]
-            if words:
-                q = None
-                from django.db.models import Q
-                for w in words:
-                    q = (Q(titulo__icontains=w) | q) if q is not None else Q(titulo__icontains=w)
-                candidates = Incidencia.objects.filter(q, fecha_creacion__gte=recent_cutoff).order_by('-fecha_creacion')[:50]
-
-        # compute fuzzy similarity
-        best = None
-        best_score = 0.0
-        for cand in candidates:
-            score_title = SequenceMatcher(None, title.lower(), (cand.titulo or '').lower()).ratio() if title and cand.titulo else 0.0
-            score_desc = SequenceMatcher(None, description.lower(), (cand.descripcion or '').lower()).ratio() if description and cand.descripcion else 0.0
-            score = max(score_title, 0.7 * score_desc)
-            if score > best_score:
-                best_score = score
-                best = cand
+        best, best_score = buscar_duplicado(title, description, lat, lon, radio_metros=200, desde=recent_cutoff)
 
         MATCH_THRESHOLD = 0.7
         if best and best_score >= MATCH_THRESHOLD:
             # create a Reporte linking the user to the existing incidencia
             report, created = Reporte.objects.get_or_create(usuario=perfil, incidencia=best)
+            if created:
+                # the signal bumped num_reportes in the database, not on this instance
+                best.refresh_from_db(fields=['num_reportes'])
             serializer = self.get_serializer(best, context={'request': request})
             return Response({'matched': True, 'score': best_score, 'incidencia': serializer.data, 'report_created': created}, status=status.HTTP_200_OK)
 
@@ -168,9 +165,10 @@ class IncidenciaViewSet(viewsets.ModelViewSet):
 
 
 class ComentarioViewSet(viewsets.ModelViewSet):
-    queryset = Comentario.objects.all().order_by('fecha_creacion')
+    queryset = Comentario.objects.all().order_by('fecha_creacion', 'id')
     serializer_class = ComentarioSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ComentarioCursorPagination
 
     def perform_create(self, serializer):
         perfil = getattr(self.request.user, 'perfil', None)
@@ -304,9 +302,14 @@ class ReaccionViewSet(viewsets.ViewSet):
 
 
 class ReporteViewSet(viewsets.ModelViewSet):
-    queryset = Reporte.objects.all().order_by('-fecha_reporte')
+    queryset = Reporte.objects.select_related(
+        'usuario__user', 'incidencia__usuario__user', 'incidencia__distrito', 'incidencia__estado'
+    ).prefetch_related('incidencia__imagenes').order_by('-fecha_reporte', '-id')
     serializer_class = ReporteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReporteCursorPagination
+    # ?incidencia=<id>: "did I already report this one?" without scanning the paginated feed
+    filterset_fields = ['incidencia']
 
     def perform_create(self, serializer):
         perfil = getattr(self.request.user, 'perfil', None)
@@ -324,12 +327,12 @@ class ReporteViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        """Return reportes created by the authenticated user (paginated)."""
+        """Return reportes created by the authenticated user (cursor-paginated like the list, same filters)."""
         perfil = getattr(request.user, 'perfil', None)
         if not perfil:
             from usuario.models import Perfil as PerfilModel
             perfil = PerfilModel.objects.filter(user=request.user).first()
-        qs = self.queryset.filter(usuario=perfil)
+        qs = self.filter_queryset(self.queryset.filter(usuario=perfil))
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -345,9 +348,10 @@ class TipoReaccionViewSet(viewsets.ModelViewSet):
 
 
 class NotificacionViewSet(viewsets.ModelViewSet):
-    queryset = Notificacion.objects.all().order_by('-fecha_creacion')
+    queryset = Notificacion.objects.all().order_by('-fecha_creacion', '-id')
     serializer_class = NotificacionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FechaCursorPagination
 
     def get_queryset(self):
         # limit notifications to the current user
@@ -355,7 +359,9 @@ class NotificacionViewSet(viewsets.ModelViewSet):
         if not perfil:
             from usuario.models import Perfil as PerfilModel
             perfil = PerfilModel.objects.filter(user=self.request.user).first()
-        return Notificacion.objects.filter(usuario=perfil).order_by('-fecha_creacion')
+        return Notificacion.objects.filter(usuario=perfil).select_related(
+            'usuario__user', 'actor__user', 'incidencia__usuario__user', 'incidencia__distrito', 'incidencia__estado'
+        ).prefetch_related('incidencia__imagenes').order_by('-fecha_creacion', '-id')
     
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def mark_all_read(self, request):
@@ -396,17 +402,21 @@ class PreviewIncidenciasAPIView(APIView):
     Returns a compact list (using IncidenciaMinSerializer) filtered by:
       - district_id
       - estado (name or id)
-      - lat,lng,radius (km)
+      - lat,lng,radius (km, true circle; results include 'distancia' in meters)
       - from_date, to_date (YYYY-MM-DD or ISO)
+      - sort=distance to order by distance instead of newest first (with lat,lng)
 
     This endpoint is intentionally separate from the main ViewSet to avoid
     changing existing behavior.
     """
     permission_classes = [IsAuthenticatedOrReadOnly]
+    MAX_RADIUS_KM = 50  # one cell range per grid row: keeps the query bounded
 
     def get(self, request, *args, **kwargs):
         params = request.query_params
-        qs = Incidencia.objects.all().order_by('-fecha_creacion')
+        qs = Incidencia.objects.select_related(
+            'usuario__user', 'distrito', 'estado'
+        ).prefetch_related('imagenes').order_by('-fecha_creacion')
 
         # district filter: accept either id (district_id) or name (district)
         district_id = params.get('district_id')
@@ -445,20 +455,23 @@ class PreviewIncidenciasAPIView(APIView):
             # ignore invalid date formats, frontend should validate
             pass
 
-        # proximity filter (approximate, degrees)
+        # proximity filter: indexed grid cells, then exact haversine distance (annotated as 'distancia', meters)
         lat = params.get('lat')
         lng = params.get('lng')
+        near = False
         if lat and lng:
             try:
                 latf = float(lat); lngf = float(lng)
-                radius_km = float(params.get('radius', 0.5))
-                delta = radius_km / 111.0
-                qs = qs.filter(latitud__isnull=False, longitud__isnull=False,
-                               latitud__gte=latf - delta, latitud__lte=latf + delta,
-                               longitud__gte=lngf - delta, longitud__lte=lngf + delta)
+                radius_km = min(float(params.get('radius', 0.5)), self.MAX_RADIUS_KM)
+                qs = cercanas(qs, latf, lngf, radius_km * 1000)
+                near = True
             except Exception:
                 pass
 
+        # sort=distance: nearest first (only with lat/lng)
+        if near and params.get('sort') == 'distance':
+            qs = qs.order_by('distancia', '-fecha_creacion')
+
         # limit results to protect the frontend
         limit = 200
         results = qs[:limit]
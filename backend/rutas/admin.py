@@ -27,7 +27,12 @@ class RecorridoAdmin(admin.ModelAdmin):
     list_display = ('ruta', 'sentido', 'color_linea')
     list_filter = ('ruta__empresa', 'sentido')
     search_fields = ('ruta__codigo', 'ruta__nombre')
-    readonly_fields = ('coordenadas',)
+    readonly_fields = ('vertices',)
+    exclude = ('importancia_vertices',)
+
+    @admin.display(description='Vértices')
+    def vertices(self, obj):
+        return len(obj.coordenadas)
 
 
 @admin.register(Paradero)
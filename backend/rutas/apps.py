@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RutasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rutas'
+
+    def ready(self):
+        # conectar señales que invalidan la red en memoria
+        from . import signals  # noqa: F401
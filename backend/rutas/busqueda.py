@@ -0,0 +1,301 @@
+#rutas/busqueda.py
+# Lógica de búsqueda de rutas sobre la red en memoria, sin depender de la petición HTTP.
+# La usan las vistas buscar-rutas/ y buscar-rutas-combinadas/ y el comando buscar_rutas_lote.
+import logging
+from .metricas import etapa
+from .utils import proyectar_multiple, indices_de_rangos, simplificar, tolerancia_para_zoom, codificar_polilinea
+
+logger = logging.getLogger(__name__)
+
+RADIO_METROS = 1000
+DISTANCIA_MINIMA_SEGMENTO = 500  # metros mínimos en cada bus de una ruta combinada
+MAX_COMBINADAS = 10
+
+
+def opciones_geometria(parametros):
+    """
+    Lee las opciones de geometría de la petición (query string o cuerpo JSON):
+    - 'tolerancia': metros para simplificar con Douglas-Peucker
+    - 'zoom': nivel de zoom del mapa; se usa una tolerancia de 1 pixel (si no se envía 'tolerancia')
+    - 'formato': 'polyline' devuelve las líneas como Encoded Polyline en vez de listas [lat, lng]
+    Lanza ValueError si algún valor no es numérico.
+    """
+    parametros = parametros or {}
+    tolerancia = parametros.get('tolerancia')
+    zoom = parametros.get('zoom')
+    return {
+        'tolerancia': float(tolerancia) if tolerancia not in (None, '') else None,
+        'zoom': min(max(float(zoom), 0), 22) if zoom not in (None, '') else None,
+        'polilinea': parametros.get('formato') == 'polyline',
+    }
+
+
+SIN_OPCIONES = opciones_geometria({})
+
+
+def tolerancia_geometria(coordenadas, opciones):
+    """Tolerancia (metros) con la que se simplifica la geometría: 'tolerancia' o 1 pixel de 'zoom' (None = sin simplificar)"""
+    tolerancia = opciones['tolerancia']
+    if tolerancia is None and opciones['zoom'] is not None and len(coordenadas):
+        tolerancia = tolerancia_para_zoom(opciones['zoom'], float(coordenadas[0][0]))
+    return tolerancia
+
+
+def geometria_json(coordenadas, importancia, opciones, clave='coordenadas'):
+    """
+    Devuelve { clave: [[lat, lng], ...] } aplicando las opciones; con formato polyline la clave
+    cambia 'coordenadas' por 'polilinea' ('segmento_coordenadas' -> 'segmento_polilinea').
+    Sin opciones devuelve las coordenadas tal cual.
+    """
+    tolerancia = tolerancia_geometria(coordenadas, opciones)
+    if tolerancia:
+        coordenadas = simplificar(coordenadas, importancia, tolerancia)
+
+    if opciones['polilinea']:
+        clave_polilinea = clave.replace('coordenadas', 'polilinea')
+        return {clave_polilinea: codificar_polilinea(coordenadas)}
+    if hasattr(coordenadas, 'tolist'):
+        coordenadas = coordenadas.tolist()
+    return {clave: coordenadas}
+
+
+def importancia_recorrido(recorrido):
+    """Importancia Douglas-Peucker guardada del recorrido (None = extremo, se conserva siempre)"""
+    return [float('inf') if v is None else v for v in recorrido.importancia_vertices]
+
+
+def buscar_directas(red, punto_a, punto_b, opciones=SIN_OPCIONES):
+    """Recorridos que pasan a menos de RADIO_METROS de A y de B, con el tramo entre ambos puntos"""
+    with etapa('cercania'):
+        # Solo recorridos con segmentos en las celdas cercanas a A y a B
+        cerca_a = red.indice.candidatos(punto_a, RADIO_METROS)
+        cerca_b = red.indice.candidatos(punto_b, RADIO_METROS)
+        ids_candidatos = [rid for rid in red.ids.tolist() if rid in cerca_a and rid in cerca_b]
+
+        encontrados = []
+        for rec_id in ids_candidatos:
+            # Origen y destino se proyectan juntos sobre los segmentos cercanos (una pasada vectorizada)
+            segmentos = indices_de_rangos(cerca_a[rec_id] + cerca_b[rec_id])
+            datos_inicio, datos_fin = proyectar_multiple(
+                [punto_a, punto_b], red.arreglo(rec_id), segmentos
+            )
+
+            if datos_inicio['distancia'] <= RADIO_METROS and datos_fin['distancia'] <= RADIO_METROS:
+                encontrados.append((rec_id, datos_inicio, datos_fin))
+
+    rutas_directas = []
+
+    with etapa('segmentos'):
+        for rec_id, datos_inicio, datos_fin in encontrados:
+            pos_inicio = datos_inicio['posicion']
+            pos_fin = datos_fin['posicion']
+
+            inicio_real = min(pos_inicio, pos_fin)
+            fin_real = max(pos_inicio, pos_fin)
+
+            coords_finales, importancia = red.tramo(rec_id, inicio_real, fin_real)
+
+            rutas_directas.append({
+                **red.info(rec_id),
+                **geometria_json(coords_finales, importancia, opciones),
+                'distancia_a_origen': int(datos_inicio['distancia']),
+                'distancia_a_destino': int(datos_fin['distancia'])
+            })
+
+    return rutas_directas
+
+
+def buscar_combinadas(red, punto_a, punto_b, opciones=SIN_OPCIONES):
+    """
+    Combinaciones de dos recorridos (A -> transbordo -> B) ordenadas por distancia total.
+    Los transbordos (máx. 100m, sin caminar) vienen del grafo precalculado por calcular_transbordos.
+    """
+    with etapa('cercania'):
+        cerca_a = red.indice.candidatos(punto_a, RADIO_METROS)
+        cerca_b = red.indice.candidatos(punto_b, RADIO_METROS)
+
+        # Encontrar rutas cerca del punto A y del punto B (ambos puntos en una sola pasada)
+        rutas_desde_a = []
+        rutas_hasta_b = {}
+        for rec_id in red.ids.tolist():
+            if rec_id not in cerca_a and rec_id not in cerca_b:
+                continue
+            coordenadas_ruta = red.arreglo(rec_id)
+            if len(coordenadas_ruta) < 10:
+                continue
+
+            rec = {**red.info(rec_id), 'coordenadas': coordenadas_ruta}
+            segmentos = indices_de_rangos(cerca_a.get(rec_id, []) + cerca_b.get(rec_id, []))
+            datos_inicio, datos_fin = proyectar_multiple([punto_a, punto_b], coordenadas_ruta, segmentos)
+            if datos_inicio['distancia'] <= RADIO_METROS:
+                rutas_desde_a.append({
+                    'recorrido': rec,
+                    'punto_inicio': datos_inicio,
+                    'indice_inicio': datos_inicio['indice'],
+                    'posicion_inicio': datos_inicio['posicion']
+                })
+
+            if datos_fin['distancia'] <= RADIO_METROS:
+                rutas_hasta_b[rec_id] = {
+                    'recorrido': rec,
+                    'punto_fin': datos_fin,
+                    'indice_fin': datos_fin['indice'],
+                    'posicion_fin': datos_fin['posicion']
+                }
+
+    logger.debug('Rutas desde A: %d, rutas hasta B: %d', len(rutas_desde_a), len(rutas_hasta_b))
+
+    # Recorrer el grafo de transbordos desde cada ruta que pasa por A; se guarda el mejor transbordo
+    # por combinación y las geometrías se arman después, solo para los elegidos
+    elegidos = []
+    with etapa('transbordos'):
+        for ruta_a in rutas_desde_a:
+            mejores_por_destino = {}
+
+            id_a = ruta_a['recorrido']['id']
+            for id_b, indice_a, indice_b, distancia_transbordo in red.transbordos.get(id_a, []):
+                # 1. Solo rutas que llegan a B (la misma ruta ya es ruta directa)
+                ruta_b = rutas_hasta_b.get(id_b)
+                if ruta_b is None:
+                    continue
+
+                # 2. El transbordo debe estar después de subir en A y antes de bajar en B
+                if indice_a <= ruta_a['posicion_inicio'] or indice_b >= ruta_b['posicion_fin']:
+                    continue
+
+                # 3. VERIFICAR DIRECCIÓN GEOGRÁFICA
+                if not tiene_direccion_correcta(ruta_a, ruta_b, punto_a, punto_b):
+                    continue
+
+                # Validar que los segmentos tengan sentido (no sean muy cortos): longitudes exactas por chainage
+                with etapa('segmentos'):
+                    dist_segmento_a = red.distancia_entre(id_a, ruta_a['posicion_inicio'], indice_a)
+                    dist_segmento_b = red.distancia_entre(id_b, indice_b, ruta_b['posicion_fin'])
+
+                if dist_segmento_a < DISTANCIA_MINIMA_SEGMENTO or dist_segmento_b < DISTANCIA_MINIMA_SEGMENTO:
+                    continue
+
+                distancia_total = dist_segmento_a + dist_segmento_b
+
+                # Solo el mejor transbordo por combinación
+                mejor = mejores_por_destino.get(id_b)
+                if mejor is not None and int(mejor[0]) <= distancia_total:
+                    continue
+
+                mejores_por_destino[id_b] = (
+                    distancia_total, ruta_a, ruta_b, indice_a, indice_b,
+                    distancia_transbordo, dist_segmento_a, dist_segmento_b
+                )
+
+            elegidos.extend(mejores_por_destino.values())
+
+    # Ordenar por distancia total (orden estable: igual que antes a igual distancia)
+    elegidos.sort(key=lambda x: int(x[0]))
+    elegidos = elegidos[:MAX_COMBINADAS]
+
+    rutas_combinadas = []
+    with etapa('segmentos'):
+        for (distancia_total, ruta_a, ruta_b, indice_a, indice_b,
+             distancia_transbordo, dist_segmento_a, dist_segmento_b) in elegidos:
+            id_a = ruta_a['recorrido']['id']
+            id_b = ruta_b['recorrido']['id']
+            tiempo_estimado = (distancia_total / 4) / 60 + 3  # 3 min para transbordo corto
+            segmento_a = red.tramo(id_a, ruta_a['posicion_inicio'], indice_a)
+            segmento_b = red.tramo(id_b, indice_b, ruta_b['posicion_fin'])
+            coord_transbordo = ruta_a['recorrido']['coordenadas'][indice_a]
+
+            rutas_combinadas.append({
+                'id': f"{id_a}-{id_b}-{indice_a}",
+                'rutas': [
+                    {
+                        'ruta': {
+                            'id': id_a,
+                            'nombre_ruta': ruta_a['recorrido']['nombre_ruta'],
+                            'empresa': ruta_a['recorrido']['empresa'],
+                            'sentido': ruta_a['recorrido']['sentido'],
+                            'color': ruta_a['recorrido']['color'],
+                            'distancia_a_origen': int(ruta_a['punto_inicio']['distancia']),
+                            'distancia_a_destino': int(distancia_transbordo)
+                        },
+                        **geometria_json(*segmento_a, opciones, clave='segmento_coordenadas'),
+                        'distancia': int(dist_segmento_a)
+                    },
+                    {
+                        'ruta': {
+                            'id': id_b,
+                            'nombre_ruta': ruta_b['recorrido']['nombre_ruta'],
+                            'empresa': ruta_b['recorrido']['empresa'],
+                            'sentido': ruta_b['recorrido']['sentido'],
+                            'color': ruta_b['recorrido']['color'],
+                            'distancia_a_origen': int(distancia_transbordo),
+                            'distancia_a_destino': int(ruta_b['punto_fin']['distancia'])
+                        },
+                        **geometria_json(*segmento_b, opciones, clave='segmento_coordenadas'),
+                        'distancia': int(dist_segmento_b)
+                    }
+                ],
+                'distancia_total': int(distancia_total),
+                'tiempo_estimado_minutos': int(tiempo_estimado),
+                'punto_transbordo': {
+                    'lat': float(coord_transbordo[0]),
+                    'lng': float(coord_transbordo[1])
+                },
+                'distancia_transbordo': int(distancia_transbordo)
+            })
+
+    return rutas_combinadas
+
+
+def tiene_direccion_correcta(ruta_a, ruta_b, punto_a, punto_b):
+    """
+    Verifica que las rutas tengan dirección correcta:
+    - Ruta A debe ir desde punto_a hacia alguna dirección
+    - Ruta B debe ir hacia punto_b desde alguna dirección
+    - El transbordo debe estar lógicamente entre medio
+    """
+    try:
+        coords_a = ruta_a['recorrido']['coordenadas']
+        coords_b = ruta_b['recorrido']['coordenadas']
+
+        if len(coords_a) < 2 or len(coords_b) < 2:
+            return False
+
+        # Para Ruta A: el punto A debe estar antes en la ruta que la mayoría de las coordenadas
+        idx_a = ruta_a['indice_inicio']
+        porcentaje_posicion_a = idx_a / len(coords_a)
+
+        # Para Ruta B: el punto B debe estar después en la ruta que la mayoría de las coordenadas
+        idx_b = ruta_b['indice_fin']
+        porcentaje_posicion_b = idx_b / len(coords_b)
+
+        # Ruta A debe tener punto A en el primer 70% del recorrido
+        # Ruta B debe tener punto B en el último 70% del recorrido
+        if porcentaje_posicion_a > 0.7 or porcentaje_posicion_b < 0.3:
+            return False
+
+        # Verificar dirección general usando vectores aproximados
+        inicio_a = coords_a[max(0, idx_a - 5)]  # Punto antes de A
+        fin_a = coords_a[min(len(coords_a) - 1, idx_a + 5)]  # Punto después de A
+
+        inicio_b = coords_b[max(0, idx_b - 5)]  # Punto antes de B
+        fin_b = coords_b[min(len(coords_b) - 1, idx_b + 5)]  # Punto después de B
+
+        # Calcular direcciones aproximadas
+        dir_a_lat = fin_a[0] - inicio_a[0]
+        dir_a_lng = fin_a[1] - inicio_a[1]
+
+        dir_b_lat = fin_b[0] - inicio_b[0]
+        dir_b_lng = fin_b[1] - inicio_b[1]
+
+        # La dirección general debe ser coherente (no opuesta)
+        producto_punto = (dir_a_lat * dir_b_lat) + (dir_a_lng * dir_b_lng)
+
+        # Si el producto punto es negativo, las direcciones son opuestas
+        if producto_punto < -0.1:  # Margen para errores
+            return False
+
+        return True
+
+    except Exception:
+        logger.exception('Error al verificar la dirección del transbordo')
+        return True  # En caso de error, permitir la combinación
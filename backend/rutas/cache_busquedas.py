@@ -0,0 +1,59 @@
+#rutas/cache_busquedas.py
+from django.conf import settings
+from .cache_versionada import CacheVersionada
+
+CONFIGURACION_POR_DEFECTO = {
+    'CAPACIDAD': 2000,
+    'TTL_SEGUNDOS': 600,
+    'DECIMALES': 3,
+}
+
+
+class CacheBusquedas(CacheVersionada):
+    """
+    Caché LRU con expiración (TTL) para los resultados de búsqueda de rutas.
+    Origen y destino se redondean a 'decimales' decimales (3 = celdas de ~100 m) y el resultado se calcula
+    con los puntos redondeados: las distancias a origen y destino y el filtro por radio son los de ese punto,
+    no los de un punto vecino. Comparten resultado las búsquedas desde la misma cuadra.
+    El desalojo LRU, la expiración y el descarte al cambiar la versión de la red son los de CacheVersionada.
+    """
+
+    def __init__(self, capacidad, ttl, decimales):
+        super().__init__(capacidad, ttl, metrica='cache')
+        self.decimales = decimales
+
+    def redondear(self, punto):
+        return (round(float(punto['lat']), self.decimales), round(float(punto['lng']), self.decimales))
+
+    def ajustar(self, punto):
+        """Punto con el que buscar() calcula el resultado: el punto redondeado (el mismo punto sin caché)"""
+        if self.capacidad <= 0:
+            return punto
+        lat, lng = self.redondear(punto)
+        return {'lat': lat, 'lng': lng}
+
+    def buscar(self, tipo, red, punto_a, punto_b, opciones, funcion):
+        """Devuelve funcion(red, punto_a, punto_b, opciones), usando el resultado guardado si existe"""
+        if self.capacidad <= 0:
+            return funcion(red, punto_a, punto_b, opciones)
+
+        clave = (tipo, self.redondear(punto_a), self.redondear(punto_b), tuple(sorted(opciones.items())))
+        return self.obtener(
+            clave, red.version, lambda: funcion(red, self.ajustar(punto_a), self.ajustar(punto_b), opciones)
+        )
+
+    def estadisticas(self):
+        return {**super().estadisticas(), 'decimales': self.decimales}
+
+
+def _crear_cache():
+    configuracion = {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'RUTAS_CACHE_BUSQUEDAS', {})}
+    return CacheBusquedas(
+        int(configuracion['CAPACIDAD']),
+        float(configuracion['TTL_SEGUNDOS']),
+        int(configuracion['DECIMALES'])
+    )
+
+
+# Caché compartida por el proceso
+cache_busquedas = _crear_cache()
@@ -0,0 +1,38 @@
+#rutas/cache_respuestas.py
+from django.conf import settings
+from .cache_versionada import CacheVersionada
+
+
+class CacheRespuestas(CacheVersionada):
+    """
+    Caché LRU del cuerpo JSON ya serializado (bytes) de ruta_json, recorrido_json y las teselas.
+    Cada entrada vale para una versión de la red: cuando la versión cambia se descartan todas,
+    así que no hace falta expiración por tiempo. Con bytes_maximos el total de los cuerpos queda acotado.
+    """
+
+    def __init__(self, capacidad, bytes_maximos=None):
+        super().__init__(capacidad, bytes_maximos=bytes_maximos)
+
+    def tamano(self, valor):
+        return len(valor)
+
+    def estadisticas(self):
+        with self._lock:
+            bytes_guardados = self._bytes
+        return {**super().estadisticas(), 'bytes': bytes_guardados, 'bytes_maximos': self.bytes_maximos}
+
+
+def _crear_cache(nombre_configuracion, capacidad_por_defecto, bytes_maximos_por_defecto=None):
+    configuracion = {
+        'CAPACIDAD': capacidad_por_defecto,
+        'BYTES_MAXIMOS': bytes_maximos_por_defecto,
+        **getattr(settings, nombre_configuracion, {}),
+    }
+    bytes_maximos = configuracion['BYTES_MAXIMOS']
+    return CacheRespuestas(int(configuracion['CAPACIDAD']), int(bytes_maximos) if bytes_maximos else None)
+
+
+# Cachés compartidas por el proceso
+cache_respuestas = _crear_cache('RUTAS_CACHE_RESPUESTAS', 500)
+# Una tesela de zoom alto con muchas líneas pesa cientos de KB: el límite que manda es el de bytes
+cache_teselas = _crear_cache('RUTAS_CACHE_TESELAS', 2000, 64 * 1024 * 1024)
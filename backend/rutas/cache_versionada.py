@@ -0,0 +1,105 @@
+#rutas/cache_versionada.py
+import math
+import threading
+import time
+from collections import OrderedDict
+from .metricas import anotar
+
+
+class CacheVersionada:
+    """
+    Caché LRU en memoria atada a la versión de la red, base de la caché de búsquedas y de respuestas.
+    Cada entrada vale para una versión: cuando la versión cambia se descartan todas de una vez.
+    Con ttl (segundos) las entradas además expiran por tiempo; sin ttl duran lo que dure la versión.
+    Con metrica, los aciertos y fallos se anotan también en las métricas de la petición.
+    Con bytes_maximos se desalojan además las menos usadas mientras la suma de tamano(valor) lo supere.
+    """
+
+    def __init__(self, capacidad, ttl=None, metrica=None, bytes_maximos=None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.metrica = metrica
+        self.bytes_maximos = bytes_maximos
+        self._entradas = OrderedDict()  # clave -> (expira, valor)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.desalojados = 0
+
+    def tamano(self, valor):
+        """Bytes que ocupa un valor, para bytes_maximos (sin límite por bytes no se cuentan)"""
+        return 0
+
+    def _quitar(self, clave):
+        self._bytes -= self.tamano(self._entradas.pop(clave)[1])
+
+    def _excedida(self):
+        if len(self._entradas) > self.capacidad:
+            return True
+        return self.bytes_maximos is not None and self._bytes > self.bytes_maximos
+
+    def _anotar(self, evento):
+        if self.metrica:
+            anotar(self.metrica, evento)
+
+    def obtener(self, clave, version, generar):
+        """Devuelve el valor guardado para la clave en esa versión; si no hay (o expiró), lo genera con generar()"""
+        if self.capacidad <= 0:
+            return generar()
+
+        ahora = time.monotonic()
+        with self._lock:
+            if self._version != version:
+                self._entradas.clear()
+                self._bytes = 0
+                self._version = version
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[0] > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    self._anotar('acierto')
+                    return entrada[1]
+                self._quitar(clave)
+                self.expirados += 1
+            self.fallos += 1
+        self._anotar('fallo')
+
+        # Se genera fuera del lock: dos fallos simultáneos de la misma clave generan lo mismo
+        valor = generar()
+
+        with self._lock:
+            if self._version == version:
+                expira = ahora + self.ttl if self.ttl is not None else math.inf
+                if clave in self._entradas:
+                    self._quitar(clave)
+                self._entradas[clave] = (expira, valor)
+                self._bytes += self.tamano(valor)
+                while self._entradas and self._excedida():
+                    self._quitar(next(iter(self._entradas)))
+                    self.desalojados += 1
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            self._version = None
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'capacidad': self.capacidad,
+                'ttl_segundos': self.ttl,
+                'version_red': self._version,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else None,
+                'expirados': self.expirados,
+                'desalojados': self.desalojados,
+            }
@@ -0,0 +1,90 @@
+#rutas/indice_espacial.py
+import math
+import numpy as np
+from .utils import a_arreglo, METROS_POR_GRADO
+
+TAMANO_CELDA_GRADOS = 0.005  # ~550 m de lado en Arequipa
+
+
+class IndiceEspacial:
+    """
+    Índice de grilla en memoria sobre los segmentos de los recorridos.
+    El segmento i de un recorrido une los vértices i e i + 1. Cada celda guarda
+    { recorrido_id: [(inicio, fin), ...] } con los rangos de segmentos consecutivos
+    cuya caja (bounding box) toca la celda. Un segmento largo se registra en todas las celdas de su caja.
+    La búsqueda es una consulta a un diccionario por celda: no depende del tamaño de la red.
+    Además conserva las coordenadas de cada recorrido como arreglo contiguo float64 (n, 2).
+    """
+
+    def __init__(self, tamano_celda=TAMANO_CELDA_GRADOS):
+        self.tamano_celda = tamano_celda
+        self.celdas = {}
+        self.arreglos = {}
+
+    def celda(self, lat, lng):
+        return (math.floor(lat / self.tamano_celda), math.floor(lng / self.tamano_celda))
+
+    def agregar_recorrido(self, recorrido_id, coordenadas):
+        """Registra los segmentos del recorrido agrupándolos en rangos por celda"""
+        arreglo = a_arreglo(coordenadas)
+        self.arreglos[recorrido_id] = arreglo
+        if len(arreglo) < 2:
+            return
+
+        # Caja de celdas de cada segmento: (fila_min, fila_max, col_min, col_max)
+        celdas = np.floor(arreglo / self.tamano_celda).astype(np.int64)
+        cajas = np.column_stack((
+            np.minimum(celdas[:-1, 0], celdas[1:, 0]), np.maximum(celdas[:-1, 0], celdas[1:, 0]),
+            np.minimum(celdas[:-1, 1], celdas[1:, 1]), np.maximum(celdas[:-1, 1], celdas[1:, 1]),
+        ))
+
+        # Un rango nuevo empieza cada vez que la caja del segmento cambia
+        cambios = np.flatnonzero((cajas[1:] != cajas[:-1]).any(axis=1)) + 1
+        inicios = np.concatenate(([0], cambios))
+        fines = np.concatenate((cambios - 1, [len(cajas) - 1]))
+
+        for inicio, fin in zip(inicios.tolist(), fines.tolist()):
+            fila_min, fila_max, col_min, col_max = cajas[inicio].tolist()
+            for fila in range(fila_min, fila_max + 1):
+                for col in range(col_min, col_max + 1):
+                    self._registrar((fila, col), recorrido_id, inicio, fin)
+
+    def _registrar(self, celda, recorrido_id, inicio, fin):
+        self.celdas.setdefault(celda, {}).setdefault(recorrido_id, []).append((inicio, fin))
+
+    def candidatos(self, punto, radio_metros):
+        """
+        Devuelve { recorrido_id: [(inicio, fin), ...] } con los rangos de segmentos
+        registrados en las celdas que cubren el círculo de radio_metros alrededor del punto.
+        Todo segmento (y todo vértice) a menos de radio_metros del punto está dentro de algún rango devuelto.
+        """
+        return self.candidatos_caja(punto['lat'], punto['lat'], punto['lng'], punto['lng'], radio_metros)
+
+    def candidatos_caja(self, lat_min, lat_max, lng_min, lng_max, radio_metros=0):
+        """Igual que candidatos, para una caja [lat_min, lat_max] x [lng_min, lng_max] ampliada en radio_metros"""
+        lat_ref = max(abs(lat_min), abs(lat_max))
+        delta_lat = radio_metros / METROS_POR_GRADO
+        delta_lng = radio_metros / (METROS_POR_GRADO * max(math.cos(math.radians(lat_ref)), 1e-6))
+
+        fila_min, col_min = self.celda(lat_min - delta_lat, lng_min - delta_lng)
+        fila_max, col_max = self.celda(lat_max + delta_lat, lng_max + delta_lng)
+
+        # Una caja con más celdas que las ocupadas (teselas de zoom bajo) recorre solo las ocupadas:
+        # el costo queda acotado por el tamaño del índice y no por el área de la caja
+        if (fila_max - fila_min + 1) * (col_max - col_min + 1) > len(self.celdas):
+            celdas = (
+                contenido for (fila, col), contenido in self.celdas.items()
+                if fila_min <= fila <= fila_max and col_min <= col <= col_max
+            )
+        else:
+            celdas = (
+                self.celdas.get((fila, col), {})
+                for fila in range(fila_min, fila_max + 1) for col in range(col_min, col_max + 1)
+            )
+
+        resultado = {}
+        for contenido in celdas:
+            for recorrido_id, rangos in contenido.items():
+                resultado.setdefault(recorrido_id, []).extend(rangos)
+
+        return resultado
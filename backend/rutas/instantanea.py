@@ -0,0 +1,94 @@
+#rutas/instantanea.py
+# Red completa en un solo documento versionado (red/instantanea/) y los cambios desde una versión (red/cambios/),
+# para que el cliente guarde la red localmente y solo pida lo modificado.
+from django.db.models import Prefetch
+from .busqueda import geometria_json, importancia_recorrido
+from .models import Empresa, Ruta, Recorrido, Paradero, RecorridoParadero, CambioRed, VersionRed
+
+TOLERANCIA_POR_DEFECTO = 5  # metros; los recorridos se envían simplificados
+
+
+def parametros_instantanea(parametros):
+    """Por defecto los recorridos van simplificados a TOLERANCIA_POR_DEFECTO y como Encoded Polyline"""
+    return {'tolerancia': TOLERANCIA_POR_DEFECTO, 'formato': 'polyline', **parametros.dict()}
+
+
+def empresas_json(empresas):
+    return [
+        {'id': e.id, 'nombre': e.nombre, 'descripcion': e.descripcion, 'color_principal': e.color_principal}
+        for e in empresas
+    ]
+
+
+def rutas_json(rutas):
+    return [{'id': r.id, 'empresa_id': r.empresa_id, 'nombre': r.nombre, 'codigo': r.codigo} for r in rutas]
+
+
+def recorridos_json(recorridos, opciones):
+    """Recorridos simplificados; 'paraderos' es la lista [paradero_id, orden, distancia_recorrido] en orden"""
+    recorridos = recorridos.prefetch_related(Prefetch(
+        'recorrido_paraderos', queryset=RecorridoParadero.objects.order_by('orden', 'id')
+    ))
+    return [
+        {
+            'id': r.id,
+            'ruta_id': r.ruta_id,
+            'sentido': r.sentido,
+            'color_linea': r.color_linea,
+            'grosor_linea': r.grosor_linea,
+            **geometria_json(r.coordenadas, importancia_recorrido(r), opciones),
+            'paraderos': [
+                [rp.paradero_id, rp.orden, rp.distancia_recorrido] for rp in r.recorrido_paraderos.all()
+            ],
+        }
+        for r in recorridos
+    ]
+
+
+def paraderos_json(paraderos):
+    return [
+        {'id': p.id, 'nombre': p.nombre, 'latitud': p.latitud, 'longitud': p.longitud, 'es_popular': p.es_popular}
+        for p in paraderos
+    ]
+
+
+# Nombre en CambioRed -> (clave en la respuesta, modelo, serializador)
+COLECCIONES = {
+    'empresa': ('empresas', Empresa, lambda qs, opciones: empresas_json(qs)),
+    'ruta': ('rutas', Ruta, lambda qs, opciones: rutas_json(qs)),
+    'recorrido': ('recorridos', Recorrido, recorridos_json),
+    'paradero': ('paraderos', Paradero, lambda qs, opciones: paraderos_json(qs)),
+}
+
+
+def generar_instantanea(version, opciones):
+    """Toda la red: empresas, rutas, recorridos (con sus paraderos) y paraderos"""
+    datos = {'version': version}
+    for clave, modelo, serializar in COLECCIONES.values():
+        datos[clave] = serializar(modelo.objects.order_by('id'), opciones)
+    return datos
+
+
+def generar_cambios(desde, version, opciones):
+    """
+    Objetos creados o modificados después de 'desde' (con sus datos actuales) y los ids de los borrados.
+    Devuelve None si el registro de cambios no alcanza a cubrir esa versión: el cliente debe
+    volver a pedir la instantánea completa.
+    """
+    base = VersionRed.objects.filter(pk=1).values_list('version_base_cambios', flat=True).first() or 0
+    if desde < base:
+        return None
+
+    ids_por_modelo = {}
+    for modelo, objeto_id in CambioRed.objects.filter(version__gt=desde, version__lte=version).values_list(
+        'modelo', 'objeto_id'
+    ):
+        ids_por_modelo.setdefault(modelo, set()).add(objeto_id)
+
+    datos = {'version': version, 'desde': desde, 'eliminados': {}}
+    for nombre, (clave, modelo, serializar) in COLECCIONES.items():
+        ids = ids_por_modelo.get(nombre, set())
+        objetos = serializar(modelo.objects.filter(id__in=ids).order_by('id'), opciones) if ids else []
+        datos[clave] = objetos
+        datos['eliminados'][clave] = sorted(ids - {objeto['id'] for objeto in objetos})
+    return datos
@@ -0,0 +1,50 @@
+#rutas/kml.py
+# Lectura de archivos KML sin depender de Django: se puede usar desde procesos hijos (cargar_kml --paralelo).
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ET
+
+ETIQUETA_COORDENADAS = '{http://www.opengis.net/kml/2.2}coordinates'
+
+
+def hash_archivo(archivo_path):
+    """SHA-256 (hex) del contenido del archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(archivo_path, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 16), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def parsear_kml_iterativo(archivo_path):
+    """
+    Extrae las coordenadas [lat, lng] de un archivo KML leyéndolo por partes (iterparse):
+    cada elemento se libera apenas se procesa, así la memoria no crece con el tamaño del archivo.
+    """
+    coordenadas = []
+    for _, elemento in ET.iterparse(archivo_path, events=('end',)):
+        if elemento.tag == ETIQUETA_COORDENADAS and elemento.text:
+            for coord in elemento.text.split():
+                partes = coord.split(',')
+                if len(partes) >= 2:
+                    lng = float(partes[0])
+                    lat = float(partes[1])
+                    coordenadas.append([lat, lng])
+        elemento.clear()
+    return coordenadas
+
+
+def leer_archivo(archivo_path):
+    """
+    Tarea de un proceso de cargar_kml --paralelo.
+    Devuelve (nombre del archivo, coordenadas, segundos, error); error es None si se leyó bien.
+    """
+    inicio = time.perf_counter()
+    try:
+        coordenadas = parsear_kml_iterativo(archivo_path)
+        error = None
+    except (ET.ParseError, OSError, ValueError) as e:
+        coordenadas = []
+        error = str(e)
+    return os.path.basename(archivo_path), coordenadas, time.perf_counter() - inicio, error
@@ -0,0 +1,195 @@
+import io
+import json
+import platform
+import subprocess
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from rutas.cache_busquedas import cache_busquedas
+from rutas.models import VersionRed
+from rutas.red import RedRutas, obtener_red
+from rutas.sintetico import generar_red_sintetica, pares_consulta
+from rutas.utils import (
+    distancias_haversine, proyectar_multiple, tramo_entre, importancia_douglas_peucker, codificar_polilinea
+)
+
+
+def resumen_tiempos(tiempos):
+    """Throughput y percentiles (ms) de una lista de duraciones en segundos"""
+    arreglo = np.array(tiempos) * 1000
+    total = float(arreglo.sum()) / 1000
+    return {
+        'n': len(tiempos),
+        'total_s': round(total, 4),
+        'por_segundo': round(len(tiempos) / total, 2) if total else None,
+        'media_ms': round(float(arreglo.mean()), 4),
+        'p50_ms': round(float(np.percentile(arreglo, 50)), 4),
+        'p90_ms': round(float(np.percentile(arreglo, 90)), 4),
+        'p99_ms': round(float(np.percentile(arreglo, 99)), 4),
+        'max_ms': round(float(arreglo.max()), 4),
+    }
+
+
+def medir(funcion, argumentos, calentamiento=0):
+    """Llama funcion(*a) para cada a de argumentos y devuelve el resumen de tiempos"""
+    for a in argumentos[:calentamiento]:
+        funcion(*a)
+    tiempos = []
+    for a in argumentos:
+        inicio = time.perf_counter()
+        funcion(*a)
+        tiempos.append(time.perf_counter() - inicio)
+    return resumen_tiempos(tiempos)
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la búsqueda de rutas (vistas y primitivas de rutas.utils) sobre una red sintética '
+        'determinista creada en una base de datos de prueba, y escribe un reporte JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recorridos', type=int, default=200, help='Recorridos de la red sintética')
+        parser.add_argument('--vertices', type=int, default=1000, help='Vértices por recorrido')
+        parser.add_argument('--consultas', type=int, default=200, help='Pares origen-destino por vista')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de la red y de las consultas')
+        parser.add_argument('--calentamiento', type=int, default=10,
+                            help='Consultas iniciales que se ejecutan sin medir')
+        parser.add_argument('--con-cache', action='store_true', dest='con_cache',
+                            help='Dejar activa la caché de búsquedas (por defecto se desactiva)')
+        parser.add_argument('--bd-actual', action='store_true', dest='bd_actual',
+                            help='Medir con los datos de la base de datos configurada en vez de una red sintética')
+        parser.add_argument('--salida', default='-', help='Archivo JSON del reporte ("-" para stdout)')
+
+    def handle(self, *args, **options):
+        # Entorno de pruebas: permite el cliente de pruebas de DRF (ALLOWED_HOSTS) también con --bd-actual
+        setup_test_environment()
+        nombre_original = None
+        if not options['bd_actual']:
+            # Base de datos de prueba descartable: la red sintética nunca toca los datos reales
+            nombre_original = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        capacidad_cache = cache_busquedas.capacidad
+        if not options['con_cache']:
+            cache_busquedas.capacidad = 0
+        try:
+            reporte = self.medir_todo(options)
+        finally:
+            cache_busquedas.capacidad = capacidad_cache
+            if nombre_original is not None:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+        if options['salida'] == '-':
+            self.stdout.write(texto)
+        else:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(self.style.SUCCESS(f"✓ Reporte escrito en {options['salida']}"))
+
+    def paso(self, mensaje):
+        self.stderr.write(mensaje)
+
+    def medir_todo(self, options):
+        reporte = {
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': commit_actual(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'parametros': {k: options[k] for k in (
+                'recorridos', 'vertices', 'consultas', 'semilla', 'calentamiento', 'con_cache', 'bd_actual'
+            )},
+            'preparacion': {},
+            'resultados': {},
+        }
+        preparacion = reporte['preparacion']
+
+        if not options['bd_actual']:
+            self.paso(f"Generando red sintética ({options['recorridos']} x {options['vertices']} vértices)...")
+            inicio = time.perf_counter()
+            preparacion['filas'] = generar_red_sintetica(
+                options['recorridos'], options['vertices'], options['semilla']
+            )
+            preparacion['generacion_s'] = round(time.perf_counter() - inicio, 3)
+
+            self.paso('Calculando transbordos...')
+            inicio = time.perf_counter()
+            call_command('calcular_transbordos', stdout=io.StringIO())
+            preparacion['transbordos_s'] = round(time.perf_counter() - inicio, 3)
+
+        inicio = time.perf_counter()
+        red = RedRutas.desde_bd(VersionRed.actual())
+        preparacion['carga_red_s'] = round(time.perf_counter() - inicio, 3)
+        preparacion['red'] = {
+            'recorridos': len(red),
+            'vertices': int(len(red.coordenadas)),
+            'transbordos': sum(len(t) for t in red.transbordos.values()),
+            'paraderos': len(red.paradero_ids),
+        }
+        obtener_red()  # deja la red del proceso cargada antes de medir las vistas
+
+        pares = pares_consulta(red, options['consultas'], options['semilla'])
+        calentamiento = options['calentamiento']
+        resultados = reporte['resultados']
+        cliente = APIClient()
+
+        def vista(url, datos):
+            respuesta = cliente.post(url, datos, format='json')
+            if respuesta.status_code != 200:
+                raise RuntimeError(f'{url} devolvió {respuesta.status_code}')
+
+        for nombre, url, extra in (
+            ('buscar_rutas_view', '/api/rutas/buscar-rutas/', {}),
+            ('buscar_rutas_combinadas_view', '/api/rutas/buscar-rutas-combinadas/', {}),
+            ('buscar_rutas_view_polyline_zoom14', '/api/rutas/buscar-rutas/', {'formato': 'polyline', 'zoom': 14}),
+            ('planificar_viaje_view', '/api/rutas/planificar-viaje/', {}),
+        ):
+            self.paso(f'Midiendo {nombre}...')
+            argumentos = [(url, {'punto_a': a, 'punto_b': b, **extra}) for a, b in pares]
+            resultados[nombre] = medir(vista, argumentos, calentamiento)
+
+        # Primitivas de rutas.utils sobre recorridos reales de la red
+        self.paso('Midiendo primitivas de rutas.utils...')
+        rng = np.random.default_rng(options['semilla'])
+        ids = red.ids[rng.integers(0, len(red), len(pares))].tolist()
+        puntos = [np.array([[a['lat'], a['lng']], [b['lat'], b['lng']]]) for a, b in pares]
+        arreglos = [red.arreglo(rid) for rid in ids]
+
+        resultados['utils.distancias_haversine'] = medir(
+            distancias_haversine, list(zip(puntos, arreglos)), calentamiento
+        )
+        resultados['utils.proyectar_multiple'] = medir(
+            proyectar_multiple, [([a, b], arreglo) for (a, b), arreglo in zip(pares, arreglos)], calentamiento
+        )
+        resultados['utils.tramo_entre'] = medir(
+            tramo_entre, [(arreglo, len(arreglo) * 0.25, len(arreglo) * 0.75) for arreglo in arreglos], calentamiento
+        )
+        resultados['utils.importancia_douglas_peucker'] = medir(
+            importancia_douglas_peucker, [(arreglo,) for arreglo in arreglos[:50]], min(calentamiento, 5)
+        )
+        resultados['utils.codificar_polilinea'] = medir(
+            codificar_polilinea, [(arreglo,) for arreglo in arreglos], calentamiento
+        )
+        resultados['indice.candidatos'] = medir(
+            red.indice.candidatos, [(a, 1000) for a, _ in pares], calentamiento
+        )
+
+        return reporte
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rutas.busqueda import opciones_geometria, buscar_directas, buscar_combinadas
+from rutas.red import obtener_red
+
+# Red del proceso padre; los procesos hijos la heredan con fork (copy-on-write, sin recargarla)
+_red = None
+_opciones = None
+_combinadas = False
+
+
+def resolver_par(par):
+    """Busca las rutas de un par (indice, datos) con la red heredada y devuelve la línea NDJSON"""
+    indice, datos = par
+    resultado = {'indice': indice}
+    if 'id' in datos:
+        resultado['id'] = datos['id']
+    try:
+        punto_a, punto_b = datos['punto_a'], datos['punto_b']
+        resultado['rutas_directas'] = buscar_directas(_red, punto_a, punto_b, _opciones)
+        if _combinadas:
+            resultado['rutas_combinadas'] = buscar_combinadas(_red, punto_a, punto_b, _opciones)
+    except Exception as e:
+        resultado['error'] = str(e)
+    return json.dumps(resultado, ensure_ascii=False)
+
+
+def leer_pares(archivo):
+    """
+    Lee los pares origen-destino, uno por línea:
+    - JSON: {"punto_a": {"lat":..,"lng":..}, "punto_b": {...}, "id": opcional}
+    - CSV: lat_a,lng_a,lat_b,lng_b
+    """
+    for numero, linea in enumerate(archivo, start=1):
+        linea = linea.strip()
+        if not linea or linea.startswith('#'):
+            continue
+        try:
+            if linea.startswith('{'):
+                datos = json.loads(linea)
+            else:
+                lat_a, lng_a, lat_b, lng_b = (float(v) for v in linea.split(',')[:4])
+                datos = {'punto_a': {'lat': lat_a, 'lng': lng_a}, 'punto_b': {'lat': lat_b, 'lng': lng_b}}
+        except ValueError as e:
+            raise CommandError(f'Línea {numero} inválida: {e}')
+        yield datos
+
+
+class Command(BaseCommand):
+    help = 'Busca rutas para muchos pares origen-destino en paralelo y escribe los resultados como NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Archivo con un par por línea (JSON o lat_a,lng_a,lat_b,lng_b); "-" para stdin')
+        parser.add_argument('--salida', default='-', help='Archivo NDJSON de salida ("-" para stdout)')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help='Procesos de trabajo (por defecto, uno por núcleo)')
+        parser.add_argument('--tamano-lote', type=int, default=64, dest='tamano_lote',
+                            help='Pares que recibe cada proceso por envío')
+        parser.add_argument('--combinadas', action='store_true',
+                            help='Incluir también las rutas combinadas (con un transbordo)')
+        parser.add_argument('--tolerancia', help='Simplificar las geometrías con esta tolerancia en metros')
+        parser.add_argument('--zoom', help='Simplificar las geometrías para este nivel de zoom')
+        parser.add_argument('--formato', choices=['coordenadas', 'polyline'], default='coordenadas',
+                            help='Formato de las geometrías')
+
+    def handle(self, *args, **options):
+        global _red, _opciones, _combinadas
+
+        try:
+            _opciones = opciones_geometria(options)
+        except ValueError:
+            raise CommandError('--tolerancia y --zoom deben ser numéricos')
+        _combinadas = options['combinadas']
+
+        inicio = time.perf_counter()
+        _red = obtener_red()
+        self.stderr.write(f'Red cargada: {len(_red)} recorridos ({time.perf_counter() - inicio:.2f}s)')
+
+        entrada = sys.stdin if options['archivo'] == '-' else open(options['archivo'], encoding='utf-8')
+        salida = sys.stdout if options['salida'] == '-' else open(options['salida'], 'w', encoding='utf-8')
+        pares = enumerate(leer_pares(entrada))
+
+        procesos = max(1, options['procesos'])
+        if procesos > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            self.stderr.write(self.style.WARNING('Esta plataforma no soporta fork: se usará un solo proceso'))
+            procesos = 1
+
+        inicio = time.perf_counter()
+        try:
+            if procesos == 1:
+                total = self.escribir(map(resolver_par, pares), salida)
+            else:
+                # Las conexiones a la base de datos no deben compartirse entre procesos
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(procesos) as pool:
+                    # imap mantiene el orden de entrada y entrega cada resultado apenas está listo
+                    resultados = pool.imap(resolver_par, pares, chunksize=max(1, options['tamano_lote']))
+                    total = self.escribir(resultados, salida)
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+            if salida is not sys.stdout:
+                salida.close()
+
+        duracion = time.perf_counter() - inicio
+        self.stderr.write(self.style.SUCCESS(
+            f'✓ {total} pares en {duracion:.2f}s con {procesos} proceso(s) '
+            f'({total / duracion if duracion else 0:.0f} pares/s)'
+        ))
+
+    def escribir(self, resultados, salida):
+        """Escribe cada línea NDJSON a medida que llega y devuelve cuántas se escribieron"""
+        total = 0
+        for linea in resultados:
+            salida.write(linea + '\n')
+            total += 1
+        salida.flush()
+        return total
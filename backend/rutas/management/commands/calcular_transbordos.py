@@ -0,0 +1,104 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rutas.models import Transbordo, VersionRed
+from rutas.red import RedRutas, invalidar_red
+from rutas.utils import distancias_haversine, vertices_de_segmentos
+
+
+class Command(BaseCommand):
+    help = 'Precalcula el grafo de transbordos entre recorridos (usado por buscar-rutas-combinadas)'
+
+    RADIO_TRANSBORDO = 100  # metros máximos para transbordo (no caminar)
+    TAMANO_BLOQUE = 64  # vértices del recorrido origen procesados por bloque
+
+    def add_arguments(self, parser):
+        parser.add_argument('--radio', type=float, default=self.RADIO_TRANSBORDO,
+                            help='Distancia máxima en metros entre recorridos para considerar un transbordo')
+        parser.add_argument('--recorrido', type=int, action='append', dest='recorridos',
+                            help='Solo recalcular los transbordos de este recorrido (se puede repetir)')
+
+    def transbordos_desde(self, red, origen_id, radio, destinos=None):
+        """
+        Calcula los transbordos del recorrido origen hacia los demás recorridos.
+        Para cada vértice del origen guarda el vértice más cercano de cada recorrido vecino,
+        luego agrupa los vértices consecutivos dentro del radio en zonas y deja el mejor par de cada zona.
+        Devuelve una lista de (destino_id, indice_origen, indice_destino, distancia).
+        """
+        arreglo_a = red.arreglo(origen_id)
+        mejores = {}  # destino_id -> (distancias por vértice del origen, índice en el destino)
+
+        for inicio in range(0, len(arreglo_a), self.TAMANO_BLOQUE):
+            bloque = arreglo_a[inicio:inicio + self.TAMANO_BLOQUE]
+            vecinos = red.indice.candidatos_caja(
+                bloque[:, 0].min(), bloque[:, 0].max(),
+                bloque[:, 1].min(), bloque[:, 1].max(),
+                radio
+            )
+
+            for destino_id, rangos in vecinos.items():
+                if destino_id == origen_id or (destinos is not None and destino_id not in destinos):
+                    continue
+
+                indices_b = np.unique(vertices_de_segmentos(rangos))
+                distancias = distancias_haversine(bloque, red.arreglo(destino_id)[indices_b])
+                posiciones = distancias.argmin(axis=1)
+
+                if destino_id not in mejores:
+                    mejores[destino_id] = (np.full(len(arreglo_a), np.inf), np.full(len(arreglo_a), -1, dtype=np.int64))
+                dist_min, idx_min = mejores[destino_id]
+                filas = np.arange(len(bloque))
+                dist_bloque = distancias[filas, posiciones]
+                mejora = dist_bloque < dist_min[inicio:inicio + len(bloque)]
+                dist_min[inicio:inicio + len(bloque)][mejora] = dist_bloque[mejora]
+                idx_min[inicio:inicio + len(bloque)][mejora] = indices_b[posiciones][mejora]
+
+        transbordos = []
+        for destino_id, (dist_min, idx_min) in mejores.items():
+            dentro = dist_min <= radio
+            if not dentro.any():
+                continue
+
+            # Zonas = tramos de vértices consecutivos del origen dentro del radio
+            bordes = np.diff(np.concatenate(([0], dentro.astype(np.int8), [0])))
+            inicios = np.flatnonzero(bordes == 1)
+            fines = np.flatnonzero(bordes == -1)
+            for zona_inicio, zona_fin in zip(inicios, fines):
+                i = zona_inicio + int(dist_min[zona_inicio:zona_fin].argmin())
+                transbordos.append((destino_id, int(i), int(idx_min[i]), float(dist_min[i])))
+
+        return transbordos
+
+    def handle(self, *args, **options):
+        radio = options['radio']
+        seleccion = set(options['recorridos'] or [])
+
+        inicio = time.perf_counter()
+        red = RedRutas.desde_bd(VersionRed.actual())
+        ids = red.ids.tolist()
+
+        filas = []
+        for origen_id in ids:
+            # Con --recorrido: todo lo que sale de los elegidos y lo que llega a ellos
+            destinos = None if not seleccion or origen_id in seleccion else seleccion
+            for destino_id, i, j, d in self.transbordos_desde(red, origen_id, radio, destinos):
+                filas.append(Transbordo(recorrido_origen_id=origen_id, recorrido_destino_id=destino_id,
+                                        indice_origen=i, indice_destino=j, distancia_metros=d))
+
+        with transaction.atomic():
+            if seleccion:
+                Transbordo.objects.filter(recorrido_origen_id__in=seleccion).delete()
+                Transbordo.objects.filter(recorrido_destino_id__in=seleccion).delete()
+            else:
+                Transbordo.objects.all().delete()
+            Transbordo.objects.bulk_create(filas, batch_size=1000)
+
+        invalidar_red()
+
+        if options['verbosity'] == 0:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(filas)} transbordos calculados para {len(seleccion) or len(ids)} recorridos '
+            f'({time.perf_counter() - inicio:.1f}s)'
+        ))
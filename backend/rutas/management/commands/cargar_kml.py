@@ -1,9 +1,14 @@
+import multiprocessing
 import os
-import xml.etree.ElementTree as ET
-from math import radians, sin, cos, sqrt, atan2
+import time
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from rutas.models import Empresa, Ruta, Recorrido, Paradero, RecorridoParadero
+from django.db import transaction
+from rutas.kml import hash_archivo, parsear_kml_iterativo, leer_archivo
+from rutas.models import Empresa, Ruta, Recorrido, Paradero, RecorridoParadero, Transbordo
+from rutas.utils import empaquetar_coordenadas, ubicar_paradas
+from rutas.red import cambios_agrupados, registrar_cambios_red
 
 
 class Command(BaseCommand):
@@ -22,39 +27,9 @@ class Command(BaseCommand):
         {'nombre': 'Mariscal Castilla', 'lat': -16.39942, 'lng': -71.52157, 'popular': True},
     ]
 
-    def calcular_distancia(self, lat1, lng1, lat2, lng2):
-        """Calcula la distancia en metros entre dos coordenadas usando Haversine"""
-        R = 6371000
-        
-        lat1_rad = radians(lat1)
-        lat2_rad = radians(lat2)
-        delta_lat = radians(lat2 - lat1)
-        delta_lng = radians(lng2 - lng1)
-        
-        a = sin(delta_lat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lng / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        
-        return R * c
-
     def parsear_kml(self, archivo_path):
         """Extrae las coordenadas de un archivo KML"""
-        tree = ET.parse(archivo_path)
-        root = tree.getroot()
-        
-        ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-        coordenadas = []
-        
-        for coordinates in root.findall('.//kml:coordinates', ns):
-            coords_text = coordinates.text.strip()
-            for coord in coords_text.split():
-                if coord:
-                    partes = coord.split(',')
-                    if len(partes) >= 2:
-                        lng = float(partes[0])
-                        lat = float(partes[1])
-                        coordenadas.append([lat, lng])
-        
-        return coordenadas
+        return parsear_kml_iterativo(archivo_path)
 
     def crear_paraderos(self):
         """Crea los paraderos populares en la base de datos"""
@@ -72,32 +47,40 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f'  ✓ Creado: {paradero.nombre}')
 
+    def paraderos_cercanos(self, paraderos, coordenadas, distancia_maxima=100):
+        """
+        Devuelve [(paradero, distancia, distancia_recorrido), ...] con los paraderos a menos de
+        distancia_maxima de la línea del recorrido, en el orden en que el bus pasa por ellos.
+        """
+        if not paraderos:
+            return []
+        
+        # Solo se proyectan los paraderos dentro de la caja del recorrido (filtro vectorizado)
+        puntos = [[p.latitud, p.longitud] for p in paraderos]
+        return [
+            (paraderos[k], distancia, distancia_recorrido)
+            for k, distancia, _, distancia_recorrido in ubicar_paradas(puntos, coordenadas, distancia_maxima)
+        ]
+
     def asociar_paraderos(self, recorrido, coordenadas):
-        """Asocia paraderos cercanos al recorrido"""
-        paraderos = Paradero.objects.all()
-        distancia_maxima = 100
+        """Asocia paraderos cercanos al recorrido (sobre las coordenadas guardadas, como la carga en paralelo)"""
+        paraderos = list(Paradero.objects.all())
         
-        for paradero in paraderos:
-            distancia_minima = float('inf')
-            
-            for coord in coordenadas:
-                distancia = self.calcular_distancia(
-                    coord[0], coord[1],
-                    paradero.latitud, paradero.longitud
-                )
-                if distancia < distancia_minima:
-                    distancia_minima = distancia
-            
-            if distancia_minima <= distancia_maxima:
-                RecorridoParadero.objects.get_or_create(
-                    recorrido=recorrido,
-                    paradero=paradero,
-                    defaults={
-                        'distancia_metros': distancia_minima,
-                        'orden': 0
-                    }
-                )
-                self.stdout.write(f'    ✓ Paradero "{paradero.nombre}" asociado ({distancia_minima:.1f}m)')
+        cercanos = self.paraderos_cercanos(paraderos, coordenadas)
+        for orden, (paradero, distancia_minima, distancia_recorrido) in enumerate(cercanos, start=1):
+            RecorridoParadero.objects.get_or_create(
+                recorrido=recorrido,
+                paradero=paradero,
+                defaults={
+                    'distancia_metros': distancia_minima,
+                    'distancia_recorrido': distancia_recorrido,
+                    'orden': orden
+                }
+            )
+            self.stdout.write(
+                f'    ✓ Paradero "{paradero.nombre}" asociado ({distancia_minima:.1f}m, '
+                f'#{orden} a {distancia_recorrido:.0f}m del inicio)'
+            )
 
     def extraer_info_nombre(self, nombre_archivo):
         """Extrae sentido y nombre base del archivo"""
@@ -119,8 +102,140 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('empresa_nombre', type=str, help='Nombre de la empresa')
         parser.add_argument('kml_folder', type=str, help='Carpeta con los archivos KML')
+        parser.add_argument('--paralelo', action='store_true',
+                            help='Leer los KML en paralelo (iterparse) y guardar todo en lote en una sola transacción')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help='Procesos para leer los KML con --paralelo (por defecto, uno por núcleo)')
+        parser.add_argument('--forzar', action='store_true',
+                            help='Volver a procesar todos los archivos aunque su hash no haya cambiado')
+
+    def codigo_ruta(self, empresa, nombre_ruta):
+        return f"{empresa.nombre[:3].upper()}-{nombre_ruta[:10].upper()}"
+
+    def cargar_en_paralelo(self, empresa, kml_folder, rutas_agrupadas, procesos, forzar=False):
+        """
+        Compara el hash de cada archivo con el guardado, lee solo los nuevos o modificados con un
+        pool de procesos y escribe todo en lote (bulk_create / bulk_update) en una sola transacción.
+        Devuelve (ids de recorridos creados, ids de recorridos modificados).
+        """
+        # 1. Estado actual: rutas por código y recorridos existentes (sin cargar sus coordenadas)
+        nombres_por_codigo = {}
+        for nombre_ruta in rutas_agrupadas:
+            # El primer nombre de cada código gana (igual que get_or_create en el modo normal)
+            nombres_por_codigo.setdefault(self.codigo_ruta(empresa, nombre_ruta), nombre_ruta)
+        rutas = Ruta.objects.in_bulk(list(nombres_por_codigo), field_name='codigo')
+        existentes = {
+            (recorrido.ruta_id, recorrido.sentido): recorrido
+            for recorrido in Recorrido.objects.filter(ruta__in=list(rutas.values())).defer('coordenadas_empaquetadas', 'importancia_vertices')
+        }
+
+        # 2. Archivos sin cambios: se omiten sin leerlos
+        tareas = {}  # archivo -> (codigo, sentido, hash)
+        vistos = set()
+        for nombre_ruta, archivos_sentidos in rutas_agrupadas.items():
+            codigo = self.codigo_ruta(empresa, nombre_ruta)
+            ruta = rutas.get(codigo)
+            for sentido, archivo in archivos_sentidos.items():
+                if (codigo, sentido) in vistos:
+                    self.stdout.write(self.style.WARNING(f'  ⚠ {archivo}: {codigo} {sentido} ya viene de otro archivo'))
+                    continue
+                vistos.add((codigo, sentido))
+                hash_kml = hash_archivo(os.path.join(kml_folder, archivo))
+                recorrido = existentes.get((ruta.id, sentido)) if ruta else None
+                if recorrido is not None and recorrido.hash_kml == hash_kml and not forzar:
+                    self.stdout.write(f'  → {archivo}: sin cambios')
+                    continue
+                tareas[archivo] = (codigo, sentido, hash_kml)
+
+        # 3. Lectura en paralelo: cada archivo se informa apenas termina
+        coordenadas_por_archivo = {}
+        if tareas:
+            inicio = time.perf_counter()
+            archivos = [os.path.join(kml_folder, archivo) for archivo in tareas]
+            procesos = max(1, min(procesos, len(archivos)))
+            with multiprocessing.Pool(procesos) as pool:
+                for n, (archivo, coordenadas, segundos, error) in enumerate(
+                    pool.imap_unordered(leer_archivo, archivos), start=1
+                ):
+                    if error:
+                        self.stdout.write(self.style.ERROR(f'  [{n}/{len(archivos)}] ✗ {archivo}: {error}'))
+                        continue
+                    coordenadas_por_archivo[archivo] = coordenadas
+                    self.stdout.write(f'  [{n}/{len(archivos)}] 📄 {archivo}: {len(coordenadas)} puntos ({segundos:.3f}s)')
+            self.stdout.write(f'Lectura de {len(archivos)} archivos con {procesos} procesos: {time.perf_counter() - inicio:.2f}s')
+
+        # 4. Escritura en lote
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            nuevas = Ruta.objects.bulk_create([
+                Ruta(empresa=empresa, nombre=nombre, codigo=codigo)
+                for codigo, nombre in nombres_por_codigo.items() if codigo not in rutas
+            ])
+            rutas.update({ruta.codigo: ruta for ruta in nuevas})
+
+            creados, modificados, solo_hash = [], [], []
+            for archivo, (codigo, sentido, hash_kml) in tareas.items():
+                coordenadas = coordenadas_por_archivo.get(archivo)
+                if not coordenadas:
+                    self.stdout.write(self.style.WARNING(f'  ⚠ {archivo}: sin coordenadas'))
+                    continue
+                ruta = rutas[codigo]
+                recorrido = existentes.get((ruta.id, sentido))
+                if recorrido is None:
+                    recorrido = Recorrido(
+                        ruta=ruta, sentido=sentido, coordenadas=coordenadas, archivo_kml=archivo, hash_kml=hash_kml,
+                        color_linea='#EF4444' if sentido == 'IDA' else '#3B82F6'
+                    )
+                    # bulk_create no llama a save(): la importancia y la caja se calculan aquí
+                    recorrido.calcular_importancia()
+                    recorrido.calcular_caja()
+                    creados.append(recorrido)
+                elif not forzar and bytes(recorrido.coordenadas_empaquetadas) == empaquetar_coordenadas(coordenadas):
+                    # Cargado antes de guardar hashes: misma geometría, solo se registra el hash
+                    recorrido.hash_kml = hash_kml
+                    solo_hash.append(recorrido)
+                else:
+                    recorrido.coordenadas = coordenadas
+                    recorrido.archivo_kml = archivo
+                    recorrido.hash_kml = hash_kml
+                    recorrido.calcular_importancia()
+                    recorrido.calcular_caja()
+                    modificados.append(recorrido)
+
+            creados = Recorrido.objects.bulk_create(creados)
+            Recorrido.objects.bulk_update(modificados, [
+                'coordenadas_empaquetadas', 'archivo_kml', 'hash_kml', 'importancia_vertices',
+                'lat_min', 'lat_max', 'lng_min', 'lng_max'
+            ])
+            Recorrido.objects.bulk_update(solo_hash, ['hash_kml'])
+
+            # Paraderos cercanos: se recalculan solo para los recorridos nuevos o modificados
+            RecorridoParadero.objects.filter(recorrido__in=modificados).delete()
+            paraderos = list(Paradero.objects.all())
+            asociaciones = [
+                RecorridoParadero(
+                    recorrido=recorrido, paradero=paradero, orden=orden,
+                    distancia_metros=distancia, distancia_recorrido=distancia_recorrido
+                )
+                for recorrido in creados + modificados
+                for orden, (paradero, distancia, distancia_recorrido) in enumerate(
+                    self.paraderos_cercanos(paraderos, recorrido.coordenadas), start=1
+                )
+            ]
+            RecorridoParadero.objects.bulk_create(asociaciones, batch_size=1000, ignore_conflicts=True)
+
+        self.stdout.write(
+            f'Escritura: {len(nuevas)} rutas, {len(creados)} recorridos creados, {len(modificados)} modificados '
+            f'y {len(asociaciones)} paraderos asociados en {time.perf_counter() - inicio:.2f}s'
+        )
+        return [r.id for r in creados], [r.id for r in modificados]
 
     def handle(self, *args, **options):
+        # Las señales de cada objeto guardado no suben la versión de la red: se sube una sola vez al terminar
+        with cambios_agrupados():
+            self.importar(options)
+
+    def importar(self, options):
         empresa_nombre = options['empresa_nombre']
         kml_folder = options['kml_folder']
         
@@ -158,12 +273,46 @@ class Command(BaseCommand):
             
             rutas_agrupadas[nombre_ruta][sentido] = archivo
         
-        # Procesar cada ruta
+        if options['paralelo']:
+            creados, modificados = self.cargar_en_paralelo(
+                empresa, kml_folder, rutas_agrupadas, options['procesos'], options['forzar']
+            )
+        else:
+            creados, modificados = self.cargar_secuencial(empresa, kml_folder, rutas_agrupadas, options['forzar'])
+        
+        # Actualizar el grafo de transbordos solo de los recorridos nuevos o modificados;
+        # si todavía no hay ninguno (base recién migrada, o solo se registraron hashes) se calcula completo
+        afectados = creados + modificados
+        if not Transbordo.objects.exists() and Recorrido.objects.exists():
+            call_command('calcular_transbordos', stdout=self.stdout)
+        elif afectados:
+            call_command('calcular_transbordos', recorridos=afectados, stdout=self.stdout)
+        
+        if afectados:
+            # Registrar también los cambios hechos en lote (bulk_create/bulk_update no disparan las señales);
+            # al salir de cambios_agrupados se avisa a los procesos del servidor que recarguen la red
+            registrar_cambios_red([
+                ('recorrido', afectados),
+                ('ruta', Recorrido.objects.filter(id__in=afectados).values_list('ruta_id', flat=True)),
+            ])
+        
+        self.stdout.write(f'\n{len(creados)} recorridos creados, {len(modificados)} actualizados')
+        
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Proceso completado'))
+
+    def cargar_secuencial(self, empresa, kml_folder, rutas_agrupadas, forzar=False):
+        """
+        Procesa las rutas una por una (modo original). Los archivos cuyo hash no cambió se omiten
+        sin leerlos; los modificados actualizan su recorrido en el lugar.
+        Devuelve (ids de recorridos creados, ids de recorridos modificados).
+        """
+        creados, modificados = [], []
+        vistos = set()
         for nombre_ruta, archivos_sentidos in rutas_agrupadas.items():
             self.stdout.write(f'\n📍 Ruta: {nombre_ruta}')
             
             # Crear código único
-            codigo = f"{empresa.nombre[:3].upper()}-{nombre_ruta[:10].upper()}"
+            codigo = self.codigo_ruta(empresa, nombre_ruta)
             
             # Crear o obtener la ruta
             ruta, ruta_created = Ruta.objects.get_or_create(
@@ -185,6 +334,19 @@ class Command(BaseCommand):
                 
                 self.stdout.write(f'  📄 {sentido}: {archivo}')
                 
+                # Dos archivos con el mismo código y sentido: se queda el primero
+                if (ruta.id, sentido) in vistos:
+                    self.stdout.write(self.style.WARNING(f'    ⚠ {ruta.codigo} {sentido} ya viene de otro archivo'))
+                    continue
+                vistos.add((ruta.id, sentido))
+                
+                # Archivo sin cambios desde la última carga: no se lee
+                hash_kml = hash_archivo(archivo_path)
+                recorrido = Recorrido.objects.filter(ruta=ruta, sentido=sentido).first()
+                if recorrido is not None and recorrido.hash_kml == hash_kml and not forzar:
+                    self.stdout.write(f'    → Sin cambios')
+                    continue
+                
                 # Parsear KML
                 coordenadas = self.parsear_kml(archivo_path)
                 
@@ -196,20 +358,30 @@ class Command(BaseCommand):
                 color = '#EF4444' if sentido == 'IDA' else '#3B82F6'
                 
                 # Crear o actualizar recorrido
-                recorrido, rec_created = Recorrido.objects.get_or_create(
-                    ruta=ruta,
-                    sentido=sentido,
-                    defaults={
-                        'coordenadas': coordenadas,
-                        'archivo_kml': archivo,
-                        'color_linea': color
-                    }
-                )
-                
-                if rec_created:
+                if recorrido is None:
+                    recorrido = Recorrido.objects.create(
+                        ruta=ruta,
+                        sentido=sentido,
+                        coordenadas=coordenadas,
+                        archivo_kml=archivo,
+                        hash_kml=hash_kml,
+                        color_linea=color
+                    )
                     self.stdout.write(f'    ✓ Recorrido creado: {len(coordenadas)} puntos')
-                    self.asociar_paraderos(recorrido, coordenadas)
+                    self.asociar_paraderos(recorrido, recorrido.coordenadas)
+                    creados.append(recorrido.id)
+                elif not forzar and bytes(recorrido.coordenadas_empaquetadas) == empaquetar_coordenadas(coordenadas):
+                    # Cargado antes de guardar hashes: misma geometría, solo se registra el hash
+                    Recorrido.objects.filter(pk=recorrido.pk).update(hash_kml=hash_kml)
+                    self.stdout.write(f'    → Sin cambios (hash registrado)')
                 else:
-                    self.stdout.write(f'    → Recorrido ya existe')
+                    recorrido.coordenadas = coordenadas
+                    recorrido.archivo_kml = archivo
+                    recorrido.hash_kml = hash_kml
+                    recorrido.save()
+                    self.stdout.write(f'    ✓ Recorrido actualizado: {len(coordenadas)} puntos')
+                    RecorridoParadero.objects.filter(recorrido=recorrido).delete()
+                    self.asociar_paraderos(recorrido, recorrido.coordenadas)
+                    modificados.append(recorrido.id)
         
-        self.stdout.write(self.style.SUCCESS(f'\n✅ Proceso completado'))
\ No newline at end of file
+        return creados, modificados
@@ -0,0 +1,161 @@
+#rutas/metricas.py
+# Tiempos por etapa de las búsquedas: cabecera Server-Timing por respuesta
+# e histogramas acumulados en el proceso (los lee el endpoint metricas/).
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores (ms) de los buckets de los histogramas; el último bucket es "más de 5000"
+LIMITES_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_cronometro_actual = contextvars.ContextVar('cronometro_actual', default=None)
+
+
+class Cronometro:
+    """
+    Acumula el tiempo de cada etapa de una petición. Las etapas pueden anidarse: el tiempo de
+    una etapa interna se descuenta de la externa, así la suma de etapas nunca supera el total.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = {}  # nombre -> segundos (exclusivos)
+        self.notas = {}  # nombre -> descripción (p. ej. cache=acierto)
+        self._pila = []  # [nombre, inicio, segundos de etapas internas]
+
+    def entrar(self, nombre):
+        self._pila.append([nombre, time.perf_counter(), 0.0])
+
+    def salir(self):
+        nombre, inicio, internas = self._pila.pop()
+        duracion = time.perf_counter() - inicio
+        self.etapas[nombre] = self.etapas.get(nombre, 0.0) + duracion - internas
+        if self._pila:
+            self._pila[-1][2] += duracion
+
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+    def server_timing(self, total=None):
+        """Valor de la cabecera Server-Timing (duraciones en ms)"""
+        partes = [f'{nombre};dur={segundos * 1000:.2f}' for nombre, segundos in self.etapas.items()]
+        partes += [f'{nombre};desc="{descripcion}"' for nombre, descripcion in self.notas.items()]
+        partes.append(f'total;dur={(self.total() if total is None else total) * 1000:.2f}')
+        return ', '.join(partes)
+
+
+@contextmanager
+def etapa(nombre):
+    """Mide un bloque como etapa de la petición en curso; sin petición medida no hace nada"""
+    cronometro = _cronometro_actual.get()
+    if cronometro is None:
+        yield
+        return
+    cronometro.entrar(nombre)
+    try:
+        yield
+    finally:
+        cronometro.salir()
+
+
+def anotar(nombre, descripcion):
+    """Agrega una nota sin duración a la cabecera Server-Timing de la petición en curso"""
+    cronometro = _cronometro_actual.get()
+    if cronometro is not None:
+        cronometro.notas[nombre] = descripcion
+
+
+class Histograma:
+    def __init__(self):
+        self.cuentas = [0] * (len(LIMITES_MS) + 1)
+        self.n = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+
+    def agregar(self, ms):
+        k = 0
+        while k < len(LIMITES_MS) and ms > LIMITES_MS[k]:
+            k += 1
+        self.cuentas[k] += 1
+        self.n += 1
+        self.suma_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentil(self, p):
+        """Cota superior del percentil p según los buckets (el último bucket usa el máximo observado)"""
+        objetivo = p / 100 * self.n
+        acumulado = 0
+        for k, cuenta in enumerate(self.cuentas):
+            acumulado += cuenta
+            if cuenta and acumulado >= objetivo:
+                return LIMITES_MS[k] if k < len(LIMITES_MS) else round(self.max_ms, 2)
+        return None
+
+    def como_dict(self):
+        buckets = {f'<={limite}': cuenta for limite, cuenta in zip(LIMITES_MS, self.cuentas)}
+        buckets[f'>{LIMITES_MS[-1]}'] = self.cuentas[-1]
+        return {
+            'n': self.n,
+            'suma_ms': round(self.suma_ms, 2),
+            'media_ms': round(self.suma_ms / self.n, 3) if self.n else None,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentil(50),
+            'p90_ms': self.percentil(90),
+            'p99_ms': self.percentil(99),
+            'buckets': buckets,
+        }
+
+
+_histogramas = {}  # (vista, etapa) -> Histograma
+_lock = threading.Lock()
+
+
+def registrar(vista, cronometro, total):
+    with _lock:
+        for nombre, segundos in list(cronometro.etapas.items()) + [('total', total)]:
+            histograma = _histogramas.get((vista, nombre))
+            if histograma is None:
+                histograma = _histogramas[(vista, nombre)] = Histograma()
+            histograma.agregar(segundos * 1000)
+
+
+def resumen():
+    """{ vista: { etapa: {n, media_ms, p50_ms, ..., buckets} } } de este proceso"""
+    with _lock:
+        datos = {}
+        for (vista, nombre), histograma in sorted(_histogramas.items()):
+            datos.setdefault(vista, {})[nombre] = histograma.como_dict()
+        return datos
+
+
+def reiniciar():
+    with _lock:
+        _histogramas.clear()
+
+
+def medir_vista(nombre):
+    """
+    Decorador para vistas: mide sus etapas, incluida la serialización de la respuesta DRF,
+    agrega la cabecera Server-Timing y acumula los tiempos en los histogramas del proceso.
+    Va por fuera de @api_view para poder medir el render.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            cronometro = Cronometro()
+            token = _cronometro_actual.set(cronometro)
+            try:
+                respuesta = vista(request, *args, **kwargs)
+                if hasattr(respuesta, 'render') and not getattr(respuesta, 'is_rendered', True):
+                    with etapa('serializacion'):
+                        respuesta.render()
+            finally:
+                _cronometro_actual.reset(token)
+            total = cronometro.total()
+            respuesta['Server-Timing'] = cronometro.server_timing(total)
+            registrar(nombre, cronometro, total)
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VersionRed",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                (
+                    "fecha_actualizacion",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "Versión de la red",
+                "verbose_name_plural": "Versión de la red",
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0002_versionred"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Transbordo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("indice_origen", models.IntegerField()),
+                ("indice_destino", models.IntegerField()),
+                ("distancia_metros", models.FloatField()),
+                (
+                    "recorrido_destino",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transbordos_llegada",
+                        to="rutas.recorrido",
+                    ),
+                ),
+                (
+                    "recorrido_origen",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transbordos_salida",
+                        to="rutas.recorrido",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Transbordo",
+                "verbose_name_plural": "Transbordos",
+                "ordering": ["recorrido_origen", "indice_origen"],
+                "indexes": [
+                    models.Index(
+                        fields=["recorrido_origen", "recorrido_destino"],
+                        name="rutas_trans_recorri_e55c5c_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+def calcular_importancias(apps, schema_editor):
+    from rutas.models import importancia_a_json
+    from rutas.utils import importancia_douglas_peucker
+
+    Recorrido = apps.get_model("rutas", "Recorrido")
+    for recorrido in Recorrido.objects.all():
+        recorrido.importancia_vertices = importancia_a_json(
+            importancia_douglas_peucker(recorrido.coordenadas or [])
+        )
+        recorrido.save(update_fields=["importancia_vertices"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0003_transbordo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recorrido",
+            name="importancia_vertices",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(calcular_importancias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+def ubicar_paraderos(apps, schema_editor):
+    """Proyecta los paraderos ya asociados sobre su recorrido: orden real y distancia a lo largo"""
+    from rutas.utils import ubicar_paradas
+
+    Recorrido = apps.get_model("rutas", "Recorrido")
+    RecorridoParadero = apps.get_model("rutas", "RecorridoParadero")
+    for recorrido in Recorrido.objects.all():
+        asociaciones = list(
+            RecorridoParadero.objects.filter(recorrido=recorrido).select_related(
+                "paradero"
+            )
+        )
+        if not asociaciones or not recorrido.coordenadas:
+            continue
+        puntos = [[rp.paradero.latitud, rp.paradero.longitud] for rp in asociaciones]
+        paradas = ubicar_paradas(puntos, recorrido.coordenadas, float("inf"))
+        for orden, (k, distancia, _, distancia_recorrido) in enumerate(
+            paradas, start=1
+        ):
+            asociaciones[k].orden = orden
+            asociaciones[k].distancia_metros = distancia
+            asociaciones[k].distancia_recorrido = distancia_recorrido
+        RecorridoParadero.objects.bulk_update(
+            asociaciones, ["orden", "distancia_metros", "distancia_recorrido"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0004_recorrido_importancia_vertices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recorridoparadero",
+            name="distancia_recorrido",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(ubicar_paraderos, migrations.RunPython.noop),
+    ]
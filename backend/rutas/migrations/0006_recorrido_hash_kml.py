@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0005_recorridoparadero_distancia_recorrido"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recorrido",
+            name="hash_kml",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+def empaquetar(apps, schema_editor):
+    """Convierte las coordenadas JSON de cada recorrido al formato empaquetado (int32 en microgrados)"""
+    from rutas.utils import empaquetar_coordenadas
+
+    Recorrido = apps.get_model("rutas", "Recorrido")
+    recorridos = list(Recorrido.objects.only("id", "coordenadas"))
+    for recorrido in recorridos:
+        recorrido.coordenadas_empaquetadas = empaquetar_coordenadas(
+            recorrido.coordenadas or []
+        )
+    Recorrido.objects.bulk_update(
+        recorridos, ["coordenadas_empaquetadas"], batch_size=100
+    )
+
+
+def desempaquetar(apps, schema_editor):
+    from rutas.utils import desempaquetar_coordenadas
+
+    Recorrido = apps.get_model("rutas", "Recorrido")
+    recorridos = list(Recorrido.objects.only("id", "coordenadas_empaquetadas"))
+    for recorrido in recorridos:
+        recorrido.coordenadas = desempaquetar_coordenadas(
+            recorrido.coordenadas_empaquetadas
+        ).tolist()
+    Recorrido.objects.bulk_update(recorridos, ["coordenadas"], batch_size=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0006_recorrido_hash_kml"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recorrido",
+            name="coordenadas",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name="recorrido",
+            name="coordenadas_empaquetadas",
+            field=models.BinaryField(default=b""),
+        ),
+        migrations.RunPython(empaquetar, desempaquetar),
+        migrations.RemoveField(
+            model_name="recorrido",
+            name="coordenadas",
+        ),
+    ]
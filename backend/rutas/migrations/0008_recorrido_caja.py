@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+def calcular_cajas(apps, schema_editor):
+    """Caja (bounding box) de los recorridos ya cargados"""
+    from rutas.utils import caja_coordenadas, desempaquetar_coordenadas
+
+    Recorrido = apps.get_model("rutas", "Recorrido")
+    recorridos = list(Recorrido.objects.only("id", "coordenadas_empaquetadas"))
+    for recorrido in recorridos:
+        (
+            recorrido.lat_min,
+            recorrido.lat_max,
+            recorrido.lng_min,
+            recorrido.lng_max,
+        ) = caja_coordenadas(
+            desempaquetar_coordenadas(recorrido.coordenadas_empaquetadas)
+        )
+    Recorrido.objects.bulk_update(
+        recorridos, ["lat_min", "lat_max", "lng_min", "lng_max"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0007_recorrido_coordenadas_empaquetadas"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recorrido",
+            name="lat_max",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="recorrido",
+            name="lat_min",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="recorrido",
+            name="lng_max",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="recorrido",
+            name="lng_min",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="recorrido",
+            index=models.Index(
+                fields=["lat_min", "lat_max", "lng_min", "lng_max"],
+                name="rutas_recor_lat_min_222c21_idx",
+            ),
+        ),
+        migrations.RunPython(calcular_cajas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fijar_version_base(apps, schema_editor):
+    """Los cambios anteriores a esta migración no están registrados"""
+    VersionRed = apps.get_model("rutas", "VersionRed")
+    VersionRed.objects.update(version_base_cambios=models.F("version"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rutas", "0008_recorrido_caja"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CambioRed",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(db_index=True)),
+                (
+                    "modelo",
+                    models.CharField(
+                        choices=[
+                            ("empresa", "Empresa"),
+                            ("ruta", "Ruta"),
+                            ("recorrido", "Recorrido"),
+                            ("paradero", "Paradero"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("objeto_id", models.BigIntegerField()),
+                ("fecha", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Cambio de la red",
+                "verbose_name_plural": "Cambios de la red",
+                "ordering": ["version"],
+            },
+        ),
+        migrations.AddField(
+            model_name="versionred",
+            name="version_base_cambios",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(fijar_version_base, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
+import math
 from django.db import models
+from django.utils import timezone
+from .utils import (
+    importancia_douglas_peucker, empaquetar_coordenadas, desempaquetar_coordenadas, caja_coordenadas, METROS_POR_GRADO
+)
 
 class Empresa(models.Model):
     nombre = models.CharField(max_length=200)
@@ -41,18 +46,107 @@ class Recorrido(models.Model):
     sentido = models.CharField(max_length=10, choices=SENTIDO_CHOICES)
     color_linea = models.CharField(max_length=7, default='#EF4444')
     grosor_linea = models.IntegerField(default=3)
-    coordenadas = models.JSONField()  # Lista de [lat, lng] del recorrido
+    # [lat, lng] del recorrido como pares int32 en microgrados (ver utils.empaquetar_coordenadas); se lee con .coordenadas
+    coordenadas_empaquetadas = models.BinaryField(default=b'')
+    # Tolerancia Douglas-Peucker (m) hasta la que se conserva cada vértice; None = extremo (siempre)
+    importancia_vertices = models.JSONField(default=list, blank=True)
     archivo_kml = models.CharField(max_length=255, blank=True)
+    hash_kml = models.CharField(max_length=64, blank=True)  # SHA-256 del KML cargado (cargar_kml omite los que no cambian)
+    # Caja (bounding box) de las coordenadas, para descartar recorridos lejanos en la base de datos
+    lat_min = models.FloatField(null=True, blank=True)
+    lat_max = models.FloatField(null=True, blank=True)
+    lng_min = models.FloatField(null=True, blank=True)
+    lng_max = models.FloatField(null=True, blank=True)
     
     class Meta:
         verbose_name = 'Recorrido'
         verbose_name_plural = 'Recorridos'
         ordering = ['ruta', 'sentido']
         unique_together = ['ruta', 'sentido']  # Solo un IDA y un VUELTA por ruta
+        indexes = [
+            models.Index(fields=['lat_min', 'lat_max', 'lng_min', 'lng_max']),
+        ]
     
     def __str__(self):
         return f"{self.ruta.codigo} - {self.sentido}"
 
+    @property
+    def coordenadas(self):
+        """
+        Arreglo float64 (n, 2) de [lat, lng], de solo lectura. Se decodifica la primera vez que se usa
+        y se reutiliza mientras no cambien los bytes guardados; para modificarlo se asigna uno nuevo.
+        """
+        datos = self.coordenadas_empaquetadas
+        cache = getattr(self, '_coordenadas', None)
+        if cache is None or cache[0] is not datos:
+            arreglo = desempaquetar_coordenadas(datos)
+            arreglo.flags.writeable = False
+            cache = self._coordenadas = (datos, arreglo)
+        return cache[1]
+
+    @coordenadas.setter
+    def coordenadas(self, valor):
+        self.coordenadas_empaquetadas = empaquetar_coordenadas(valor)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recorrido = super().from_db(db, field_names, values)
+        # Bytes guardados, para saber al guardar si cambió la geometría (None si se cargó diferido)
+        recorrido._empaquetadas_guardadas = recorrido.__dict__.get('coordenadas_empaquetadas')
+        return recorrido
+
+    def geometria_modificada(self):
+        """True si las coordenadas actuales no son las que se leyeron de la base de datos"""
+        guardadas = getattr(self, '_empaquetadas_guardadas', None)
+        return guardadas is None or bytes(guardadas) != bytes(self.coordenadas_empaquetadas)
+
+    def save(self, *args, **kwargs):
+        # Precalcular la simplificación y la caja al importar/guardar la geometría
+        self.calcular_importancia()
+        self.calcular_caja()
+        geometria_modificada = not self._state.adding and self.geometria_modificada()
+        super().save(*args, **kwargs)
+        self._empaquetadas_guardadas = self.coordenadas_empaquetadas
+        if geometria_modificada:
+            # Los índices de vértice de sus transbordos ya no valen: se descartan hasta el próximo
+            # calcular_transbordos (cargar_kml lo corre al terminar con los recorridos modificados)
+            Transbordo.objects.filter(
+                models.Q(recorrido_origen=self) | models.Q(recorrido_destino=self)
+            ).delete()
+
+    def calcular_importancia(self):
+        """Llena importancia_vertices desde las coordenadas (bulk_create no pasa por save())"""
+        self.importancia_vertices = importancia_a_json(importancia_douglas_peucker(self.coordenadas))
+
+    def calcular_caja(self):
+        """Llena lat_min/lat_max/lng_min/lng_max desde las coordenadas (bulk_create no pasa por save())"""
+        self.lat_min, self.lat_max, self.lng_min, self.lng_max = caja_coordenadas(self.coordenadas)
+
+    @classmethod
+    def cerca_de(cls, punto_a, punto_b, radio_metros):
+        """
+        Recorridos que pueden pasar a menos de radio_metros de ambos puntos: su caja, ampliada en
+        radio_metros, contiene a A y a B. Es una sola consulta sobre las columnas indexadas de la caja;
+        no decodifica coordenadas (los recorridos sin caja quedan fuera).
+        """
+        lat_a, lng_a = float(punto_a['lat']), float(punto_a['lng'])
+        lat_b, lng_b = float(punto_b['lat']), float(punto_b['lng'])
+        delta_lat = radio_metros / METROS_POR_GRADO
+        cos_lat = max(math.cos(math.radians(max(abs(lat_a), abs(lat_b)) + delta_lat)), 1e-6)
+        delta_lng = radio_metros / (METROS_POR_GRADO * cos_lat)
+        return cls.objects.filter(
+            lat_min__lte=min(lat_a, lat_b) + delta_lat,
+            lat_max__gte=max(lat_a, lat_b) - delta_lat,
+            lng_min__lte=min(lng_a, lng_b) + delta_lng,
+            lng_max__gte=max(lng_a, lng_b) - delta_lng,
+        )
+
+
+
+def importancia_a_json(importancia):
+    """Convierte el arreglo de importancias a lista JSON (infinito -> None)"""
+    return [None if v == float('inf') else round(v, 2) for v in importancia.tolist()]
+
 
 class Paradero(models.Model):
     nombre = models.CharField(max_length=200)
@@ -74,8 +168,10 @@ class RecorridoParadero(models.Model):
     """Asocia paraderos con recorridos específicos (IDA o VUELTA)"""
     recorrido = models.ForeignKey(Recorrido, on_delete=models.CASCADE, related_name='recorrido_paraderos')
     paradero = models.ForeignKey(Paradero, on_delete=models.CASCADE, related_name='paradero_recorridos')
-    orden = models.IntegerField(default=0)
-    distancia_metros = models.FloatField()
+    orden = models.IntegerField(default=0)  # Posición del paradero a lo largo del recorrido (1, 2, ...)
+    distancia_metros = models.FloatField()  # Distancia del paradero a la línea del recorrido
+    # Metros desde el inicio del recorrido hasta la proyección del paradero sobre la línea
+    distancia_recorrido = models.FloatField(null=True, blank=True)
     
     class Meta:
         verbose_name = 'Recorrido-Paradero'
@@ -84,4 +180,107 @@ class RecorridoParadero(models.Model):
         unique_together = ['recorrido', 'paradero']
     
     def __str__(self):
-        return f"{self.recorrido} - {self.paradero.nombre}"
\ No newline at end of file
+        return f"{self.recorrido} - {self.paradero.nombre}"
+
+
+class Transbordo(models.Model):
+    """
+    Grafo de transbordos precalculado (comando calcular_transbordos).
+    Cada fila es una zona donde recorrido_origen pasa a menos del radio de transbordo de
+    recorrido_destino: se guarda el par de vértices más cercano de la zona.
+    """
+    recorrido_origen = models.ForeignKey(Recorrido, on_delete=models.CASCADE, related_name='transbordos_salida')
+    recorrido_destino = models.ForeignKey(Recorrido, on_delete=models.CASCADE, related_name='transbordos_llegada')
+    indice_origen = models.IntegerField()
+    indice_destino = models.IntegerField()
+    distancia_metros = models.FloatField()
+
+    class Meta:
+        verbose_name = 'Transbordo'
+        verbose_name_plural = 'Transbordos'
+        ordering = ['recorrido_origen', 'indice_origen']
+        indexes = [
+            models.Index(fields=['recorrido_origen', 'recorrido_destino']),
+        ]
+
+    def __str__(self):
+        return f"{self.recorrido_origen} [{self.indice_origen}] -> {self.recorrido_destino} [{self.indice_destino}]"
+
+class VersionRed(models.Model):
+    """Contador global de la red de rutas: cambia cada vez que se modifican empresas, rutas o recorridos"""
+    version = models.PositiveBigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+    # CambioRed tiene todos los cambios posteriores a esta versión (antes de ella no se registraban)
+    version_base_cambios = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versión de la red'
+        verbose_name_plural = 'Versión de la red'
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    @classmethod
+    def actual(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def estado(cls):
+        """(versión, fecha de la última modificación); (0, None) si la red nunca cambió"""
+        return cls.objects.filter(pk=1).values_list('version', 'fecha_actualizacion').first() or (0, None)
+
+    @classmethod
+    def incrementar(cls):
+        """Sube la versión de forma atómica (una sola fila, UPDATE con F()) y devuelve la nueva"""
+        actualizadas = cls.objects.filter(pk=1).update(
+            version=models.F('version') + 1,
+            fecha_actualizacion=timezone.now()
+        )
+        if not actualizadas:
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+        return cls.actual()
+
+
+class CambioRed(models.Model):
+    """
+    Registro de cambios de la red: qué objeto cambió (o se borró) en cada versión.
+    Lo usa el endpoint red/cambios/ para enviar solo lo modificado desde la versión que tiene el cliente.
+    Los cambios en paraderos de un recorrido (RecorridoParadero) se registran como cambios del recorrido.
+    """
+    MODELO_CHOICES = [
+        ('empresa', 'Empresa'),
+        ('ruta', 'Ruta'),
+        ('recorrido', 'Recorrido'),
+        ('paradero', 'Paradero'),
+    ]
+
+    RETENCION_VERSIONES = 1000  # versiones hacia atrás que se conservan (ver podar)
+
+    version = models.PositiveBigIntegerField(db_index=True)
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Cambio de la red'
+        verbose_name_plural = 'Cambios de la red'
+        ordering = ['version']
+
+    def __str__(self):
+        return f"v{self.version} {self.modelo} {self.objeto_id}"
+
+    @classmethod
+    def registrar(cls, modelo, ids, version):
+        cls.objects.bulk_create(cls(version=version, modelo=modelo, objeto_id=objeto_id) for objeto_id in set(ids))
+
+    @classmethod
+    def podar(cls, version):
+        """
+        Borra los cambios de más de RETENCION_VERSIONES versiones atrás y sube version_base_cambios:
+        a un cliente más atrasado que eso red/cambios/ le responde con la red completa.
+        """
+        base = version - cls.RETENCION_VERSIONES
+        if base <= 0:
+            return
+        if VersionRed.objects.filter(pk=1, version_base_cambios__lt=base).update(version_base_cambios=base):
+            cls.objects.filter(version__lte=base).delete()
@@ -0,0 +1,192 @@
+#rutas/planificador.py
+import numpy as np
+from .utils import distancias_haversine
+
+VELOCIDAD_BUS = 4.0  # m/s (mismo supuesto que buscar_rutas_combinadas_view)
+VELOCIDAD_CAMINATA = 1.25  # m/s
+PENALIDAD_TRANSBORDO = 180  # segundos (3 min por transbordo)
+
+
+class Planificador:
+    """
+    Planificador de viajes por rondas (estilo RAPTOR) sobre la red de paraderos.
+    La ronda k encuentra los mejores tiempos de llegada a cada paradero usando k buses.
+    En vez de recorrer polilíneas, recorre las secuencias de paraderos precalculadas de cada recorrido.
+    Los tiempos son segundos desde la salida (no hay horarios: velocidad constante + penalidad por transbordo).
+    """
+
+    def __init__(self, red):
+        self.red = red
+        self.coordenadas = red.paraderos_coordenadas
+
+        # secuencias[r] = (recorrido_id, paraderos, posiciones, distancia_desde_inicio) en orden de paso
+        self.secuencias = []
+        self.rutas_por_parada = [[] for _ in range(len(red.paradero_ids))]
+
+        for recorrido_id, paradas in red.paradas_recorrido.items():
+            if len(paradas) < 2:
+                continue
+            r = len(self.secuencias)
+            self.secuencias.append((
+                recorrido_id,
+                np.array([p for p, _, _ in paradas], dtype=np.int64),
+                np.array([posicion for _, posicion, _ in paradas], dtype=np.float64),
+                np.array([distancia for _, _, distancia in paradas], dtype=np.float64)
+            ))
+            for pos, (p, _, _) in enumerate(paradas):
+                self.rutas_por_parada[p].append((r, pos))
+
+    def planificar(self, origen, destino, max_transbordos=2, radio_origen=1000,
+                   radio_destino=1000, radio_transbordo=300):
+        """
+        Devuelve los viajes no dominados (menos transbordos o menos tiempo), con la misma
+        estructura de tramos que buscar_rutas_combinadas_view.
+        """
+        cantidad = len(self.coordenadas)
+        if cantidad == 0 or not self.secuencias:
+            return []
+
+        rondas = max_transbordos + 1
+        tau = np.full((rondas + 1, cantidad), np.inf)
+        mejor = np.full(cantidad, np.inf)
+        padres = [{} for _ in range(rondas + 1)]
+
+        d_origen = distancias_haversine(np.array([[origen['lat'], origen['lng']]]), self.coordenadas)[0]
+        d_destino = distancias_haversine(np.array([[destino['lat'], destino['lng']]]), self.coordenadas)[0]
+        egreso = np.flatnonzero(d_destino <= radio_destino)
+
+        # Ronda 0: caminar desde el origen hasta los paraderos cercanos
+        marcadas = set()
+        for p in np.flatnonzero(d_origen <= radio_origen).tolist():
+            tau[0, p] = mejor[p] = d_origen[p] / VELOCIDAD_CAMINATA
+            padres[0][p] = ('acceso',)
+            marcadas.add(p)
+
+        mejor_llegada = np.inf
+        viajes = []
+
+        for k in range(1, rondas + 1):
+            tau[k] = tau[k - 1]
+            penalidad = PENALIDAD_TRANSBORDO if k > 1 else 0
+
+            # Para cada recorrido, el primer paradero marcado en la ronda anterior
+            cola = {}
+            for p in marcadas:
+                for r, pos in self.rutas_por_parada[p]:
+                    if pos < cola.get(r, len(self.secuencias[r][1])):
+                        cola[r] = pos
+            marcadas = set()
+
+            for r, pos_inicio in cola.items():
+                _, paradas, _, distancias = self.secuencias[r]
+                abordo = None  # (posición de subida, tiempo de subida)
+
+                for pos in range(pos_inicio, len(paradas)):
+                    p = paradas[pos]
+                    llegada = np.inf
+                    if abordo is not None:
+                        llegada = abordo[1] + (distancias[pos] - distancias[abordo[0]]) / VELOCIDAD_BUS
+                        if llegada < min(mejor[p], mejor_llegada):
+                            tau[k, p] = mejor[p] = llegada
+                            padres[k][p] = ('bus', r, abordo[0], pos)
+                            marcadas.add(p)
+
+                    # ¿Conviene subir (o volver a subir) en este paradero?
+                    salida = tau[k - 1, p] + penalidad
+                    if salida < llegada:
+                        abordo = (pos, salida)
+
+            # Transbordos caminando entre paraderos cercanos
+            for p in list(marcadas):
+                distancias_p = distancias_haversine(self.coordenadas[p:p + 1], self.coordenadas)[0]
+                for q in np.flatnonzero(distancias_p <= radio_transbordo).tolist():
+                    llegada = tau[k, p] + distancias_p[q] / VELOCIDAD_CAMINATA
+                    if q != p and llegada < min(mejor[q], mejor_llegada):
+                        tau[k, q] = mejor[q] = llegada
+                        padres[k][q] = ('caminata', p, float(distancias_p[q]))
+                        marcadas.add(q)
+
+            # Caminar desde el último paradero hasta el destino
+            if len(egreso):
+                llegadas = tau[k, egreso] + d_destino[egreso] / VELOCIDAD_CAMINATA
+                i = int(llegadas.argmin())
+                if llegadas[i] < mejor_llegada:
+                    mejor_llegada = llegadas[i]
+                    viaje = self._reconstruir(padres, k, int(egreso[i]), d_origen, d_destino, llegadas[i])
+                    if viaje is not None:
+                        viajes.append(viaje)
+
+            if not marcadas:
+                break
+
+        viajes.sort(key=lambda v: v['tiempo_estimado_minutos'])
+        return viajes
+
+    def _reconstruir(self, padres, k, p, d_origen, d_destino, tiempo_total):
+        """Sigue las etiquetas hacia atrás desde el paradero final y arma los tramos del viaje"""
+        tramos = []  # ('bus', r, pos_subida, pos_bajada) o ('caminata', desde, hasta, metros)
+        paradero_final = p
+        while True:
+            while k > 0 and p not in padres[k]:
+                k -= 1
+            etiqueta = padres[k][p]
+            if etiqueta[0] == 'acceso':
+                break
+            if etiqueta[0] == 'caminata':
+                tramos.append(('caminata', etiqueta[1], p, etiqueta[2]))
+                p = etiqueta[1]
+                continue
+            _, r, pos_subida, pos_bajada = etiqueta
+            tramos.append(('bus', r, pos_subida, pos_bajada))
+            p = int(self.secuencias[r][1][pos_subida])
+            k -= 1
+        tramos.reverse()
+
+        buses = [t for t in tramos if t[0] == 'bus']
+        if not buses:
+            return None
+
+        # Metros caminados antes de cada bus y al final
+        caminatas = [0.0] * (len(buses) + 1)
+        caminatas[0] = float(d_origen[self.secuencias[buses[0][1]][1][buses[0][2]]])
+        caminatas[-1] = float(d_destino[paradero_final])
+        n_bus = 0
+        for tramo in tramos:
+            if tramo[0] == 'bus':
+                n_bus += 1
+            else:
+                caminatas[n_bus] += tramo[3]
+
+        rutas = []
+        puntos_transbordo = []
+        distancia_total = 0.0
+        for n, (_, r, pos_subida, pos_bajada) in enumerate(buses):
+            recorrido_id, paradas, posiciones, distancias = self.secuencias[r]
+            segmento, _ = self.red.tramo(recorrido_id, posiciones[pos_subida], posiciones[pos_bajada])
+            distancia = float(distancias[pos_bajada] - distancias[pos_subida])
+            distancia_total += distancia
+            rutas.append({
+                'ruta': {
+                    **self.red.info(recorrido_id),
+                    'distancia_a_origen': int(caminatas[n]),
+                    'distancia_a_destino': int(caminatas[n + 1])
+                },
+                'segmento_coordenadas': segmento.tolist(),
+                'distancia': int(distancia),
+                'paradero_subida': self.red.paradero_nombres[paradas[pos_subida]],
+                'paradero_bajada': self.red.paradero_nombres[paradas[pos_bajada]],
+            })
+            if n < len(buses) - 1:
+                lat, lng = self.coordenadas[paradas[pos_bajada]].tolist()
+                puntos_transbordo.append({'lat': lat, 'lng': lng})
+
+        return {
+            'id': '-'.join(str(ruta['ruta']['id']) for ruta in rutas),
+            'rutas': rutas,
+            'distancia_total': int(distancia_total),
+            'tiempo_estimado_minutos': int(tiempo_total / 60),
+            'punto_transbordo': puntos_transbordo[0] if puntos_transbordo else None,
+            'distancia_transbordo': int(caminatas[1]) if len(buses) > 1 else 0,
+            'puntos_transbordo': puntos_transbordo,
+            'transbordos': len(buses) - 1,
+        }
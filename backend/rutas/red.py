@@ -0,0 +1,354 @@
+#rutas/red.py
+import math
+import threading
+from contextlib import contextmanager
+import numpy as np
+from .indice_espacial import IndiceEspacial
+from .utils import (
+    desempaquetar_coordenadas, distancias_acumuladas, importancia_douglas_peucker, tramo_entre, ubicar_paradas
+)
+
+
+class RedRutas:
+    """
+    Red completa de rutas cargada en memoria una sola vez por proceso.
+    - Las coordenadas de todos los recorridos van en un único arreglo float64 (total, 2);
+      el recorrido k ocupa las filas offsets[k]:offsets[k + 1].
+    - 'acumuladas' va alineado con 'coordenadas': distancia (m) desde el inicio del recorrido hasta
+      cada vértice, así la longitud de cualquier tramo es una resta.
+    - 'importancias' va alineado con 'coordenadas': tolerancia Douglas-Peucker precalculada de cada vértice.
+    - Rutas y empresas se guardan como listas alineadas, referenciadas por posición.
+    - 'transbordos' es el grafo precalculado por el comando calcular_transbordos.
+    - 'paradas_recorrido' guarda la secuencia de paraderos de cada recorrido, en orden de paso, con su
+      posición fraccionaria y su distancia a lo largo del recorrido.
+    - 'version' es la VersionRed con la que se cargó; si cambia en la base de datos, se recarga.
+    """
+
+    def __init__(self, version, empresas, rutas, recorridos, transbordos=(), paraderos=(), asociaciones=()):
+        self.version = version
+        self._planificador = None
+
+        # Empresas: posición -> nombre
+        self.empresa_ids = np.array([e[0] for e in empresas], dtype=np.int64)
+        self.empresa_nombres = [e[1] for e in empresas]
+        pos_empresa = {empresa_id: k for k, empresa_id in enumerate(self.empresa_ids.tolist())}
+
+        # Rutas: posición -> nombre, código y posición de su empresa
+        self.ruta_ids = np.array([r[0] for r in rutas], dtype=np.int64)
+        self.ruta_nombres = [r[1] for r in rutas]
+        self.ruta_codigos = [r[2] for r in rutas]
+        self.ruta_empresa = np.array([pos_empresa[r[3]] for r in rutas], dtype=np.int32)
+        pos_ruta = {ruta_id: k for k, ruta_id in enumerate(self.ruta_ids.tolist())}
+
+        # Recorridos (sin coordenadas se descartan)
+        recorridos = [r for r in recorridos if len(r[1])]
+        self.ids = np.array([r[0] for r in recorridos], dtype=np.int64)
+        self.sentidos = [r[2] for r in recorridos]
+        self.colores = [r[3] for r in recorridos]
+        self.recorrido_ruta = np.array([pos_ruta[r[4]] for r in recorridos], dtype=np.int32)
+        self.posicion = {recorrido_id: k for k, recorrido_id in enumerate(self.ids.tolist())}
+
+        longitudes = np.array([len(r[1]) for r in recorridos], dtype=np.int64)
+        self.offsets = np.zeros(len(recorridos) + 1, dtype=np.int64)
+        np.cumsum(longitudes, out=self.offsets[1:])
+        self.coordenadas = np.empty((int(self.offsets[-1]), 2), dtype=np.float64)
+        for k, r in enumerate(recorridos):
+            self.coordenadas[self.offsets[k]:self.offsets[k + 1]] = r[1]
+
+        # Importancia Douglas-Peucker guardada al importar (se recalcula si falta o no coincide)
+        self.importancias = np.empty(len(self.coordenadas), dtype=np.float64)
+        for k, r in enumerate(recorridos):
+            importancia = r[5] if len(r) > 5 else None
+            if importancia and len(importancia) == len(r[1]):
+                valores = np.array([np.inf if v is None else v for v in importancia], dtype=np.float64)
+            else:
+                valores = importancia_douglas_peucker(r[1])
+            self.importancias[self.offsets[k]:self.offsets[k + 1]] = valores
+
+        # Distancia acumulada (chainage): se calcula sobre todo el arreglo y se reinicia en cada recorrido
+        self.acumuladas = distancias_acumuladas(self.coordenadas)
+        if len(recorridos):
+            inicios = self.offsets[:-1]
+            self.acumuladas -= np.repeat(self.acumuladas[inicios], longitudes)
+
+        self.indice = IndiceEspacial()
+        for recorrido_id in self.posicion:
+            self.indice.agregar_recorrido(recorrido_id, self.arreglo(recorrido_id))
+
+        # Grafo de transbordos: origen_id -> [(destino_id, indice_origen, indice_destino, distancia), ...]
+        self.transbordos = {}
+        # Se descartan los que apuntan fuera de los vértices actuales (filas de una geometría anterior)
+        for origen_id, destino_id, i, j, distancia in transbordos:
+            if origen_id not in self.posicion or destino_id not in self.posicion:
+                continue
+            if 0 <= i < len(self.arreglo(origen_id)) and 0 <= j < len(self.arreglo(destino_id)):
+                self.transbordos.setdefault(origen_id, []).append((destino_id, i, j, distancia))
+
+        # Paraderos: posición -> nombre y coordenadas (arreglo (P, 2))
+        paraderos = list(paraderos)
+        self.paradero_ids = np.array([p[0] for p in paraderos], dtype=np.int64)
+        self.paradero_nombres = [p[1] for p in paraderos]
+        self.paraderos_coordenadas = np.array([[p[2], p[3]] for p in paraderos], dtype=np.float64).reshape(-1, 2)
+        pos_paradero = {paradero_id: k for k, paradero_id in enumerate(self.paradero_ids.tolist())}
+
+        # Secuencia de paraderos por recorrido, en el 'orden' guardado al importar:
+        # [(posicion_paradero, posicion_en_recorrido, distancia_recorrido), ...]
+        por_recorrido = {}
+        for recorrido_id, paradero_id, orden, distancia in asociaciones:
+            if recorrido_id in self.posicion and paradero_id in pos_paradero:
+                por_recorrido.setdefault(recorrido_id, []).append((orden, distancia, pos_paradero[paradero_id]))
+        self.paradas_recorrido = {}
+        for recorrido_id, filas in por_recorrido.items():
+            # Asociaciones antiguas sin distancia a lo largo: se proyectan al cargar
+            faltan = [k for k, fila in enumerate(filas) if fila[1] is None]
+            if faltan:
+                puntos = self.paraderos_coordenadas[[filas[k][2] for k in faltan]]
+                for k, _, _, distancia in ubicar_paradas(puntos, self.arreglo(recorrido_id), float('inf')):
+                    filas[faltan[k]] = (filas[faltan[k]][0], distancia, filas[faltan[k]][2])
+            filas.sort(key=lambda fila: (fila[0], fila[1]))
+            self.paradas_recorrido[recorrido_id] = [
+                (p, self.posicion_en(recorrido_id, distancia), distancia) for _, distancia, p in filas
+            ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def arreglo(self, recorrido_id):
+        """Coordenadas del recorrido como vista (sin copia) del arreglo global"""
+        k = self.posicion[recorrido_id]
+        return self.coordenadas[self.offsets[k]:self.offsets[k + 1]]
+
+    def importancia(self, recorrido_id):
+        """Importancia Douglas-Peucker por vértice del recorrido (vista del arreglo global)"""
+        k = self.posicion[recorrido_id]
+        return self.importancias[self.offsets[k]:self.offsets[k + 1]]
+
+    def tramo(self, recorrido_id, posicion_inicio, posicion_fin):
+        """
+        Parte del recorrido entre dos posiciones fraccionarias (ver tramo_entre) junto con la
+        importancia de cada punto; los extremos proyectados siempre se conservan.
+        """
+        arreglo = tramo_entre(self.arreglo(recorrido_id), posicion_inicio, posicion_fin)
+        interior = self.importancia(recorrido_id)[math.floor(posicion_inicio) + 1:math.ceil(posicion_fin)]
+        return arreglo, np.concatenate(([np.inf], interior, [np.inf]))
+
+    def acumulada(self, recorrido_id):
+        """Distancia acumulada por vértice del recorrido (vista del arreglo global)"""
+        k = self.posicion[recorrido_id]
+        return self.acumuladas[self.offsets[k]:self.offsets[k + 1]]
+
+    def distancia_entre(self, recorrido_id, posicion_inicio, posicion_fin):
+        """Metros a lo largo del recorrido entre dos posiciones (enteras o fraccionarias): una resta"""
+        return abs(self.distancia_en(recorrido_id, posicion_fin) - self.distancia_en(recorrido_id, posicion_inicio))
+
+    def distancia_en(self, recorrido_id, posicion):
+        """Distancia desde el inicio del recorrido hasta una posición fraccionaria"""
+        acumulada = self.acumulada(recorrido_id)
+        i = min(int(posicion), len(acumulada) - 1)
+        if i == len(acumulada) - 1:
+            return float(acumulada[i])
+        return float(acumulada[i] + (posicion - i) * (acumulada[i + 1] - acumulada[i]))
+
+    def posicion_en(self, recorrido_id, distancia):
+        """Posición fraccionaria a 'distancia' metros del inicio del recorrido (inversa de distancia_en)"""
+        acumulada = self.acumulada(recorrido_id)
+        return float(np.interp(distancia, acumulada, np.arange(len(acumulada))))
+
+    @property
+    def planificador(self):
+        """Planificador de viajes con transbordos, construido la primera vez que se usa"""
+        if self._planificador is None:
+            from .planificador import Planificador
+            self._planificador = Planificador(self)
+        return self._planificador
+
+    def info(self, recorrido_id):
+        """Datos del recorrido con la forma que usan las respuestas de búsqueda"""
+        k = self.posicion[recorrido_id]
+        ruta = self.recorrido_ruta[k]
+        return {
+            'id': recorrido_id,
+            'nombre_ruta': self.ruta_nombres[ruta],
+            'empresa': self.empresa_nombres[self.ruta_empresa[ruta]],
+            'sentido': self.sentidos[k],
+            'color': self.colores[k],
+        }
+
+    @classmethod
+    def desde_bd(cls, version, recorridos=None):
+        """
+        Carga la red desde la base de datos. 'recorridos' (un queryset de Recorrido) limita la carga
+        a esos recorridos, junto con sus transbordos y paraderos; por defecto se cargan todos.
+        """
+        from .models import Empresa, Ruta, Recorrido, Transbordo, Paradero, RecorridoParadero
+
+        transbordos = Transbordo.objects.order_by()
+        asociaciones = RecorridoParadero.objects.all()
+        if recorridos is None:
+            recorridos = Recorrido.objects.all()
+        else:
+            ids = recorridos.values('id')
+            transbordos = transbordos.filter(recorrido_origen_id__in=ids, recorrido_destino_id__in=ids)
+            asociaciones = asociaciones.filter(recorrido_id__in=ids)
+
+        empresas = list(Empresa.objects.values_list('id', 'nombre'))
+        rutas = list(Ruta.objects.values_list('id', 'nombre', 'codigo', 'empresa_id'))
+        # Las coordenadas llegan empaquetadas: se convierten directo a arreglo, sin pasar por listas
+        recorridos = [
+            (r[0], desempaquetar_coordenadas(r[1])) + r[2:]
+            for r in recorridos.values_list(
+                'id', 'coordenadas_empaquetadas', 'sentido', 'color_linea', 'ruta_id', 'importancia_vertices'
+            )
+        ]
+        transbordos = transbordos.values_list(
+            'recorrido_origen_id', 'recorrido_destino_id', 'indice_origen', 'indice_destino', 'distancia_metros'
+        )
+        paraderos = Paradero.objects.values_list('id', 'nombre', 'latitud', 'longitud')
+        asociaciones = asociaciones.values_list('recorrido_id', 'paradero_id', 'orden', 'distancia_recorrido')
+        return cls(version, empresas, rutas, recorridos, transbordos, paraderos, asociaciones)
+
+
+# Red compartida por el proceso
+_red = None
+_lock = threading.Lock()
+_version_parcial = None  # versión para la que red_cerca_de ya sirvió una red parcial
+_agrupacion = threading.local()  # cambios acumulados por cambios_agrupados() en este hilo
+
+
+def obtener_red():
+    """
+    Devuelve la red del proceso. Solo consulta la versión en la base de datos (una fila);
+    si otro proceso o un 'cargar_kml' cambió los datos, recarga la red completa.
+    """
+    global _red
+    from .models import VersionRed
+
+    version = VersionRed.actual()
+    red = _red
+    if red is not None and red.version == version:
+        return red
+
+    with _lock:
+        if _red is None or _red.version != version:
+            _red = RedRutas.desde_bd(version)
+        return _red
+
+
+def red_cerca_de(punto_a, punto_b, radio_metros):
+    """
+    Red para buscar recorridos que pasen a menos de radio_metros de A y de B.
+    Si la red del proceso ya está cargada y vigente se usa esa. Si no, la primera petición de cada versión
+    no espera la carga completa: se cargan solo los recorridos cuya caja ampliada contiene ambos puntos
+    (Recorrido.cerca_de), los lejanos se descartan en la base de datos sin decodificar sus coordenadas.
+    La siguiente petición ya carga la red completa con obtener_red(), que queda guardada en el proceso.
+    Devuelve (red, completa); una red parcial no se guarda como red del proceso.
+    """
+    global _version_parcial
+    from .models import Recorrido, VersionRed
+
+    version = VersionRed.actual()
+    red = _red
+    if red is not None and red.version == version:
+        return red, True
+    if _version_parcial == version:
+        return obtener_red(), True
+    _version_parcial = version
+    return RedRutas.desde_bd(version, Recorrido.cerca_de(punto_a, punto_b, radio_metros)), False
+
+
+def invalidar_red():
+    """
+    Descarta la red del proceso y marca los datos como modificados para todos los procesos.
+    Devuelve la nueva versión de la red (None dentro de cambios_agrupados(), que la sube al terminar).
+    """
+    global _red
+    from .models import VersionRed
+    from .cache_busquedas import cache_busquedas
+    from .cache_respuestas import cache_respuestas, cache_teselas
+
+    if getattr(_agrupacion, 'cambios', None) is not None:
+        _agrupacion.invalidar = True
+        return None
+    version = VersionRed.incrementar()
+    _red = None
+    cache_busquedas.limpiar()
+    cache_respuestas.limpiar()
+    cache_teselas.limpiar()
+    return version
+
+
+def _cambios_al_confirmar(conexion):
+    """
+    Cambios acumulados para la transacción en curso; se registran en una sola versión cuando se confirma.
+    Si la transacción se deshizo, su callback ya no está pendiente y se empieza un acumulado nuevo.
+    """
+    from django.db import transaction
+
+    confirmar = getattr(_agrupacion, 'confirmar', None)
+    if confirmar is None or all(funcion is not confirmar for _, funcion, *_ in conexion.run_on_commit):
+        cambios = {}
+
+        def confirmar():
+            _agrupacion.confirmar = None
+            _registrar_version(list(cambios.items()))
+
+        confirmar.cambios = cambios
+        _agrupacion.confirmar = confirmar
+        transaction.on_commit(confirmar)
+    return confirmar.cambios
+
+
+def registrar_cambios_red(cambios):
+    """
+    Sube la versión de la red (invalidar_red) y registra en CambioRed los objetos modificados
+    en una sola transacción: ningún cliente ve la versión nueva sin sus cambios.
+    'cambios' es una lista de (modelo, ids). Devuelve la nueva versión.
+    Dentro de cambios_agrupados() solo se acumulan y devuelve None. Dentro de una transacción
+    (un borrado en cascada, un guardado del admin con inlines) también se acumulan y se registran
+    una sola vez al confirmarla; devuelve None.
+    """
+    from django.db import transaction
+
+    agrupados = getattr(_agrupacion, 'cambios', None)
+    conexion = transaction.get_connection()
+    if agrupados is None and conexion.in_atomic_block:
+        agrupados = _cambios_al_confirmar(conexion)
+    if agrupados is not None:
+        for modelo, ids in cambios:
+            agrupados.setdefault(modelo, set()).update(ids)
+        return None
+    return _registrar_version(cambios)
+
+
+def _registrar_version(cambios):
+    """Registra los cambios en una versión nueva de la red, ya fuera de cualquier agrupación"""
+    from django.db import transaction
+    from .models import CambioRed
+
+    with transaction.atomic():
+        version = invalidar_red()
+        for modelo, ids in cambios:
+            CambioRed.registrar(modelo, ids, version)
+        CambioRed.podar(version)
+    return version
+
+
+@contextmanager
+def cambios_agrupados():
+    """
+    Agrupa los cambios de la red hechos en el bloque (en este hilo): las señales y invalidar_red()
+    solo los acumulan y al salir se registran todos juntos en una sola versión nueva.
+    Para importaciones que guardan muchos objetos uno por uno.
+    """
+    if getattr(_agrupacion, 'cambios', None) is not None:
+        yield
+        return
+    _agrupacion.cambios = {}
+    _agrupacion.invalidar = False
+    try:
+        yield
+    finally:
+        cambios = _agrupacion.cambios
+        _agrupacion.cambios = None
+        if cambios or _agrupacion.invalidar:
+            registrar_cambios_red(list(cambios.items()))
@@ -0,0 +1,41 @@
+from django.apps import apps as global_apps
+from django.core.management import call_command
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .models import Empresa, Ruta, Recorrido, Paradero, RecorridoParadero
+from .red import registrar_cambios_red
+
+MODELOS_CAMBIOS = {Empresa: 'empresa', Ruta: 'ruta', Recorrido: 'recorrido', Paradero: 'paradero'}
+
+
+@receiver(post_save, sender=Empresa)
+@receiver(post_delete, sender=Empresa)
+@receiver(post_save, sender=Ruta)
+@receiver(post_delete, sender=Ruta)
+@receiver(post_save, sender=Recorrido)
+@receiver(post_delete, sender=Recorrido)
+@receiver(post_save, sender=Paradero)
+@receiver(post_delete, sender=Paradero)
+@receiver(post_save, sender=RecorridoParadero)
+@receiver(post_delete, sender=RecorridoParadero)
+def red_modificada(sender, instance, **kwargs):
+    """Subir la versión de la red para que todos los procesos recarguen su copia en memoria."""
+    # Registrar el cambio para red/cambios/ (los paraderos de un recorrido viajan con el recorrido)
+    if sender is RecorridoParadero:
+        registrar_cambios_red([('recorrido', [instance.recorrido_id])])
+    else:
+        registrar_cambios_red([(MODELOS_CAMBIOS[sender], [instance.pk])])
+
+
+@receiver(post_migrate)
+def transbordos_iniciales(sender, apps=global_apps, verbosity=1, **kwargs):
+    """Después de migrate, si hay recorridos pero ningún transbordo, calcular el grafo completo."""
+    # flush también envía post_migrate, sin 'apps'
+    if sender.name != 'rutas':
+        return
+    try:
+        Transbordo = apps.get_model('rutas', 'Transbordo')
+    except LookupError:  # migrado a un estado anterior a los transbordos
+        return
+    if apps.get_model('rutas', 'Recorrido').objects.exists() and not Transbordo.objects.exists():
+        call_command('calcular_transbordos', verbosity=verbosity)
@@ -0,0 +1,117 @@
+#rutas/sintetico.py
+# Generador determinista de redes de rutas sintéticas para el comando benchmark_rutas.
+import math
+import numpy as np
+from .utils import METROS_POR_GRADO, importancia_douglas_peucker, distancias_acumuladas
+
+CENTRO = (-16.40, -71.535)  # Arequipa
+EXTENSION_GRADOS = 0.12  # lado de la zona cubierta (~13 km)
+PASO_METROS = 30  # distancia media entre vértices consecutivos
+SEPARACION_VUELTA = 8  # metros entre la IDA y la VUELTA (carriles opuestos)
+
+
+def _plegar(valores, minimo, maximo):
+    """Refleja los valores dentro de [minimo, maximo] sin cortar la línea (onda triangular)"""
+    largo = maximo - minimo
+    t = np.mod(valores - minimo, 2 * largo)
+    return minimo + largo - np.abs(t - largo)
+
+
+def generar_polilinea(rng, vertices, centro=CENTRO, extension=EXTENSION_GRADOS):
+    """
+    Recorrido tipo 'calle': camina desde un punto al azar con pasos de ~PASO_METROS
+    y giros suaves; al llegar al borde de la zona rebota hacia adentro.
+    """
+    lat0, lng0 = centro
+    cos_lat = math.cos(math.radians(lat0))
+    rumbos = rng.uniform(0, 2 * math.pi) + np.cumsum(rng.normal(0, 0.15, vertices))
+    pasos = rng.uniform(0.5, 1.5, vertices) * PASO_METROS / METROS_POR_GRADO
+    pasos[0] = 0
+
+    lat = rng.uniform(-0.5, 0.5) * extension + lat0 + np.cumsum(pasos * np.cos(rumbos))
+    lng = rng.uniform(-0.5, 0.5) * extension + lng0 + np.cumsum(pasos * np.sin(rumbos) / cos_lat)
+    lat = _plegar(lat, lat0 - extension / 2, lat0 + extension / 2)
+    lng = _plegar(lng, lng0 - extension / 2, lng0 + extension / 2)
+    return np.round(np.column_stack((lat, lng)), 6)
+
+
+def generar_red_sintetica(recorridos=200, vertices=1000, semilla=0, cada_paradero=25):
+    """
+    Crea en la base de datos una red sintética de 'recorridos' recorridos (IDA y VUELTA por ruta)
+    con 'vertices' vértices cada uno, sus paraderos cada 'cada_paradero' vértices y sus importancias.
+    Con la misma semilla se genera exactamente la misma red.
+    Devuelve la cantidad de filas creadas por modelo.
+    """
+    from .models import Empresa, Ruta, Recorrido, Paradero, RecorridoParadero, importancia_a_json
+
+    rng = np.random.default_rng(semilla)
+    cantidad_rutas = math.ceil(recorridos / 2)
+    desfase = SEPARACION_VUELTA / METROS_POR_GRADO
+
+    empresas = Empresa.objects.bulk_create(
+        Empresa(nombre=f'Empresa sintética {k + 1:03d}') for k in range(math.ceil(cantidad_rutas / 10))
+    )
+    rutas = Ruta.objects.bulk_create(
+        Ruta(empresa=empresas[k // 10], nombre=f'Ruta sintética {k + 1:04d}', codigo=f'SIN-{k + 1:04d}')
+        for k in range(cantidad_rutas)
+    )
+
+    filas = []
+    for k in range(recorridos):
+        ruta = rutas[k // 2]
+        if k % 2 == 0:
+            ida = generar_polilinea(rng, vertices)
+            coordenadas = ida
+            sentido = 'IDA'
+        else:
+            coordenadas = np.round(ida[::-1] + desfase, 6)
+            sentido = 'VUELTA'
+        recorrido = Recorrido(
+            ruta=ruta,
+            sentido=sentido,
+            color_linea='#%06X' % int(rng.integers(0, 0xFFFFFF)),
+            coordenadas=coordenadas,
+            importancia_vertices=importancia_a_json(importancia_douglas_peucker(coordenadas)),
+            archivo_kml='sintetico',
+        )
+        recorrido.calcular_caja()
+        filas.append(recorrido)
+    creados = Recorrido.objects.bulk_create(filas, batch_size=200)
+
+    paraderos = []
+    asociaciones = []
+    for recorrido in creados:
+        acumulada = distancias_acumuladas(recorrido.coordenadas)
+        for orden, indice in enumerate(range(0, len(recorrido.coordenadas), cada_paradero), start=1):
+            lat, lng = recorrido.coordenadas[indice]
+            paraderos.append(Paradero(nombre=f'P{recorrido.pk}-{orden}', latitud=lat, longitud=lng))
+            asociaciones.append((recorrido, orden, float(acumulada[indice])))
+    paraderos = Paradero.objects.bulk_create(paraderos, batch_size=1000)
+    RecorridoParadero.objects.bulk_create(
+        (RecorridoParadero(recorrido=recorrido, paradero=paradero, orden=orden,
+                           distancia_metros=0, distancia_recorrido=distancia)
+         for paradero, (recorrido, orden, distancia) in zip(paraderos, asociaciones)),
+        batch_size=1000
+    )
+
+    return {
+        'empresas': len(empresas),
+        'rutas': len(rutas),
+        'recorridos': len(creados),
+        'paraderos': len(paraderos),
+    }
+
+
+def pares_consulta(red, cantidad, semilla=0, dispersion_metros=300):
+    """
+    Pares origen-destino deterministas: cada punto cae cerca (hasta dispersion_metros) de un vértice
+    al azar de la red, de modo que casi todas las consultas encuentren recorridos cercanos.
+    """
+    rng = np.random.default_rng(semilla)
+    vertices = red.coordenadas[rng.integers(0, len(red.coordenadas), (cantidad, 2))]
+    ruido = rng.uniform(-1, 1, (cantidad, 2, 2)) * dispersion_metros / METROS_POR_GRADO
+    puntos = np.round(vertices + ruido, 6).tolist()
+    return [
+        ({'lat': a[0], 'lng': a[1]}, {'lat': b[0], 'lng': b[1]})
+        for a, b in puntos
+    ]
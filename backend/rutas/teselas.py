@@ -0,0 +1,112 @@
+#rutas/teselas.py
+# Teselas GeoJSON (z/x/y, esquema XYZ de Web Mercator) con los recorridos de la red en memoria:
+# cada tesela lleva solo los tramos que la cruzan, recortados a su borde y simplificados a 1 pixel.
+import math
+import numpy as np
+from .utils import tolerancia_para_zoom
+
+ZOOM_MINIMO = 10  # por debajo la ciudad entera cabe en una o dos teselas: se sirven vacías
+ZOOM_MAXIMO = 22
+PIXELES_TESELA = 256
+BORDE_PIXELES = 8  # margen alrededor de la tesela para que las líneas se unan sin cortes entre teselas
+
+
+def limites_tesela(z, x, y):
+    """(lat_min, lat_max, lng_min, lng_max) de la tesela"""
+    n = 2 ** z
+    lng_min = x / n * 360 - 180
+    lng_max = (x + 1) / n * 360 - 180
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_min, lat_max, lng_min, lng_max
+
+
+def tesela_valida(z, x, y):
+    return 0 <= z <= ZOOM_MAXIMO and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tesela_vacia():
+    return {'type': 'FeatureCollection', 'features': []}
+
+
+def recortar_polilinea(arreglo, lat_min, lat_max, lng_min, lng_max):
+    """
+    Recorta la polilínea (n, 2) de [lat, lng] a la caja (Liang-Barsky, vectorizado sobre todos los segmentos).
+    Devuelve la lista de partes que quedan dentro, cada una un arreglo (k, 2); una línea que sale
+    y vuelve a entrar a la caja da varias partes.
+    """
+    if len(arreglo) < 2:
+        return []
+    inicio = arreglo[:-1]
+    delta = arreglo[1:] - inicio
+
+    t0 = np.zeros(len(delta))
+    t1 = np.ones(len(delta))
+    visible = np.ones(len(delta), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for eje, minimo, maximo in ((0, lat_min, lat_max), (1, lng_min, lng_max)):
+            for p, q in ((-delta[:, eje], inicio[:, eje] - minimo), (delta[:, eje], maximo - inicio[:, eje])):
+                # Paralelo al borde y por fuera: se descarta; si no, se acota el intervalo [t0, t1]
+                visible &= ~((p == 0) & (q < 0))
+                r = q / p
+                t0 = np.where(p < 0, np.maximum(t0, r), t0)
+                t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    visible &= t0 <= t1
+
+    partes = []
+    actual = []
+    anterior = -2
+    for k in np.flatnonzero(visible).tolist():
+        # Una parte sigue mientras los segmentos visibles sean consecutivos y no se corten en el borde
+        if k != anterior + 1 or t0[k] > 0 or not actual:
+            if len(actual) > 1:
+                partes.append(np.array(actual))
+            actual = [inicio[k] + t0[k] * delta[k]]
+        actual.append(inicio[k] + t1[k] * delta[k])
+        if t1[k] < 1:
+            partes.append(np.array(actual))
+            actual = []
+        anterior = k
+    if len(actual) > 1:
+        partes.append(np.array(actual))
+    return partes
+
+
+def generar_tesela(red, z, x, y):
+    """FeatureCollection GeoJSON (dict) de la tesela: un MultiLineString por recorrido que la cruza"""
+    if z < ZOOM_MINIMO:
+        return tesela_vacia()
+    lat_min, lat_max, lng_min, lng_max = limites_tesela(z, x, y)
+    borde_lat = (lat_max - lat_min) * BORDE_PIXELES / PIXELES_TESELA
+    borde_lng = (lng_max - lng_min) * BORDE_PIXELES / PIXELES_TESELA
+    caja = (lat_min - borde_lat, lat_max + borde_lat, lng_min - borde_lng, lng_max + borde_lng)
+    tolerancia = tolerancia_para_zoom(z, (lat_min + lat_max) / 2)
+
+    # Recorridos con algún segmento en las celdas de la tesela (con margen de un pixel por la simplificación)
+    candidatos = red.indice.candidatos_caja(*caja, radio_metros=tolerancia)
+
+    features = []
+    for recorrido_id in red.ids.tolist():
+        if recorrido_id not in candidatos:
+            continue
+        arreglo = red.arreglo(recorrido_id)
+        if len(arreglo) > 2:
+            arreglo = arreglo[red.importancia(recorrido_id) > tolerancia]
+        partes = recortar_polilinea(arreglo, *caja)
+        if not partes:
+            continue
+        k = red.posicion[recorrido_id]
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'MultiLineString',
+                # GeoJSON usa [lng, lat]
+                'coordinates': [np.round(parte[:, ::-1], 6).tolist() for parte in partes],
+            },
+            'properties': {
+                **red.info(recorrido_id),
+                'ruta_codigo': red.ruta_codigos[red.recorrido_ruta[k]],
+            },
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
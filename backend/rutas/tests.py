@@ -1,3 +1,901 @@
-from django.test import TestCase
+import io
+import json
+import math
+import os
+import tempfile
 
-# Create your tests here.
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from .models import Empresa, Ruta, Recorrido, Paradero, RecorridoParadero, Transbordo, CambioRed, VersionRed
+from .busqueda import SIN_OPCIONES, buscar_directas
+from .cache_busquedas import CONFIGURACION_POR_DEFECTO, CacheBusquedas
+from .cache_respuestas import CacheRespuestas
+from . import metricas
+from .red import RedRutas, invalidar_red, obtener_red, red_cerca_de
+from .sintetico import CENTRO, EXTENSION_GRADOS, generar_polilinea, generar_red_sintetica, pares_consulta
+from .indice_espacial import IndiceEspacial
+from .teselas import ZOOM_MINIMO, generar_tesela, limites_tesela, recortar_polilinea
+from .utils import (
+    METROS_POR_GRADO, codificar_polilinea, desempaquetar_coordenadas, distancias_acumuladas, empaquetar_coordenadas,
+    importancia_douglas_peucker, proyectar_multiple, simplificar, tramo_entre
+)
+
+
+def linea(inicio, fin, vertices):
+    """Polilínea recta de 'vertices' vértices entre dos puntos [lat, lng]"""
+    return np.linspace(inicio, fin, vertices)
+
+
+def red_dos_rutas():
+    """
+    Red en memoria con dos recorridos en 'L' que comparten un paradero en la esquina:
+    el 1 va hacia el este por lat -16.40 y el 2 hacia el norte por lng -71.53.
+    """
+    recorrido_este = linea([-16.40, -71.56], [-16.40, -71.53], 31)
+    recorrido_norte = linea([-16.40, -71.53], [-16.37, -71.53], 31)
+    paraderos = [
+        (1, 'Inicio este', -16.40, -71.56),
+        (2, 'Medio este', -16.40, -71.545),
+        (3, 'Esquina', -16.40, -71.53),
+        (4, 'Medio norte', -16.385, -71.53),
+        (5, 'Fin norte', -16.37, -71.53),
+    ]
+    # (recorrido, paradero, orden, distancia_recorrido); sin distancia se proyecta al cargar
+    asociaciones = [
+        (1, 1, 1, None), (1, 2, 2, None), (1, 3, 3, None),
+        (2, 3, 1, None), (2, 4, 2, None), (2, 5, 3, None),
+    ]
+    return RedRutas(
+        1,
+        [(1, 'Empresa')],
+        [(1, 'Ruta Este', 'E-1', 1), (2, 'Ruta Norte', 'N-1', 1)],
+        [(1, recorrido_este, 'IDA', '#EF4444', 1), (2, recorrido_norte, 'IDA', '#3B82F6', 2)],
+        paraderos=paraderos,
+        asociaciones=asociaciones,
+    )
+
+
+class PlanificadorTests(SimpleTestCase):
+    """Viajes por rondas sobre la red de paraderos."""
+
+    origen = {'lat': -16.4004, 'lng': -71.5602}
+    destino = {'lat': -16.3698, 'lng': -71.5304}
+
+    def test_viaje_con_un_transbordo(self):
+        viajes = red_dos_rutas().planificador.planificar(self.origen, self.destino, radio_origen=300, radio_destino=300)
+
+        self.assertEqual(len(viajes), 1)
+        viaje = viajes[0]
+        self.assertEqual(viaje['transbordos'], 1)
+        self.assertEqual([tramo['ruta']['id'] for tramo in viaje['rutas']], [1, 2])
+        self.assertEqual([tramo['paradero_subida'] for tramo in viaje['rutas']], ['Inicio este', 'Esquina'])
+        self.assertEqual([tramo['paradero_bajada'] for tramo in viaje['rutas']], ['Esquina', 'Fin norte'])
+        self.assertAlmostEqual(viaje['punto_transbordo']['lat'], -16.40)
+        self.assertAlmostEqual(viaje['punto_transbordo']['lng'], -71.53)
+        # ~3.2 km por bus en cada recorrido
+        self.assertAlmostEqual(viaje['distancia_total'], 6535, delta=50)
+
+    def test_sin_transbordos_no_hay_viaje(self):
+        viajes = red_dos_rutas().planificador.planificar(
+            self.origen, self.destino, max_transbordos=0, radio_origen=300, radio_destino=300
+        )
+        self.assertEqual(viajes, [])
+
+    def test_radios_de_la_vista(self):
+        # Los radios se acotan a [0, máximo]; nan e inf no son radios válidos
+        client = APIClient()
+        url = '/api/rutas/planificar-viaje/'
+        with mock.patch('rutas.views.red_medida', return_value=red_dos_rutas()) as red:
+            planificar = mock.patch.object(red.return_value.planificador, 'planificar', return_value=[])
+            with planificar as llamada:
+                respuesta = client.post(url, {
+                    'punto_a': self.origen, 'punto_b': self.destino,
+                    'radio_origen': -50, 'radio_destino': 10 ** 6, 'radio_transbordo': '200',
+                }, format='json')
+                self.assertEqual(respuesta.status_code, 200)
+                argumentos = llamada.call_args.kwargs
+                self.assertEqual(
+                    (argumentos['radio_origen'], argumentos['radio_destino'], argumentos['radio_transbordo']),
+                    (0, 3000, 200)
+                )
+                for invalido in ('nan', 'inf', '-inf', '1e999'):
+                    with self.subTest(radio=invalido):
+                        respuesta = client.post(url, {
+                            'punto_a': self.origen, 'punto_b': self.destino, 'radio_transbordo': invalido
+                        }, format='json')
+                        self.assertEqual(respuesta.status_code, 400)
+
+
+class ProyeccionTests(SimpleTestCase):
+    """Proyección de puntos sobre los segmentos y tramos entre posiciones fraccionarias."""
+
+    recorrido = linea([-16.40, -71.54], [-16.40, -71.52], 3)  # vértices cada 0.01° de longitud
+
+    def test_proyeccion_sobre_el_segmento(self):
+        datos, = proyectar_multiple([{'lat': -16.399, 'lng': -71.535}], self.recorrido)
+        self.assertAlmostEqual(datos['posicion'], 0.5)
+        np.testing.assert_allclose(datos['coord'], [-16.40, -71.535])
+        self.assertAlmostEqual(datos['distancia'], 111.2, delta=0.5)  # 0.001° de latitud
+
+    def test_segmentos_del_indice(self):
+        # Solo se revisa el segmento 1: la proyección cae en su vértice inicial
+        datos, = proyectar_multiple([{'lat': -16.399, 'lng': -71.535}], self.recorrido, segmentos=[1])
+        self.assertAlmostEqual(datos['posicion'], 1.0)
+        self.assertEqual(datos['indice'], 1)
+
+    def test_tramo_entre_posiciones_proyectadas(self):
+        tramo = tramo_entre(self.recorrido, 0.5, 1.5)
+        np.testing.assert_allclose(tramo, [[-16.40, -71.535], [-16.40, -71.53], [-16.40, -71.525]])
+
+    def test_tramo_dentro_de_un_segmento(self):
+        tramo = tramo_entre(self.recorrido, 0.25, 0.75)
+        np.testing.assert_allclose(tramo, [[-16.40, -71.5375], [-16.40, -71.5325]])
+
+
+def douglas_peucker_recursivo(arreglo, tolerancia):
+    """Douglas-Peucker clásico (recursivo), en el mismo plano local que importancia_douglas_peucker"""
+    lat0 = math.radians(float(arreglo[:, 0].mean()))
+    xy = np.column_stack((arreglo[:, 1] * METROS_POR_GRADO * math.cos(lat0), arreglo[:, 0] * METROS_POR_GRADO))
+
+    def conservados(i, j):
+        if j - i < 2:
+            return []
+        a, ab = xy[i], xy[j] - xy[i]
+        ap = xy[i + 1:j] - a
+        t = np.clip(ap @ ab / float(ab @ ab), 0.0, 1.0)
+        distancias = np.hypot(ap[:, 0] - t * ab[0], ap[:, 1] - t * ab[1])
+        k = i + 1 + int(distancias.argmax())
+        if distancias.max() <= tolerancia:
+            return []
+        return conservados(i, k) + [k] + conservados(k, j)
+
+    return arreglo[[0] + conservados(0, len(arreglo) - 1) + [len(arreglo) - 1]]
+
+
+class GeometriaTests(SimpleTestCase):
+    """Simplificación precalculada y Encoded Polyline."""
+
+    def test_polilinea_vector_de_referencia(self):
+        # Ejemplo de la documentación del algoritmo de Google
+        self.assertEqual(
+            codificar_polilinea([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]),
+            '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+        )
+
+    def test_importancia_igual_a_douglas_peucker_recursivo(self):
+        recorrido = generar_polilinea(np.random.default_rng(7), 400)
+        importancia = importancia_douglas_peucker(recorrido)
+        for tolerancia in (0.5, 2, 5, 10, 25, 100, 1000):
+            with self.subTest(tolerancia=tolerancia):
+                np.testing.assert_array_equal(
+                    simplificar(recorrido, importancia, tolerancia), douglas_peucker_recursivo(recorrido, tolerancia)
+                )
+
+    def test_extremos_siempre_se_conservan(self):
+        recorrido = linea([-16.40, -71.54], [-16.40, -71.52], 10)
+        importancia = importancia_douglas_peucker(recorrido)
+        self.assertTrue(np.isinf(importancia[[0, -1]]).all())
+        np.testing.assert_array_equal(simplificar(recorrido, importancia, 1), recorrido[[0, -1]])
+
+    def test_empaquetado_ida_y_vuelta(self):
+        recorrido = generar_polilinea(np.random.default_rng(9), 300)
+        datos = empaquetar_coordenadas(recorrido)
+        self.assertEqual(len(datos), 300 * 8)
+        # Microgrados: a lo más medio microgrado (~6 cm) de diferencia, y empaquetar lo ya empaquetado no cambia nada
+        desempaquetado = desempaquetar_coordenadas(datos)
+        np.testing.assert_allclose(desempaquetado, recorrido, rtol=0, atol=0.5e-6 + 1e-12)
+        self.assertEqual(empaquetar_coordenadas(desempaquetado), datos)
+        self.assertEqual(empaquetar_coordenadas(recorrido.tolist()), datos)
+
+    def test_empaquetado_de_un_recorrido_vacio(self):
+        for vacio in ([], np.empty((0, 2))):
+            with self.subTest(vacio=vacio):
+                self.assertEqual(empaquetar_coordenadas(vacio), b'')
+        for datos in (b'', None):
+            with self.subTest(datos=datos):
+                self.assertEqual(desempaquetar_coordenadas(datos).shape, (0, 2))
+
+
+class MigracionCoordenadasTests(TransactionTestCase):
+    """0007 pasa las coordenadas JSON de los recorridos al formato empaquetado (y de vuelta)."""
+
+    antes = [('rutas', '0006_recorrido_hash_kml')]
+    despues = [('rutas', '0007_recorrido_coordenadas_empaquetadas')]
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(destino)
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        self.migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_coordenadas_json_a_empaquetadas(self):
+        apps = self.migrar(self.antes)
+        coordenadas = [[-16.4024, -71.55], [-16.40245, -71.5375], [-16.4024, -71.525]]
+        empresa = apps.get_model('rutas', 'Empresa').objects.create(nombre='Empresa')
+        ruta = apps.get_model('rutas', 'Ruta').objects.create(empresa=empresa, nombre='Ruta', codigo='R-1')
+        Recorrido = apps.get_model('rutas', 'Recorrido')
+        recorrido = Recorrido.objects.create(ruta=ruta, sentido='IDA', coordenadas=coordenadas)
+        vacio = Recorrido.objects.create(ruta=ruta, sentido='VUELTA', coordenadas=[])
+
+        apps = self.migrar(self.despues)
+        Recorrido = apps.get_model('rutas', 'Recorrido')
+        datos = bytes(Recorrido.objects.get(pk=recorrido.pk).coordenadas_empaquetadas)
+        self.assertEqual(datos, empaquetar_coordenadas(coordenadas))
+        np.testing.assert_allclose(desempaquetar_coordenadas(datos), coordenadas, atol=1e-6)
+        self.assertEqual(bytes(Recorrido.objects.get(pk=vacio.pk).coordenadas_empaquetadas), b'')
+
+        # Y de vuelta a JSON al revertir la migración
+        Recorrido = self.migrar(self.antes).get_model('rutas', 'Recorrido')
+        np.testing.assert_allclose(Recorrido.objects.get(pk=recorrido.pk).coordenadas, coordenadas, atol=1e-6)
+        self.assertEqual(Recorrido.objects.get(pk=vacio.pk).coordenadas, [])
+
+
+class RecorridoJsonTests(TestCase):
+    """La chainage de recorrido_json va alineada con la geometría (simplificada o no)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(nombre='Empresa')
+        ruta = Ruta.objects.create(empresa=empresa, nombre='Ruta', codigo='R-1')
+        cls.recorrido = Recorrido.objects.create(
+            ruta=ruta, sentido='IDA', coordenadas=generar_polilinea(np.random.default_rng(3), 300)
+        )
+
+    def setUp(self):
+        invalidar_red()
+        self.client = APIClient()
+
+    def test_distancias_acumuladas_simplificadas(self):
+        url = f'/api/rutas/recorrido/{self.recorrido.id}/json/'
+        completo = self.client.get(url).json()
+        simplificado = self.client.get(url, {'tolerancia': 20}).json()
+
+        self.assertEqual(len(completo['distancias_acumuladas']), 300)
+        self.assertLess(len(simplificado['coordenadas']), 300)
+        self.assertEqual(len(simplificado['distancias_acumuladas']), len(simplificado['coordenadas']))
+        # Las distancias son las de la línea completa en los vértices que se conservan
+        self.assertEqual(simplificado['distancias_acumuladas'][-1], completo['distancias_acumuladas'][-1])
+        self.assertTrue(set(simplificado['distancias_acumuladas']) <= set(completo['distancias_acumuladas']))
+
+
+class BuscarRutasLoteTests(TestCase):
+    """El comando buscar_rutas_lote da, en orden, lo mismo que buscar_directas para cada par."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generar_red_sintetica(recorridos=6, vertices=200, semilla=1)
+
+    def setUp(self):
+        invalidar_red()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+
+    def buscar_lote(self, lineas, *argumentos):
+        entrada = os.path.join(self.directorio.name, 'pares.txt')
+        salida = os.path.join(self.directorio.name, 'resultados.ndjson')
+        with open(entrada, 'w', encoding='utf-8') as archivo:
+            archivo.write('\n'.join(lineas) + '\n')
+        call_command('buscar_rutas_lote', entrada, '--salida', salida, *argumentos, stderr=io.StringIO())
+        with open(salida, encoding='utf-8') as archivo:
+            return [json.loads(linea) for linea in archivo]
+
+    def test_resultados_en_orden(self):
+        red = obtener_red()
+        pares = pares_consulta(red, 8, semilla=2)
+        lineas = [json.dumps({'id': f'par-{k}', 'punto_a': a, 'punto_b': b}) for k, (a, b) in enumerate(pares)]
+        # Una línea CSV y un comentario en medio
+        a, b = pares[0]
+        lineas[3:3] = ['# comentario', f"{a['lat']},{a['lng']},{b['lat']},{b['lng']}"]
+
+        for procesos in ('1', '2'):
+            with self.subTest(procesos=procesos):
+                resultados = self.buscar_lote(lineas, '--procesos', procesos)
+                self.assertTrue(any(r['rutas_directas'] for r in resultados))
+                self.assertEqual([r['indice'] for r in resultados], list(range(9)))
+                self.assertNotIn('id', resultados[3])
+                self.assertEqual(resultados[3]['rutas_directas'], resultados[0]['rutas_directas'])
+                for resultado, (a, b) in zip(resultados[:3] + resultados[4:], pares):
+                    self.assertEqual(
+                        resultado['rutas_directas'], json.loads(json.dumps(buscar_directas(red, a, b, SIN_OPCIONES)))
+                    )
+
+
+class RedSinteticaTests(TestCase):
+    """El generador de redes del benchmark es determinista y se queda dentro de su zona."""
+
+    def test_misma_semilla_misma_polilinea(self):
+        primera = generar_polilinea(np.random.default_rng(5), 500)
+        np.testing.assert_array_equal(primera, generar_polilinea(np.random.default_rng(5), 500))
+        self.assertFalse(np.array_equal(primera, generar_polilinea(np.random.default_rng(6), 500)))
+
+        centro = np.array(CENTRO)
+        self.assertTrue((np.abs(primera - centro) <= EXTENSION_GRADOS / 2 + 1e-6).all())
+
+    def test_red_en_la_base_de_datos(self):
+        cantidades = generar_red_sintetica(recorridos=4, vertices=100, semilla=3, cada_paradero=25)
+        self.assertEqual(cantidades, {'empresas': 1, 'rutas': 2, 'recorridos': 4, 'paraderos': 16})
+
+        invalidar_red()
+        red = obtener_red()
+        self.assertEqual(len(red), 4)
+        # La VUELTA es la IDA al revés, desplazada a un carril vecino
+        ida, vuelta = red.arreglo(int(red.ids[0])), red.arreglo(int(red.ids[1]))
+        np.testing.assert_allclose(vuelta[::-1], ida, atol=1e-4)
+        self.assertEqual(pares_consulta(red, 5, semilla=1), pares_consulta(red, 5, semilla=1))
+
+
+class RedProcesoTests(TestCase):
+    """La red en memoria del proceso sigue a la versión de la base de datos; la primera búsqueda usa una parcial."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Los cambios de la red se registran al confirmar: se confirman aquí y no en la transacción de la clase
+        with cls.captureOnCommitCallbacks(execute=True):
+            empresa = Empresa.objects.create(nombre='Empresa')
+            ruta = Ruta.objects.create(empresa=empresa, nombre='Ruta', codigo='R-1')
+            cls.recorrido = Recorrido.objects.create(
+                ruta=ruta, sentido='IDA', coordenadas=linea([-16.40, -71.54], [-16.40, -71.52], 5)
+            )
+            # ~5.5 km al norte
+            cls.lejano = Recorrido.objects.create(
+                ruta=ruta, sentido='VUELTA', coordenadas=linea([-16.35, -71.52], [-16.35, -71.54], 5)
+            )
+
+    def setUp(self):
+        invalidar_red()
+
+    def test_cerca_de_filtra_por_la_caja(self):
+        # A y B a ~220 m al sur de la línea: dentro de la caja ampliada en 300 m, fuera con 100 m
+        a, b = {'lat': -16.402, 'lng': -71.538}, {'lat': -16.402, 'lng': -71.522}
+        self.assertEqual(list(Recorrido.cerca_de(a, b, 300).values_list('id', flat=True)), [self.recorrido.id])
+        self.assertFalse(Recorrido.cerca_de(a, b, 100).exists())
+        # B más allá del extremo este: la caja tampoco lo contiene
+        self.assertFalse(Recorrido.cerca_de(a, {'lat': -16.40, 'lng': -71.51}, 300).exists())
+        # Uno en cada recorrido: ninguna caja contiene a los dos
+        self.assertFalse(Recorrido.cerca_de(a, {'lat': -16.35, 'lng': -71.53}, 300).exists())
+
+    def test_red_cerca_de_parcial_y_despues_completa(self):
+        a, b = {'lat': -16.4005, 'lng': -71.538}, {'lat': -16.4005, 'lng': -71.522}
+        red, completa = red_cerca_de(a, b, 300)
+        self.assertFalse(completa)
+        self.assertEqual(red.ids.tolist(), [self.recorrido.id])
+
+        # La siguiente petición de la misma versión ya carga (y guarda) la red completa
+        red, completa = red_cerca_de(a, b, 300)
+        self.assertTrue(completa)
+        self.assertEqual(sorted(red.ids.tolist()), sorted([self.recorrido.id, self.lejano.id]))
+        self.assertIs(obtener_red(), red)
+        self.assertEqual(red_cerca_de(a, b, 300), (red, True))
+
+        # Con una versión nueva, otra vez parcial la primera vez
+        invalidar_red()
+        self.assertFalse(red_cerca_de(a, b, 300)[1])
+
+    def test_recarga_despues_de_modificar_un_recorrido(self):
+        antes = obtener_red()
+        self.assertIs(obtener_red(), antes)
+
+        nueva = linea([-16.41, -71.54], [-16.39, -71.52], 7)
+        recorrido = Recorrido.objects.get(pk=self.recorrido.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            recorrido.coordenadas = nueva
+            recorrido.save()
+
+        red = obtener_red()
+        self.assertIsNot(red, antes)
+        self.assertEqual(red.version, VersionRed.actual())
+        np.testing.assert_allclose(red.arreglo(self.recorrido.id), nueva, atol=1e-6)
+
+
+class TeselasTests(SimpleTestCase):
+    """Recorte de polilíneas a la caja de la tesela y candidatos del índice."""
+
+    def test_recorte_a_la_caja(self):
+        partes = recortar_polilinea(np.array([[0.0, -2.0], [0.0, 2.0]]), -1, 1, -1, 1)
+        self.assertEqual(len(partes), 1)
+        np.testing.assert_allclose(partes[0], [[0, -1], [0, 1]])
+
+    def test_linea_que_sale_y_vuelve_a_entrar(self):
+        arreglo = np.array([[0.0, 0.0], [0.0, 2.0], [0.5, 2.0], [0.5, 0.0]])
+        partes = recortar_polilinea(arreglo, -1, 1, -1, 1)
+        self.assertEqual(len(partes), 2)
+        np.testing.assert_allclose(partes[0], [[0, 0], [0, 1]])
+        np.testing.assert_allclose(partes[1], [[0.5, 1], [0.5, 0]])
+
+    def test_linea_fuera_de_la_caja(self):
+        self.assertEqual(recortar_polilinea(np.array([[2.0, 2.0], [3.0, 3.0]]), -1, 1, -1, 1), [])
+
+    def test_candidatos_de_una_caja_enorme(self):
+        indice = IndiceEspacial()
+        indice.agregar_recorrido(1, linea([-16.40, -71.56], [-16.40, -71.53], 31))
+        # Recorre solo las celdas ocupadas: el mundo entero cuesta lo mismo que la ciudad
+        self.assertEqual(set(indice.candidatos_caja(-85, 85, -180, 180, radio_metros=1000)), {1})
+        self.assertEqual(indice.candidatos_caja(0, 1, 0, 1), {})
+
+    def test_tesela_con_el_recorrido_recortado(self):
+        red = red_dos_rutas()
+        # Tesela de zoom 14 que contiene la esquina de las dos rutas
+        z = 14
+        n = 2 ** z
+        x = int((-71.53 + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(-16.40))) / math.pi) / 2 * n)
+        lat_min, lat_max, lng_min, lng_max = limites_tesela(z, x, y)
+
+        tesela = generar_tesela(red, z, x, y)
+        self.assertEqual(sorted(f['properties']['id'] for f in tesela['features']), [1, 2])
+        for feature in tesela['features']:
+            for parte in feature['geometry']['coordinates']:
+                lngs, lats = np.array(parte).T
+                # Dentro de la tesela más el borde de 8 pixeles
+                self.assertTrue((lats >= lat_min - (lat_max - lat_min) / 32).all())
+                self.assertTrue((lngs <= lng_max + (lng_max - lng_min) / 32).all())
+
+        self.assertEqual(generar_tesela(red, ZOOM_MINIMO - 1, 0, 0)['features'], [])
+
+
+class CambiosRedTests(TestCase):
+    """red/cambios/ envía solo lo modificado desde la versión del cliente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.empresa = Empresa.objects.create(nombre='Empresa')
+            cls.ruta = Ruta.objects.create(empresa=cls.empresa, nombre='Ruta', codigo='R-1')
+            ida = linea([-16.40, -71.54], [-16.40, -71.52], 5)
+            cls.ida = Recorrido.objects.create(ruta=cls.ruta, sentido='IDA', coordenadas=ida)
+            cls.vuelta = Recorrido.objects.create(ruta=cls.ruta, sentido='VUELTA', coordenadas=ida[::-1])
+
+    def setUp(self):
+        invalidar_red()
+        self.client = APIClient()
+
+    def cambios(self, desde):
+        return self.client.get('/api/rutas/red/cambios/', {'desde': desde})
+
+    def test_cambios_despues_de_guardar(self):
+        desde = VersionRed.actual()
+        # La versión sube al confirmar la transacción (TestCase nunca confirma: se ejecutan los callbacks)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ida.color_linea = '#000000'
+            self.ida.save()
+            Recorrido.objects.get(pk=self.vuelta.pk).delete()
+
+        datos = self.cambios(desde).json()
+        self.assertFalse(datos['completa'])
+        self.assertEqual(datos['version'], VersionRed.actual())
+        self.assertEqual([r['id'] for r in datos['recorridos']], [self.ida.id])
+        self.assertEqual(datos['recorridos'][0]['color_linea'], '#000000')
+        self.assertEqual(datos['eliminados']['recorridos'], [self.vuelta.id])
+        self.assertEqual(datos['empresas'], [])
+
+    def test_cada_version_tiene_sus_cambios(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ida.save()
+        version = VersionRed.actual()
+        self.assertTrue(CambioRed.objects.filter(version=version, modelo='recorrido', objeto_id=self.ida.id).exists())
+
+    def test_sin_cambios(self):
+        datos = self.cambios(VersionRed.actual()).json()
+        self.assertFalse(datos['completa'])
+        self.assertEqual(datos['recorridos'], [])
+
+    def test_version_podada_devuelve_la_red_completa(self):
+        desde = VersionRed.actual()
+        with mock.patch.object(CambioRed, 'RETENCION_VERSIONES', 2):
+            for _ in range(4):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.empresa.save()
+        self.assertEqual(CambioRed.objects.filter(version__lte=VersionRed.actual() - 2).count(), 0)
+
+        datos = self.cambios(desde).json()
+        self.assertTrue(datos['completa'])
+        self.assertEqual(len(datos['recorridos']), 2)
+        self.assertFalse(self.cambios(VersionRed.actual() - 1).json()['completa'])
+
+    def test_borrado_en_cascada_es_una_sola_version(self):
+        # Borrar la ruta borra sus recorridos (y sus paraderos asociados): una versión para todo
+        desde = VersionRed.actual()
+        ruta_id = self.ruta.id
+        with self.captureOnCommitCallbacks(execute=True):
+            Ruta.objects.get(pk=ruta_id).delete()
+        self.assertEqual(VersionRed.actual(), desde + 1)
+        self.assertEqual(
+            set(CambioRed.objects.filter(version=desde + 1).values_list('modelo', 'objeto_id')),
+            {('ruta', ruta_id), ('recorrido', self.ida.id), ('recorrido', self.vuelta.id)}
+        )
+
+    def test_transaccion_deshecha_no_sube_la_version(self):
+        desde = VersionRed.actual()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.ida.save()
+                raise RuntimeError
+            self.vuelta.save()
+        self.assertEqual(VersionRed.actual(), desde + 1)
+        self.assertEqual(
+            list(CambioRed.objects.filter(version=desde + 1).values_list('objeto_id', flat=True)), [self.vuelta.id]
+        )
+
+    def test_version_fuera_de_rango(self):
+        self.assertEqual(self.cambios(VersionRed.actual() + 1).status_code, 400)
+        self.assertEqual(self.cambios('x').status_code, 400)
+
+
+class CacheBusquedasTests(SimpleTestCase):
+    """La caché de búsquedas calcula con los puntos pedidos (redondeados), no con un punto vecino."""
+
+    destino = {'lat': -16.4003, 'lng': -71.5352}
+
+    def setUp(self):
+        self.red = red_dos_rutas()
+        self.cache = CacheBusquedas(capacidad=10, ttl=60, decimales=CONFIGURACION_POR_DEFECTO['DECIMALES'])
+
+    def buscar(self, origen):
+        return self.cache.buscar('directas', self.red, origen, self.destino, SIN_OPCIONES, buscar_directas)
+
+    def test_distancias_de_los_puntos_redondeados(self):
+        # Dos orígenes a ~200 m entre sí: cada uno con la distancia de su propio punto redondeado
+        for lat in (-16.4010, -16.4028):
+            with self.subTest(lat=lat):
+                origen = {'lat': lat, 'lng': -71.5551}
+                resultado, = self.buscar(origen)
+                esperado, = buscar_directas(self.red, self.cache.ajustar(origen), self.cache.ajustar(self.destino))
+                self.assertEqual(resultado['distancia_a_origen'], esperado['distancia_a_origen'])
+                self.assertEqual(resultado['distancia_a_destino'], esperado['distancia_a_destino'])
+        self.assertEqual(self.cache.fallos, 2)
+
+    def test_puntos_cercanos_comparten_entrada(self):
+        # ~20 m entre sí: la misma entrada; ~200 m: entradas distintas
+        primero = self.buscar({'lat': -16.4012, 'lng': -71.5551})
+        self.assertIs(self.buscar({'lat': -16.4014, 'lng': -71.5552}), primero)
+        self.assertEqual((self.cache.aciertos, self.cache.fallos), (1, 1))
+        self.buscar({'lat': -16.4030, 'lng': -71.5551})
+        self.assertEqual((self.cache.aciertos, self.cache.fallos), (1, 2))
+
+    def test_cambio_de_version_descarta_las_entradas(self):
+        origen = {'lat': -16.4010, 'lng': -71.5551}
+        self.buscar(origen)
+        self.red.version += 1
+        self.buscar(origen)
+        self.assertEqual((self.cache.aciertos, self.cache.fallos), (0, 2))
+
+
+class CacheRespuestasTests(SimpleTestCase):
+    """Desalojo LRU y descarte por versión de la caché de respuestas (los mismos de la de búsquedas)."""
+
+    def test_lru_y_version(self):
+        cache = CacheRespuestas(capacidad=2)
+        for clave in ('a', 'b'):
+            cache.obtener(clave, 1, lambda: clave.encode())
+        cache.obtener('a', 1, lambda: b'otra')  # 'a' pasa a ser la más reciente
+        cache.obtener('c', 1, lambda: b'c')     # y se desaloja 'b'
+        self.assertEqual(cache.obtener('a', 1, lambda: b'otra'), b'a')
+        self.assertEqual(cache.obtener('b', 1, lambda: b'nueva'), b'nueva')
+        self.assertEqual(cache.estadisticas()['desalojados'], 2)
+        self.assertEqual(cache.obtener('a', 2, lambda: b'version 2'), b'version 2')
+        self.assertEqual(cache.estadisticas()['entradas'], 1)
+
+    def test_limite_de_bytes(self):
+        cache = CacheRespuestas(capacidad=100, bytes_maximos=10)
+        for clave in 'abc':
+            cache.obtener(clave, 1, lambda: b'1234')
+        # 12 bytes no caben en 10: se desaloja la menos usada
+        estadisticas = cache.estadisticas()
+        self.assertEqual((estadisticas['entradas'], estadisticas['bytes'], estadisticas['desalojados']), (2, 8, 1))
+        self.assertEqual(cache.obtener('a', 1, lambda: b'nueva'), b'nueva')
+        # Una respuesta más grande que el límite no se guarda
+        cache.obtener('grande', 1, lambda: b'x' * 11)
+        self.assertEqual(cache.estadisticas()['bytes'], 0)
+
+    def test_expiracion_de_busquedas(self):
+        cache = CacheBusquedas(capacidad=10, ttl=60, decimales=4)
+        with mock.patch('rutas.cache_versionada.time.monotonic', return_value=0):
+            cache.obtener('clave', 1, lambda: 'primero')
+        with mock.patch('rutas.cache_versionada.time.monotonic', return_value=61):
+            self.assertEqual(cache.obtener('clave', 1, lambda: 'segundo'), 'segundo')
+        self.assertEqual(cache.expirados, 1)
+
+
+class DiagnosticoTests(TestCase):
+    """Las métricas y las estadísticas de la caché son solo para staff; reiniciar las métricas es un POST."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username='usuario')
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        metricas.reiniciar()
+        metricas.registrar('prueba', metricas.Cronometro(), 0.01)
+        self.addCleanup(metricas.reiniciar)
+
+    def test_solo_staff(self):
+        for url in ('/api/rutas/metricas/', '/api/rutas/estadisticas-cache/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 401)
+                self.client.force_authenticate(self.usuario)
+                self.assertEqual(self.client.get(url).status_code, 403)
+                self.client.force_authenticate(self.staff)
+                self.assertEqual(self.client.get(url).status_code, 200)
+                self.client.force_authenticate(None)
+
+    def test_reiniciar_con_post(self):
+        self.assertEqual(self.client.post('/api/rutas/metricas/').status_code, 401)
+        self.assertIn('prueba', metricas.resumen())
+
+        self.client.force_authenticate(self.staff)
+        self.client.get('/api/rutas/metricas/', {'reiniciar': '1'})
+        self.assertIn('prueba', metricas.resumen())
+
+        respuesta = self.client.post('/api/rutas/metricas/')
+        self.assertIn('prueba', respuesta.data)
+        self.assertEqual(metricas.resumen(), {})
+
+
+class RespuestasCondicionalesTests(TestCase):
+    """Vistas con ETag de la red (ruta, recorrido, teselas, cambios) con If-None-Match / If-Modified-Since."""
+
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(nombre='Empresa')
+        cls.ruta = Ruta.objects.create(empresa=empresa, nombre='Ruta', codigo='R-1')
+        cls.recorrido = Recorrido.objects.create(
+            ruta=cls.ruta, sentido='IDA', coordenadas=linea([-16.40, -71.54], [-16.40, -71.52], 5)
+        )
+
+    def setUp(self):
+        invalidar_red()
+        self.client = APIClient()
+
+    def test_no_modificado(self):
+        for url in (f'/api/rutas/recorrido/{self.recorrido.id}/json/', f'/api/rutas/ruta/{self.ruta.id}/json/'):
+            with self.subTest(url=url):
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304
+                )
+
+    def test_objeto_inexistente_es_404_aunque_coincida_la_version(self):
+        url = f'/api/rutas/recorrido/{self.recorrido.id}/json/'
+        respuesta = self.client.get(url)
+        inexistente = url.replace(str(self.recorrido.id), str(self.recorrido.id + 100))
+
+        self.assertEqual(self.client.get(inexistente, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 404)
+        self.assertEqual(self.client.get(inexistente, HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.assertEqual(
+            self.client.get(inexistente, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 404
+        )
+
+    def test_tesela_invalida_es_404_aunque_coincida_la_version(self):
+        etag = self.client.get('/api/rutas/teselas/14/100/200.geojson')['ETag']
+        fuera = '/api/rutas/teselas/14/16384/200.geojson'
+        self.assertEqual(self.client.get(fuera, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+        self.assertEqual(self.client.get(fuera, HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    def test_cambios_con_desde_invalido_es_400_aunque_coincida_la_version(self):
+        version = VersionRed.actual()
+        respuesta = self.client.get('/api/rutas/red/cambios/', {'desde': version})
+        self.assertEqual(respuesta.status_code, 200)
+        for desde in ('x', version + 1, -1):
+            with self.subTest(desde=desde):
+                self.assertEqual(self.client.get(
+                    '/api/rutas/red/cambios/', {'desde': desde}, HTTP_IF_NONE_MATCH=respuesta['ETag']
+                ).status_code, 400)
+                self.assertEqual(self.client.get(
+                    '/api/rutas/red/cambios/', {'desde': desde}, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']
+                ).status_code, 400)
+
+    def test_etag_distinto_por_objeto(self):
+        otro = Recorrido.objects.create(
+            ruta=self.ruta, sentido='VUELTA', coordenadas=self.recorrido.coordenadas[::-1]
+        )
+        etag = self.client.get(f'/api/rutas/recorrido/{self.recorrido.id}/json/')['ETag']
+        respuesta = self.client.get(f'/api/rutas/recorrido/{otro.id}/json/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class CargarKmlTests(TestCase):
+    """Una importación con cargar_kml sube la versión de la red una sola vez, con todos sus cambios."""
+
+    def setUp(self):
+        invalidar_red()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.carpeta = directorio.name
+        # IDA y VUELTA por la misma calle, pasando por el paradero 'Mercado San Camilo'
+        self.ida = linea([-16.4024, -71.5500], [-16.4024, -71.5250], 60)
+        self.escribir('IDA - LINEA 1', self.ida)
+        self.escribir('VUELTA - LINEA 1', self.ida[::-1])
+
+    def escribir(self, nombre, coordenadas):
+        texto = ' '.join(f'{lng},{lat},0' for lat, lng in coordenadas.tolist())
+        with open(os.path.join(self.carpeta, f'{nombre}.kml'), 'w', encoding='utf-8') as archivo:
+            archivo.write(
+                '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark><LineString>'
+                f'<coordinates>{texto}</coordinates></LineString></Placemark></Document></kml>'
+            )
+
+    def cargar(self, *argumentos):
+        salida = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('cargar_kml', 'Empresa', self.carpeta, *argumentos, stdout=salida)
+        return salida.getvalue()
+
+    def test_una_sola_version_por_importacion(self):
+        antes = VersionRed.actual()
+        self.cargar()
+        version = VersionRed.actual()
+        self.assertEqual(version, antes + 1)
+
+        cambios = {}
+        for modelo, objeto_id in CambioRed.objects.filter(version=version).values_list('modelo', 'objeto_id'):
+            cambios.setdefault(modelo, set()).add(objeto_id)
+        self.assertEqual(cambios['recorrido'], set(Recorrido.objects.values_list('id', flat=True)))
+        self.assertEqual(cambios['ruta'], set(Ruta.objects.values_list('id', flat=True)))
+        self.assertEqual(cambios['paradero'], set(Paradero.objects.values_list('id', flat=True)))
+        self.assertEqual(cambios['empresa'], set(Empresa.objects.values_list('id', flat=True)))
+        self.assertEqual(Recorrido.objects.count(), 2)
+        self.assertTrue(Transbordo.objects.exists())
+
+        # Sin cambios en los archivos no hay versión nueva
+        self.cargar()
+        self.assertEqual(VersionRed.actual(), version)
+
+    def filas(self):
+        """Filas que deja la importación, identificadas por su contenido y no por sus ids"""
+        recorrido = lambda prefijo: (f'{prefijo}ruta__codigo', f'{prefijo}sentido')
+        return {
+            'rutas': sorted(Ruta.objects.values_list('empresa__nombre', 'codigo', 'nombre')),
+            'recorridos': sorted(
+                (codigo, sentido, bytes(empaquetadas), *resto)
+                for codigo, sentido, empaquetadas, *resto in Recorrido.objects.values_list(
+                    *recorrido(''), 'coordenadas_empaquetadas', 'importancia_vertices',
+                    'archivo_kml', 'hash_kml', 'lat_min', 'lat_max', 'lng_min', 'lng_max'
+                ).order_by()
+            ),
+            'paraderos': sorted(Paradero.objects.values_list('nombre', 'latitud', 'longitud', 'es_popular')),
+            'asociaciones': sorted(RecorridoParadero.objects.values_list(
+                *recorrido('recorrido__'), 'paradero__nombre', 'orden', 'distancia_metros', 'distancia_recorrido'
+            )),
+            'transbordos': sorted(Transbordo.objects.values_list(
+                *recorrido('recorrido_origen__'), *recorrido('recorrido_destino__'),
+                'indice_origen', 'indice_destino', 'distancia_metros'
+            )),
+        }
+
+    def test_paralelo_y_secuencial_dejan_las_mismas_filas(self):
+        resultados = []
+        for argumentos in ((), ('--paralelo', '--procesos', '2')):
+            with transaction.atomic():
+                self.cargar(*argumentos)
+                resultados.append(self.filas())
+                transaction.set_rollback(True)
+        secuencial, paralelo = resultados
+        self.assertEqual(len(secuencial['recorridos']), 2)
+        self.assertTrue(secuencial['asociaciones'])
+        self.assertTrue(secuencial['transbordos'])
+        self.assertEqual(paralelo, secuencial)
+
+    def test_orden_de_los_paraderos_a_lo_largo_del_recorrido(self):
+        # La VUELTA recorre la misma calle al revés: pasa por los paraderos en el orden inverso
+        for argumentos in ((), ('--paralelo', '--procesos', '2')):
+            with self.subTest(argumentos=argumentos), transaction.atomic():
+                self.cargar(*argumentos)
+                longitud = distancias_acumuladas(Recorrido.objects.get(sentido='IDA').coordenadas)[-1]
+                paradas = {}
+                for sentido, nombre, orden, distancia in RecorridoParadero.objects.order_by('orden').values_list(
+                    'recorrido__sentido', 'paradero__nombre', 'orden', 'distancia_recorrido'
+                ):
+                    paradas.setdefault(sentido, []).append((nombre, orden, distancia))
+
+                self.assertEqual([p[0] for p in paradas['IDA']], ['Mercado San Camilo', 'UNSA Ingeniería'])
+                self.assertEqual([p[0] for p in paradas['VUELTA']], ['UNSA Ingeniería', 'Mercado San Camilo'])
+                for sentido, filas in paradas.items():
+                    self.assertEqual([p[1] for p in filas], [1, 2])
+                    self.assertLess(filas[0][2], filas[1][2])
+                # La distancia desde el inicio de la IDA más la de la VUELTA es el largo de la calle
+                vuelta = {nombre: distancia for nombre, _, distancia in paradas['VUELTA']}
+                for nombre, _, distancia in paradas['IDA']:
+                    self.assertAlmostEqual(distancia + vuelta[nombre], longitud, delta=1)
+                transaction.set_rollback(True)
+
+    def test_kml_modificado_actualiza_el_mismo_recorrido(self):
+        nueva = linea([-16.4026, -71.5500], [-16.4026, -71.5200], 80)
+        for argumentos in ((), ('--paralelo', '--procesos', '2')):
+            with self.subTest(argumentos=argumentos), transaction.atomic():
+                self.cargar(*argumentos)
+                ids = dict(Recorrido.objects.values_list('sentido', 'id'))
+                vuelta = bytes(Recorrido.objects.get(sentido='VUELTA').coordenadas_empaquetadas)
+
+                self.escribir('IDA - LINEA 1', nueva)
+                salida = self.cargar(*argumentos)
+                self.assertIn('0 recorridos creados, 1 actualizados', salida)
+                self.assertEqual(dict(Recorrido.objects.values_list('sentido', 'id')), ids)
+                self.assertEqual(Ruta.objects.count(), 1)
+                np.testing.assert_allclose(Recorrido.objects.get(pk=ids['IDA']).coordenadas, nueva, atol=1e-6)
+                self.assertEqual(bytes(Recorrido.objects.get(pk=ids['VUELTA']).coordenadas_empaquetadas), vuelta)
+                # Paraderos asociados una sola vez, transbordos iguales a un cálculo desde cero
+                self.assertEqual(RecorridoParadero.objects.filter(recorrido_id=ids['IDA']).count(), 2)
+                campos = ('recorrido_origen_id', 'recorrido_destino_id', 'indice_origen', 'indice_destino')
+                transbordos = sorted(Transbordo.objects.values_list(*campos))
+                self.assertTrue(any(origen == ids['IDA'] for origen, *_ in transbordos))
+                call_command('calcular_transbordos', stdout=io.StringIO())
+                self.assertEqual(transbordos, sorted(Transbordo.objects.values_list(*campos)))
+                transaction.set_rollback(True)
+            self.escribir('IDA - LINEA 1', self.ida)
+
+    def test_kml_sin_cambios_se_omite(self):
+        for argumentos in ((), ('--paralelo', '--procesos', '2')):
+            with self.subTest(argumentos=argumentos), transaction.atomic():
+                self.cargar(*argumentos)
+                ids = set(Recorrido.objects.values_list('id', flat=True))
+                version = VersionRed.actual()
+                with mock.patch('rutas.management.commands.cargar_kml.Recorrido.save') as guardar:
+                    salida = self.cargar(*argumentos)
+                guardar.assert_not_called()
+                self.assertIn('0 recorridos creados, 0 actualizados', salida)
+                self.assertEqual(VersionRed.actual(), version)
+                self.assertEqual(set(Recorrido.objects.values_list('id', flat=True)), ids)
+
+                # Con --forzar se vuelven a procesar, en el lugar
+                salida = self.cargar(*argumentos, '--forzar')
+                self.assertIn('0 recorridos creados, 2 actualizados', salida)
+                self.assertEqual(set(Recorrido.objects.values_list('id', flat=True)), ids)
+                transaction.set_rollback(True)
+
+    def test_procesos_usados_en_paralelo(self):
+        salida = self.cargar('--paralelo', '--procesos', '8')
+        self.assertIn('Lectura de 2 archivos con 2 procesos', salida)
+        self.assertEqual(Recorrido.objects.count(), 2)
+
+
+class TransbordosTests(TestCase):
+    """Los transbordos guardados nunca apuntan fuera de la geometría actual de sus recorridos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(nombre='Empresa')
+        ruta = Ruta.objects.create(empresa=empresa, nombre='Ruta', codigo='R-1')
+        ida = linea([-16.40, -71.54], [-16.40, -71.52], 20)
+        cls.ida = Recorrido.objects.create(ruta=ruta, sentido='IDA', coordenadas=ida)
+        cls.vuelta = Recorrido.objects.create(ruta=ruta, sentido='VUELTA', coordenadas=ida[::-1])
+
+    def test_indices_fuera_de_rango_se_descartan(self):
+        # 31 vértices por recorrido: índices válidos de 0 a 30
+        red = RedRutas(
+            1, [(1, 'Empresa')], [(1, 'Ruta', 'R-1', 1)],
+            [
+                (1, linea([-16.40, -71.56], [-16.40, -71.53], 31), 'IDA', '#EF4444', 1),
+                (2, linea([-16.40, -71.53], [-16.40, -71.56], 31), 'VUELTA', '#3B82F6', 1),
+            ],
+            transbordos=[(1, 2, 30, 0, 5.0), (1, 2, 31, 0, 5.0), (2, 1, 0, 99, 5.0)]
+        )
+        self.assertEqual(red.transbordos, {1: [(2, 30, 0, 5.0)]})
+
+    def test_cambiar_la_geometria_descarta_sus_transbordos(self):
+        call_command('calcular_transbordos', verbosity=0)
+        self.assertTrue(Transbordo.objects.filter(recorrido_origen=self.ida).exists())
+
+        recorrido = Recorrido.objects.get(pk=self.ida.pk)
+        recorrido.color_linea = '#000000'
+        recorrido.save()
+        self.assertTrue(Transbordo.objects.filter(recorrido_origen=self.ida).exists())
+
+        recorrido.coordenadas = recorrido.coordenadas[:5]
+        recorrido.save()
+        self.assertFalse(Transbordo.objects.filter(recorrido_origen=self.ida).exists())
+        self.assertFalse(Transbordo.objects.filter(recorrido_destino=self.ida).exists())
@@ -10,7 +10,13 @@ urlpatterns = [
     path('empresas/<int:empresa_id>/rutas/', views.empresa_rutas, name='empresa_rutas'), #TODAS LAS RUTAS DE UNA EMPRESA
     path('ruta/<int:ruta_id>/json/', views.ruta_json, name='ruta_json'), # RECORRIDO IDA Y VUELTA
     path('recorrido/<int:recorrido_id>/json/', views.recorrido_json, name='recorrido_json'), #SOLO UN RECORRIDO
+    path('teselas/<int:z>/<int:x>/<int:y>.geojson', views.tesela_view, name='tesela'), # RED COMPLETA POR TESELAS (MAPA)
+    path('red/instantanea/', views.red_instantanea_view, name='red_instantanea'), # RED COMPLETA VERSIONADA (GZIP)
+    path('red/cambios/', views.red_cambios_view, name='red_cambios'), # CAMBIOS DESDE ?desde=VERSION
     #Algoritmo rutas
     path('buscar-rutas/', views.buscar_rutas_view, name='buscar_rutas'),
     path('buscar-rutas-combinadas/', views.buscar_rutas_combinadas_view, name='buscar_rutas_combinadas'),
+    path('planificar-viaje/', views.planificar_viaje_view, name='planificar_viaje'), # HASTA k TRANSBORDOS
+    path('estadisticas-cache/', views.estadisticas_cache_view, name='estadisticas_cache'), # ACIERTOS/FALLOS DE LA CACHÉ (SOLO STAFF)
+    path('metricas/', views.metricas_view, name='metricas'), # TIEMPOS POR ETAPA (HISTOGRAMAS; POST LOS REINICIA) (SOLO STAFF)
 ]
\ No newline at end of file
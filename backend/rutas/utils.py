@@ -1,9 +1,14 @@
 #rutas/utils.py
 import math
+import numpy as np
+
+RADIO_TIERRA = 6371000
+METROS_POR_GRADO = 111320.0
+MICROGRADOS = 1e6  # escala de las coordenadas empaquetadas
 
 def calcular_distancia(punto1, punto2):
     """ (La función Haversine original se queda igual) """
-    R = 6371000 
+    R = RADIO_TIERRA
     lat1_rad = math.radians(punto1['lat'])
     lon1_rad = math.radians(punto1['lng'])
     lat2_rad = math.radians(punto2['lat'])
@@ -14,49 +19,298 @@ def calcular_distancia(punto1, punto2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+def a_arreglo(lista_coordenadas):
+    """Convierte una lista de [lat, lng] en un arreglo contiguo float64 de forma (n, 2)"""
+    return np.ascontiguousarray(lista_coordenadas, dtype=np.float64).reshape(-1, 2)
+
+def empaquetar_coordenadas(coordenadas):
+    """
+    Empaqueta una lista de [lat, lng] (o arreglo (n, 2)) como bytes: pares int32 little-endian
+    en microgrados (1e-6 grados, ~11 cm), 8 bytes por vértice.
+    """
+    arreglo = np.round(a_arreglo(coordenadas) * MICROGRADOS).astype('<i4')
+    return arreglo.tobytes()
+
+def desempaquetar_coordenadas(datos):
+    """Inverso de empaquetar_coordenadas: arreglo float64 (n, 2) de [lat, lng]"""
+    enteros = np.frombuffer(datos or b'', dtype='<i4').reshape(-1, 2)
+    return enteros / MICROGRADOS
+
+def caja_coordenadas(coordenadas):
+    """(lat_min, lat_max, lng_min, lng_max) de la polilínea; todos None si no tiene vértices"""
+    arreglo = a_arreglo(coordenadas)
+    if len(arreglo) == 0:
+        return None, None, None, None
+    minimos = arreglo.min(axis=0).tolist()
+    maximos = arreglo.max(axis=0).tolist()
+    return minimos[0], maximos[0], minimos[1], maximos[1]
+
+def distancias_haversine(puntos, arreglo):
+    """
+    Haversine vectorizado.
+    puntos: arreglo (k, 2) de [lat, lng]; arreglo: (n, 2) de [lat, lng].
+    Devuelve la matriz (k, n) de distancias en metros, calculada en una sola pasada.
+    """
+    puntos_rad = np.radians(puntos)
+    arreglo_rad = np.radians(arreglo)
+    lat1 = puntos_rad[:, 0:1]
+    lng1 = puntos_rad[:, 1:2]
+    lat2 = arreglo_rad[:, 0]
+    lng2 = arreglo_rad[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return RADIO_TIERRA * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def distancias_acumuladas(arreglo):
+    """
+    Distancia recorrida (metros) desde el primer vértice hasta cada vértice de la polilínea.
+    Devuelve un arreglo de la misma longitud que empieza en 0.
+    """
+    arreglo = a_arreglo(arreglo)
+    acumulada = np.zeros(len(arreglo), dtype=np.float64)
+    if len(arreglo) < 2:
+        return acumulada
+    lat = np.radians(arreglo[:, 0])
+    lng = np.radians(arreglo[:, 1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    np.cumsum(RADIO_TIERRA * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), out=acumulada[1:])
+    return acumulada
+
+def analizar_cercania_multiple(puntos_referencia, coordenadas, indices=None):
+    """
+    Motor por lotes: resuelve varios puntos (ej. origen y destino) contra un recorrido en una sola pasada.
+    puntos_referencia: lista de {'lat', 'lng'}; coordenadas: lista de [lat, lng] o arreglo (n, 2).
+    indices: opcional, subconjunto de posiciones de vértices a revisar.
+    Devuelve una lista con { 'distancia', 'indice', 'coord' } por cada punto, como analizar_cercania_ruta.
+    """
+    if len(coordenadas) == 0 or (indices is not None and len(indices) == 0):
+        return [{'distancia': float('inf'), 'indice': -1, 'coord': None} for _ in puntos_referencia]
+
+    arreglo = coordenadas if isinstance(coordenadas, np.ndarray) else a_arreglo(coordenadas)
+    if indices is not None:
+        indices = np.asarray(indices, dtype=np.intp)
+        arreglo = arreglo[indices]
+
+    puntos = np.array([[p['lat'], p['lng']] for p in puntos_referencia], dtype=np.float64)
+    distancias = distancias_haversine(puntos, arreglo)
+    posiciones = distancias.argmin(axis=1)
+
+    resultados = []
+    for k, pos in enumerate(posiciones):
+        indice = int(indices[pos]) if indices is not None else int(pos)
+        coord = coordenadas[indice]
+        resultados.append({
+            'distancia': float(distancias[k, pos]),
+            'indice': indice,
+            'coord': coord.tolist() if isinstance(coord, np.ndarray) else coord
+        })
+    return resultados
+
 def analizar_cercania_ruta(punto_referencia, lista_coordenadas):
     """
-    Recorre TODOS los puntos de la línea de la ruta y encuentra el más cercano.
+    Encuentra el punto de la línea de la ruta más cercano (todos los vértices en una pasada vectorizada).
     Devuelve: { 'distancia': metros, 'indice': posicion_en_array, 'coord': [lat, lng] }
     """
-    mejor_distancia = float('inf')
-    mejor_indice = -1
-    mejor_coord = None
-
-    for i, punto in enumerate(lista_coordenadas):
-        # punto viene como [lat, lng] del JSON
-        coord_ruta = {'lat': punto[0], 'lng': punto[1]}
-        
-        dist = calcular_distancia(punto_referencia, coord_ruta)
-        
-        if dist < mejor_distancia:
-            mejor_distancia = dist
-            mejor_indice = i
-            mejor_coord = punto
-
-    return {
-        'distancia': mejor_distancia,
-        'indice': mejor_indice,
-        'coord': mejor_coord
-    }
+    return analizar_cercania_multiple([punto_referencia], lista_coordenadas)[0]
 
 def encontrar_indice_mas_cercano(coordenada_ref, lista_coordenadas):
     """
     Dada una coordenada de referencia (un paradero) y la lista de puntos de la ruta (polyline),
     encuentra el ÍNDICE del punto más cercano en esa lista.
     """
-    mejor_indice = -1
-    menor_distancia = float('inf') # Infinito
-
-    for i, punto in enumerate(lista_coordenadas):
-        # punto es [lat, lng] según el modelo JSONField
-        # Convertimos a dict para usar tu función calcular_distancia
-        coord_punto = {'lat': punto[0], 'lng': punto[1]} 
-        
-        dist = calcular_distancia(coordenada_ref, coord_punto)
-        
-        if dist < menor_distancia:
-            menor_distancia = dist
-            mejor_indice = i
-            
-    return mejor_indice
\ No newline at end of file
+    return analizar_cercania_multiple([coordenada_ref], lista_coordenadas)[0]['indice']
+
+
+def indices_de_rangos(rangos):
+    """Expande una lista de rangos (inicio, fin) inclusivos a un arreglo de posiciones"""
+    if not rangos:
+        return np.empty(0, dtype=np.intp)
+    return np.concatenate([np.arange(inicio, fin + 1, dtype=np.intp) for inicio, fin in rangos])
+
+
+
+def vertices_de_segmentos(rangos):
+    """Expande rangos (inicio, fin) de segmentos del índice espacial a las posiciones de sus vértices"""
+    return indices_de_rangos([(inicio, fin + 1) for inicio, fin in rangos])
+
+
+def proyectar_multiple(puntos_referencia, coordenadas, segmentos=None):
+    """
+    Proyecta varios puntos sobre los segmentos de la polilínea (no solo sobre sus vértices).
+    segmentos: opcional, posiciones i de los segmentos (vértice i -> i + 1) a revisar, ej. las del índice espacial.
+    La proyección usa un plano local equirectangular alrededor de cada punto; la distancia final es Haversine.
+    Devuelve por cada punto { 'distancia', 'indice', 'coord', 'posicion' } donde 'posicion' es la posición
+    fraccionaria a lo largo del recorrido (3.25 = un cuarto del segmento entre los vértices 3 y 4),
+    'coord' es el punto proyectado e 'indice' el vértice más cercano a la proyección.
+    """
+    arreglo = a_arreglo(coordenadas)
+    if len(arreglo) < 2:
+        resultados = analizar_cercania_multiple(puntos_referencia, arreglo)
+        for datos in resultados:
+            datos['posicion'] = float(datos['indice']) if datos['indice'] >= 0 else -1.0
+        return resultados
+
+    segmentos = np.arange(len(arreglo) - 1) if segmentos is None else np.unique(np.asarray(segmentos, dtype=np.intp))
+    if len(segmentos) == 0:
+        return [{'distancia': float('inf'), 'indice': -1, 'coord': None, 'posicion': -1.0} for _ in puntos_referencia]
+
+    puntos = np.array([[p['lat'], p['lng']] for p in puntos_referencia], dtype=np.float64)
+    inicio = arreglo[segmentos]
+    delta = arreglo[segmentos + 1] - inicio
+
+    # Plano local (metros) centrado en cada punto: matrices (k, m)
+    escala_lng = (METROS_POR_GRADO * np.cos(np.radians(puntos[:, 0])))[:, None]
+    ax = (inicio[:, 1] - puntos[:, 1:2]) * escala_lng
+    ay = (inicio[:, 0] - puntos[:, 0:1]) * METROS_POR_GRADO
+    dx = delta[:, 1] * escala_lng
+    dy = np.broadcast_to(delta[:, 0] * METROS_POR_GRADO, ax.shape)
+    largo2 = dx * dx + dy * dy
+    t = np.clip(-(ax * dx + ay * dy) / np.where(largo2 > 0, largo2, 1.0), 0.0, 1.0)
+    cercano = ((ax + t * dx) ** 2 + (ay + t * dy) ** 2).argmin(axis=1)
+
+    resultados = []
+    for k, pos in enumerate(cercano):
+        fraccion = float(t[k, pos])
+        proyectado = inicio[pos] + fraccion * delta[pos]
+        posicion = int(segmentos[pos]) + fraccion
+        resultados.append({
+            'distancia': float(distancias_haversine(puntos[k:k + 1], proyectado[None, :])[0, 0]),
+            'indice': int(round(posicion)),
+            'coord': proyectado.tolist(),
+            'posicion': posicion
+        })
+    return resultados
+
+
+def tramo_entre(coordenadas, posicion_inicio, posicion_fin):
+    """
+    Parte de la polilínea entre dos posiciones fraccionarias (ver proyectar_multiple).
+    Incluye los puntos proyectados de los extremos y los vértices intermedios. Devuelve un arreglo (n, 2).
+    """
+    arreglo = a_arreglo(coordenadas)
+    ultimo = len(arreglo) - 1
+
+    def punto_en(posicion):
+        i = min(int(posicion), max(ultimo - 1, 0))
+        fraccion = posicion - i
+        if fraccion <= 0 or i >= ultimo:
+            return arreglo[min(i, ultimo)]
+        return arreglo[i] + fraccion * (arreglo[i + 1] - arreglo[i])
+
+    primero = math.floor(posicion_inicio) + 1
+    fin = math.ceil(posicion_fin) - 1
+    partes = [punto_en(posicion_inicio)[None, :], arreglo[primero:fin + 1], punto_en(posicion_fin)[None, :]]
+    return np.concatenate(partes)
+
+
+def importancia_douglas_peucker(coordenadas):
+    """
+    Precalcula Douglas-Peucker para todas las tolerancias a la vez.
+    Devuelve por vértice la tolerancia (metros) hasta la cual el vértice se conserva:
+    simplificar con tolerancia t equivale a quedarse con los vértices cuya importancia es > t.
+    Los extremos valen infinito (siempre se conservan).
+    """
+    arreglo = a_arreglo(coordenadas)
+    n = len(arreglo)
+    importancia = np.full(n, np.inf)
+    if n < 3:
+        return importancia
+
+    # Plano local en metros alrededor del centro del recorrido
+    lat0 = math.radians(float(arreglo[:, 0].mean()))
+    xy = np.column_stack((arreglo[:, 1] * METROS_POR_GRADO * math.cos(lat0), arreglo[:, 0] * METROS_POR_GRADO))
+    importancia[1:-1] = 0.0
+
+    pila = [(0, n - 1, np.inf)]
+    while pila:
+        i, j, tope = pila.pop()
+        if j - i < 2:
+            continue
+        a = xy[i]
+        ab = xy[j] - a
+        ap = xy[i + 1:j] - a
+        largo2 = float(ab @ ab)
+        if largo2 > 0:
+            t = np.clip(ap @ ab / largo2, 0.0, 1.0)
+            distancias = np.hypot(ap[:, 0] - t * ab[0], ap[:, 1] - t * ab[1])
+        else:
+            distancias = np.hypot(ap[:, 0], ap[:, 1])
+        k = int(distancias.argmax())
+        # Un vértice no puede sobrevivir a una tolerancia a la que ya se eliminó su tramo padre
+        valor = min(float(distancias[k]), tope)
+        importancia[i + 1 + k] = valor
+        pila.append((i, i + 1 + k, valor))
+        pila.append((i + 1 + k, j, valor))
+
+    return importancia
+
+
+def tolerancia_para_zoom(zoom, lat):
+    """Metros que ocupa un pixel en un mapa web (Web Mercator) al nivel de zoom dado: tolerancia de 1 px"""
+    return 156543.03392 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def codificar_polilinea(coordenadas, precision=5):
+    """Codifica una lista de [lat, lng] con el algoritmo 'Encoded Polyline' de Google"""
+    arreglo = np.round(a_arreglo(coordenadas) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(arreglo, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+
+    caracteres = []
+    for valor in deltas.tolist():
+        valor = ~(valor << 1) if valor < 0 else valor << 1
+        while valor >= 0x20:
+            caracteres.append(chr((0x20 | (valor & 0x1f)) + 63))
+            valor >>= 5
+        caracteres.append(chr(valor + 63))
+    return ''.join(caracteres)
+
+
+def mascara_simplificacion(importancia, tolerancia):
+    """Máscara de los vértices que sobreviven a Douglas-Peucker con la tolerancia dada (None = se conservan todos)"""
+    if not tolerancia or len(importancia) < 3:
+        return None
+    return np.asarray(importancia, dtype=np.float64) > tolerancia
+
+
+def simplificar(coordenadas, importancia, tolerancia):
+    """Vértices que sobreviven a Douglas-Peucker con la tolerancia dada (metros), usando la importancia precalculada"""
+    arreglo = a_arreglo(coordenadas)
+    mascara = mascara_simplificacion(importancia, tolerancia) if len(arreglo) >= 3 else None
+    return arreglo if mascara is None else arreglo[mascara]
+
+
+def ubicar_paradas(puntos, coordenadas, distancia_maxima):
+    """
+    Ubica paradas (arreglo (k, 2) de [lat, lng]) sobre la polilínea.
+    Primero descarta, en una sola operación vectorizada, las que quedan fuera de la caja del recorrido
+    ampliada en distancia_maxima; solo las restantes se proyectan sobre los segmentos.
+    Devuelve [(k, distancia, posicion, distancia_recorrido), ...] de las paradas a menos de distancia_maxima,
+    ordenadas a lo largo del recorrido: 'posicion' es fraccionaria (ver proyectar_multiple) y
+    'distancia_recorrido' son los metros desde el inicio del recorrido hasta la proyección.
+    """
+    arreglo = a_arreglo(coordenadas)
+    puntos = a_arreglo(puntos)
+    if len(arreglo) == 0 or len(puntos) == 0:
+        return []
+
+    lat_ref = float(np.abs(arreglo[:, 0]).max())
+    margen_lat = distancia_maxima / METROS_POR_GRADO
+    margen_lng = distancia_maxima / (METROS_POR_GRADO * max(math.cos(math.radians(lat_ref)), 1e-6))
+    minimo = arreglo.min(axis=0) - (margen_lat, margen_lng)
+    maximo = arreglo.max(axis=0) + (margen_lat, margen_lng)
+    candidatos = np.flatnonzero(((puntos >= minimo) & (puntos <= maximo)).all(axis=1))
+    if len(candidatos) == 0:
+        return []
+
+    proyecciones = proyectar_multiple(
+        [{'lat': lat, 'lng': lng} for lat, lng in puntos[candidatos].tolist()], arreglo
+    )
+    acumulada = distancias_acumuladas(arreglo)
+    vertices = np.arange(len(arreglo))
+
+    paradas = []
+    for k, datos in zip(candidatos.tolist(), proyecciones):
+        if datos['distancia'] <= distancia_maxima:
+            distancia_recorrido = float(np.interp(datos['posicion'], vertices, acumulada))
+            paradas.append((k, datos['distancia'], datos['posicion'], distancia_recorrido))
+    paradas.sort(key=lambda parada: parada[2])
+    return paradas
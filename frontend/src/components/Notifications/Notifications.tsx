@@ -36,7 +36,7 @@ export default function Notifications() {
     if (!user) return;
     setLoading(true);
     try {
-      const data = await getNotifications(1, 10);
+      const data = await getNotifications(null, 10);
       setItems(data.results || []);
       const unread = (data.results || []).filter((n: Notif) => !n.leida).length;
       setUnreadCount(unread);
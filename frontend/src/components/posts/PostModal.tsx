@@ -6,6 +6,7 @@ import CommentsList from './CommentsList'
 import NewCommentBox from './NewCommentBox'
 import api from '../../api/axios'
 import { useAuth } from '../auth/AuthProvider'
+import { hasReported } from '../../services/authService'
 
 type Post = {
   id: number
@@ -131,10 +132,8 @@ const PostModal: React.FC<{ post: Post | null, onClose: () => void, initialComme
     async function checkReported() {
       if (!post) return
       try {
-        const res = await api.get('/api/foro/reportes/me/')
-        const data = res.data.results ?? res.data
-        const exists = data.some((r: any) => r.incidencia && r.incidencia.id === post.id)
-        if (mounted) setReported(!!exists)
+        const exists = await hasReported(post.id)
+        if (mounted) setReported(exists)
       } catch (e) {
         // ignore
       }
@@ -10,9 +10,11 @@ export default function MisReportes() {
   const [reports, setReports] = useState<Report[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // cursor pagination: the API returns the URLs of the next/previous pages; `page` is only the label
+  const [cursor, setCursor] = useState<string | null>(null);
   const [page, setPage] = useState(1);
-  const [hasNext, setHasNext] = useState(false);
-  const [hasPrev, setHasPrev] = useState(false);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
+  const [prevUrl, setPrevUrl] = useState<string | null>(null);
 
   useEffect(() => {
     let mounted = true;
@@ -21,7 +23,7 @@ export default function MisReportes() {
       setLoading(true);
       setError(null);
       try {
-  const data = await getMyReports(page, 10);
+  const data = await getMyReports(cursor, 10);
   if (!mounted) return;
         // Map backend shape to frontend Report type
         const items = (data.results || []).map((r: any) => ({
@@ -35,8 +37,8 @@ export default function MisReportes() {
           reacciones_count: r.incidencia?.reacciones_count ?? 0,
         }));
   setReports(items);
-        setHasNext(Boolean(data.next));
-        setHasPrev(Boolean(data.previous));
+        setNextUrl(data.next);
+        setPrevUrl(data.previous);
       } catch (e: any) {
         // if unauthorized, prompt login
         if (e?.response?.status === 401) {
@@ -51,7 +53,7 @@ export default function MisReportes() {
     }
     load();
     return () => { mounted = false; };
-  }, [user, page]);
+  }, [user, cursor]);
 
   if (!user) {
     return (
@@ -74,9 +76,9 @@ export default function MisReportes() {
         ))}
       </div>
       <div style={{ display: 'flex', gap: 8, justifyContent: 'center', marginTop: 12 }}>
-        <button disabled={!hasPrev || loading} onClick={() => setPage(p => Math.max(1, p - 1))} className="btn">Anterior</button>
+        <button disabled={!prevUrl || loading} onClick={() => { setCursor(prevUrl); setPage(p => Math.max(1, p - 1)); }} className="btn">Anterior</button>
         <span>Página {page}</span>
-        <button disabled={!hasNext || loading} onClick={() => setPage(p => p + 1)} className="btn">Siguiente</button>
+        <button disabled={!nextUrl || loading} onClick={() => { setCursor(nextUrl); setPage(p => p + 1); }} className="btn">Siguiente</button>
       </div>
     </section>
   );
@@ -38,24 +38,25 @@ export async function logoutServer(refresh?: string) {
   }
 }
 
-export async function getMyReports(page = 1, pageSize = 10) {
-  const res = await api.get('/api/foro/reportes/me/', { params: { page, page_size: pageSize } });
+// The foro feeds use cursor pagination: pages are reached by following the `next` / `previous`
+// URLs returned by the API (there is no page number or total count).
+export type CursorPage<T> = { next: string | null; previous: string | null; results: T[] };
+
+async function getCursorPage<T>(path: string, cursor?: string | null, params?: Record<string, any>) {
+  const res = cursor ? await api.get(cursor) : await api.get(path, { params });
   const data = res.data;
-  if (Array.isArray(data)) {
-    return { count: data.length, next: null, previous: null, results: data };
-  }
-  return data as { count: number; next: string | null; previous: string | null; results: Array<{ id: number; nombre: string; tipo: string; fecha: string; estado?: string }> };
+  if (Array.isArray(data)) return { next: null, previous: null, results: data } as CursorPage<T>;
+  return data as CursorPage<T>;
 }
 
-export async function getNotifications(page = 1, pageSize = 10, unreadOnly = false) {
-  const params: any = { page, page_size: pageSize };
+export async function getMyReports(cursor: string | null = null, pageSize = 10) {
+  return getCursorPage<any>('/api/foro/reportes/me/', cursor, { page_size: pageSize });
+}
+
+export async function getNotifications(cursor: string | null = null, pageSize = 10, unreadOnly = false) {
+  const params: any = { page_size: pageSize };
   if (unreadOnly) params.leida = false;
-  const res = await api.get('/api/foro/notificaciones/', { params });
-  const data = res.data;
-  if (Array.isArray(data)) {
-    return { count: data.length, next: null, previous: null, results: data };
-  }
-  return data as { count: number; next: string | null; previous: string | null; results: Array<any> };
+  return getCursorPage<any>('/api/foro/notificaciones/', cursor, params);
 }
 
 export async function markNotificationRead(id: number) {
@@ -80,18 +81,19 @@ export async function updateProfile(data: FormData) {
 }
 
 // Foro-related helpers
-export async function getMyAuthoredIncidencias(page = 1, pageSize = 20) {
-  const res = await api.get('/api/foro/incidencias/mine/', { params: { page, page_size: pageSize } });
-  const data = res.data;
-  if (Array.isArray(data)) return { count: data.length, next: null, previous: null, results: data };
-  return data as { count: number; next: string | null; previous: string | null; results: any[] };
+export async function getMyAuthoredIncidencias(cursor: string | null = null, pageSize = 20) {
+  return getCursorPage<any>('/api/foro/incidencias/mine/', cursor, { page_size: pageSize });
 }
 
-export async function getMySupportedIncidencias(page = 1, pageSize = 50) {
+export async function getMySupportedIncidencias(cursor: string | null = null, pageSize = 50) {
   // returns the mapped incidencias from the user's reportes
-  const res = await api.get('/api/foro/reportes/me/', { params: { page, page_size: pageSize } });
-  const data = res.data;
-  const list = Array.isArray(data) ? data : (data.results ?? data);
-  const incidencias = (list || []).map((r: any) => r.incidencia).filter(Boolean);
-  return { count: incidencias.length, next: null, previous: null, results: incidencias } as { count: number; next: string | null; previous: string | null; results: any[] };
+  const page = await getCursorPage<any>('/api/foro/reportes/me/', cursor, { page_size: pageSize });
+  const incidencias = (page.results || []).map((r: any) => r.incidencia).filter(Boolean);
+  return { next: page.next, previous: page.previous, results: incidencias } as CursorPage<any>;
+}
+
+// Whether the current user already reported this incidencia (one filtered lookup, not a feed scan)
+export async function hasReported(incidenciaId: number) {
+  const page = await getCursorPage<any>('/api/foro/reportes/me/', null, { incidencia: incidenciaId, page_size: 1 });
+  return page.results.length > 0;
 }